@@ -4,7 +4,13 @@
 echo "Running Django migrations..."
 python manage.py migrate --noinput
 
+echo "Creating the cache table..."
+python manage.py createcachetable
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear
 
+echo "Byte-compiling sources and checking the warm-up..."
+python manage.py prepare_deploy
+
 echo "Build completed successfully!"
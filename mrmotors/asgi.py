@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mrmotors.settings')
 
 application = get_asgi_application()
+
+# Build URL resolvers and compile templates now, not on the first request
+from django.conf import settings  # noqa: E402
+
+if settings.APP_WARMUP:
+    from store.warmup import warm_up
+    warm_up()
@@ -49,10 +49,8 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'cloudinary_storage',
     'django.contrib.staticfiles',
     'django.contrib.sites',
-    'cloudinary',
     
     # Allauth
     'allauth',
@@ -67,11 +65,13 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'store.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.middleware.UserProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -83,12 +83,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'store' / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'store.context_processors.navigation',
+            ],
+            # Templates (base.html included) are compiled once per process
+            # and reused; runserver's autoreloader still resets the cache
+            # when a template changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -102,16 +111,26 @@ WSGI_APPLICATION = 'mrmotors.wsgi.application'
 
 # Check if we have a DATABASE_URL (for production/Vercel)
 DATABASE_URL = os.getenv('DATABASE_URL', '')
+# Optional read replica for read-only views (see store/db_routers.py)
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '')
+
+# Set DATABASE_POOLER=True when the URLs point at a transaction-mode pooler
+# (PgBouncer, or the Supabase/Neon poolers). Connections are then closed
+# after each request, since the pooler keeps the server connections open
+# and idle ones per lambda would only pile up, and server-side cursors,
+# which don't survive transaction pooling, are disabled.
+DATABASE_POOLER = os.getenv('DATABASE_POOLER', 'False') == 'True'
+DATABASE_OPTIONS = {
+    'conn_max_age': 0 if DATABASE_POOLER else 600,
+    'conn_health_checks': not DATABASE_POOLER,
+    'disable_server_side_cursors': DATABASE_POOLER,
+}
 
 if DATABASE_URL:
     # Production environment with PostgreSQL
     import dj_database_url
     DATABASES = {
-        'default': dj_database_url.config(
-            default=DATABASE_URL,
-            conn_max_age=600,
-            conn_health_checks=True,
-        )
+        'default': dj_database_url.config(default=DATABASE_URL, **DATABASE_OPTIONS)
     }
 else:
     # Local development - use SQLite
@@ -119,9 +138,89 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
-        }
+        },
+        # A second connection to the same file standing in for a replica.
+        # Reads only go to it when DATABASE_READ_REPLICA is set, as the
+        # routing tests do (with a test database of its own).
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        },
     }
 
+if DATABASE_REPLICA_URL:
+    import dj_database_url
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL, **DATABASE_OPTIONS)
+DATABASE_READ_REPLICA = 'replica' if DATABASE_REPLICA_URL else None
+DATABASE_ROUTERS = ['store.db_routers.ReadReplicaRouter']
+
+
+# Cache
+# The shared tier behind store/cache.py's in-process cache, also used by
+# sessions and rate limiting. CACHE_URL picks the backend:
+#   redis://host:6379/0 (or rediss://): Redis, needs the redis package
+#   file:///tmp/mrmotors-cache: files on a disk every instance shares
+#   db: the store_cache table (created by createcachetable in the build)
+#   locmem: this process only
+# Deployments with a DATABASE_URL default to the database table; local
+# development defaults to memory.
+# The cache also holds sessions, rate-limit buckets and inventory versions,
+# so the non-Redis backends get room for far more than Django's default of
+# 300 entries, past which they cull a third of the cache at random.
+CACHE_URL = os.getenv('CACHE_URL', 'db' if DATABASE_URL else 'locmem')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '50000'))
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    }}
+elif CACHE_URL.startswith('file://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL[len('file://'):],
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    }}
+elif CACHE_URL == 'db':
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'store_cache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    }}
+
+# In-process tier (store/cache.py): how long an entry is reused without
+# asking the shared cache, which is also how long other instances' changes
+# can take to show up, and how many entries each process keeps
+CACHE_LOCAL_TIMEOUT = float(os.getenv('CACHE_LOCAL_TIMEOUT', '5'))
+CACHE_LOCAL_MAX_ENTRIES = int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '512'))
+# Seconds the public inventory, facets and featured cars are cached
+# (changes invalidate them sooner), how much longer an expired or
+# invalidated copy may be served while one request rebuilds it, and the
+# admin check of users not loaded with their record
+INVENTORY_CACHE_TIMEOUT = int(os.getenv('INVENTORY_CACHE_TIMEOUT', '3600'))
+INVENTORY_CACHE_STALE_TIMEOUT = int(os.getenv('INVENTORY_CACHE_STALE_TIMEOUT', '600'))
+ADMIN_PERMISSION_CACHE_TIMEOUT = int(os.getenv('ADMIN_PERMISSION_CACHE_TIMEOUT', '300'))
+# Cars shown on the home page
+FEATURED_CARS = int(os.getenv('FEATURED_CARS', '3'))
+# Image URLs one upload to /api/cars/import/ may fetch; records past it are
+# skipped, so one request can't hold a worker for minutes. The import_cars
+# command has no limit.
+CAR_IMPORT_MAX_IMAGES = int(os.getenv('CAR_IMPORT_MAX_IMAGES', '100'))
+# Largest image, in bytes, an import downloads from a URL
+CAR_IMPORT_MAX_IMAGE_BYTES = int(os.getenv('CAR_IMPORT_MAX_IMAGE_BYTES', str(10 * 1024 * 1024)))
+
+
+# Sessions
+# cached_db serves sessions from the cache and only falls back to the
+# database on a miss. Set SESSION_ENGINE to
+# 'django.contrib.sessions.backends.signed_cookies' to skip the session
+# store entirely (sessions then can't be revoked server-side).
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -161,26 +260,24 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'store' / 'static',
 ]
-
-# Cloudinary Configuration (must come before MEDIA settings)
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
-
+# collectstatic writes minified, fingerprinted and precompressed files here
+# (see store/static_storage.py); vercel.json serves them with far-future
+# cache headers
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Cloudinary Configuration
+# Nothing imports the Cloudinary SDK at startup: cloudinary_storage reads
+# these credentials (and defaults to secure URLs) when the media storage is
+# first used, so cold starts that never touch media don't pay for it. It
+# isn't an installed app either, since Django would then load its template
+# tags (and the SDK) with the template engine; its deleteorphanedmedia
+# command is re-exported by store.
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': os.getenv('CLOUDINARY_CLOUD_NAME', 'dvgjjnbyb'),
     'API_KEY': os.getenv('CLOUDINARY_API_KEY', '694911693255957'),
     'API_SECRET': os.getenv('CLOUDINARY_API_SECRET', 'ftNEjzT7JZkEQSCHPzn-0E2hGqk'),
 }
 
-# Initialize Cloudinary
-cloudinary.config(
-    cloud_name=CLOUDINARY_STORAGE['CLOUD_NAME'],
-    api_key=CLOUDINARY_STORAGE['API_KEY'],
-    api_secret=CLOUDINARY_STORAGE['API_SECRET'],
-    secure=True
-)
-
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -188,15 +285,15 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Storage configuration for Django 5.2+ (uses STORAGES instead of DEFAULT_FILE_STORAGE)
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": "store.storage.TimedMediaCloudinaryStorage",
     },
     "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        "BACKEND": "store.static_storage.CompressedManifestStaticFilesStorage",
     },
 }
 
 # Backwards compatibility for older Django versions
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+DEFAULT_FILE_STORAGE = 'store.storage.TimedMediaCloudinaryStorage'
 
 # Instant DB Configuration
 INSTANTDB_APP_ID = os.getenv('INSTANTDB_APP_ID', 'a169709c-d938-4489-b196-63dcc30a53ca')
@@ -260,7 +357,10 @@ SOCIALACCOUNT_PROVIDERS = {
 SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY', '')
 
 # Always use SendGrid if API key is set
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# The pooled backend reuses one SMTP connection per worker between sends
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'store.email_backends.PooledEmailBackend')
+EMAIL_POOL_MAX_IDLE_SECONDS = 60
+EMAIL_POOL_HEALTH_CHECK_SECONDS = 5
 EMAIL_HOST = 'smtp.sendgrid.net'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -269,6 +369,15 @@ EMAIL_HOST_PASSWORD = SENDGRID_API_KEY
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'M&R Motors <mahmoudria94@gmail.com>')
 SERVER_EMAIL = DEFAULT_FROM_EMAIL
 
+# Email outbox (see store/outbox.py)
+# Emails queued during a request are sent after the response; anything that
+# fails is retried by `manage.py drain_outbox` or the _admin/drain-outbox/
+# endpoint (authorised with CRON_SECRET as a bearer token).
+EMAIL_OUTBOX_SEND_AFTER_RESPONSE = True
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF_SECONDS = 30
+CRON_SECRET = os.getenv('CRON_SECRET', '')
+
 # Site URL for email links
 SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
 
@@ -276,3 +385,51 @@ SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER', '')
+
+# SMS delivery transport (see store/sms.py)
+SMS_TRANSPORT = os.getenv('SMS_TRANSPORT', 'store.sms.TwilioTransport')
+
+# Queued jobs: SMS sends and profile picture syncs (see store/jobs.py)
+# Jobs queued during a request run after the response; anything that fails
+# is retried by `manage.py run_jobs` or the _admin/run-jobs/ endpoint (a
+# Vercel Cron, authorised with CRON_SECRET).
+JOBS_RUN_AFTER_RESPONSE = True
+JOBS_MAX_ATTEMPTS = 5
+JOBS_BACKOFF_SECONDS = 30
+
+# Threads for blocking uploads awaited by async views (e.g. add_car_view)
+ASYNC_IO_WORKERS = int(os.getenv('ASYNC_IO_WORKERS', '16'))
+
+# Per-request timings (see store/timing.py): a Server-Timing header and a
+# log line per request, with a warning when a request exceeds a budget.
+# The header shows anyone how long queries and other backends take, so it
+# is only sent in development unless SERVER_TIMING_HEADER is set.
+# Budget keys are <category>_ms / <category>_count for db, storage, email
+# and sms, plus total_ms.
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', str(DEBUG)) == 'True'
+PERFORMANCE_BUDGETS = {
+    'total_ms': float(os.getenv('PERF_BUDGET_TOTAL_MS', '1000')),
+    'db_count': int(os.getenv('PERF_BUDGET_DB_QUERIES', '20')),
+    'db_ms': float(os.getenv('PERF_BUDGET_DB_MS', '300')),
+    'storage_ms': float(os.getenv('PERF_BUDGET_STORAGE_MS', '2000')),
+}
+
+# Time to import the WSGI entry point in a fresh interpreter, i.e. the
+# cold start of a serverless instance (see store/coldstart.py and the
+# profile_imports command)
+COLD_START_BUDGET_MS = float(os.getenv('COLD_START_BUDGET_MS', '1000'))
+
+# Import views and compile templates when the WSGI/ASGI application loads
+# instead of on each instance's first request (see store/warmup.py)
+APP_WARMUP = os.getenv('APP_WARMUP', 'True') == 'True'
+
+# Rate limiting for login and verification views (see store/ratelimit.py)
+# Store: store.ratelimit.LocalMemoryStore, CacheStore or DatabaseStore
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'True') == 'True'
+RATELIMIT_STORE = os.getenv('RATELIMIT_STORE', 'store.ratelimit.CacheStore')
+# Per-scope overrides, e.g. {'login': '20/m'}
+RATELIMIT_RATES = {}
+# Proxies in front of the app that append to X-Forwarded-For (Vercel's edge
+# is one); the client IP is taken that many entries from the right. 0
+# ignores the header and uses the connection's address.
+RATELIMIT_TRUSTED_PROXIES = int(os.getenv('RATELIMIT_TRUSTED_PROXIES', '1'))
@@ -14,5 +14,12 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mrmotors.settings')
 
 application = get_wsgi_application()
 
+# Build URL resolvers and compile templates now, not on the first request
+from django.conf import settings  # noqa: E402
+
+if settings.APP_WARMUP:
+    from store.warmup import warm_up
+    warm_up()
+
 # Vercel expects 'app' variable
 app = application
@@ -0,0 +1,119 @@
+"""Helpers for creating and looking up local (email/password) accounts."""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import BigIntegerField, Count, Max, Q, Value
+from django.db.models.functions import Cast, Lower, NullIf, Substr
+from .cache import get_tiered_cache
+from .models import AdminUser, UserProfile
+import re
+
+# Longest numeric suffix we will consider when scanning for collisions.
+# Keeps the cast to a bigint safe on every database backend.
+MAX_SUFFIX_DIGITS = 9
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+
+
+def username_base_from_email(email):
+    """Derive the base username from the local-part of an email address."""
+    base = email.split('@')[0]
+    return base[:USERNAME_MAX_LENGTH - MAX_SUFFIX_DIGITS]
+
+
+def allocate_username(email):
+    """
+    Return a username derived from ``email`` that is not yet taken.
+
+    Instead of probing ``base``, ``base1``, ``base2``... one query at a time,
+    all existing ``base<digits>`` usernames are scanned in a single aggregate
+    query and the next suffix after the highest one is used.
+    """
+    base = username_base_from_email(email)
+    pattern = rf'^{re.escape(base)}[0-9]{{0,{MAX_SUFFIX_DIGITS}}}$'
+
+    suffix = Cast(
+        NullIf(Substr('username', len(base) + 1), Value('')),
+        BigIntegerField(),
+    )
+    result = User.objects.filter(username__regex=pattern).aggregate(
+        base_taken=Count('id', filter=Q(username=base)),
+        max_suffix=Max(suffix),
+    )
+
+    if not result['base_taken']:
+        return base
+    return f"{base}{(result['max_suffix'] or 0) + 1}"
+
+
+def normalize_email(email):
+    """Normalize an email address for case-insensitive comparison."""
+    return (email or '').strip().lower()
+
+
+def users_by_email(email):
+    """
+    Return users whose email matches ``email`` case-insensitively.
+
+    Filters on ``LOWER(email)`` so the lookup is served by the
+    ``auth_user_email_lower_idx`` expression index rather than a table scan.
+    """
+    return User.objects.alias(email_lower=Lower('email')).filter(
+        email_lower=normalize_email(email)
+    )
+
+
+def get_user_by_email(email):
+    """Return the oldest user with a matching email, or None."""
+    return users_by_email(email).order_by('id').first()
+
+
+async def aget_profile(user):
+    """
+    Return ``user.profile`` from an async view.
+
+    Uses the profile joined in by UserProfileMiddleware when present and
+    only queries (asynchronously) when it wasn't.
+    """
+    if not User.profile.is_cached(user):
+        user.profile = await UserProfile.objects.aget(user=user)
+    return user.profile
+
+
+def admin_cache_key(user_id):
+    return f'admin:{user_id}'
+
+
+def has_admin_record(user_id):
+    """
+    Whether an ``AdminUser`` exists for ``user_id``, from the tiered cache.
+
+    Only used when the admin record wasn't joined in with the user (the
+    request user usually has it, see UserProfileMiddleware). Adding or
+    removing an admin clears the entry (store/signals.py); other instances
+    may keep their local copy for up to ``CACHE_LOCAL_TIMEOUT`` seconds.
+    """
+    return get_tiered_cache().get_or_set(
+        admin_cache_key(user_id),
+        lambda: AdminUser.objects.filter(user_id=user_id).exists(),
+        settings.ADMIN_PERMISSION_CACHE_TIMEOUT,
+    )
+
+
+def is_admin(user):
+    """Access to the admin panel and car management."""
+    if not user.is_authenticated:
+        return False
+    if user.email in settings.ADMIN_EMAILS:
+        return True
+    if User.admin_profile.is_cached(user):
+        return hasattr(user, 'admin_profile')
+    return has_admin_record(user.pk)
+
+
+async def ais_admin(user):
+    """Async check for access to the admin panel and car management."""
+    if user.email in settings.ADMIN_EMAILS:
+        return True
+    if User.admin_profile.is_cached(user):
+        return hasattr(user, 'admin_profile')
+    return await sync_to_async(has_admin_record)(user.pk)
@@ -56,7 +56,7 @@ class MySocialAccountAdapter(DefaultSocialAccountAdapter):
                 # Also mark the profile as verified
                 if hasattr(user, 'profile'):
                     user.profile.email_verified = True
-                    user.profile.save()
+                    user.profile.save(update_fields=['email_verified', 'updated_at'])
         
         return user
     
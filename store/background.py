@@ -0,0 +1,30 @@
+"""
+Thread pool for blocking I/O that requests wait on.
+
+Work that should happen after the response (SMS sends, profile picture
+syncs) is queued as a job instead (store/jobs.py), since runtimes such as
+Vercel freeze threads once the response is sent.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+import threading
+
+_lock = threading.Lock()
+_io_executor = None
+
+
+def get_io_executor():
+    """
+    Thread pool for blocking calls that async views await, such as storage
+    uploads. Sized by ``ASYNC_IO_WORKERS`` rather than the event loop's
+    default executor, which only has a handful of threads.
+    """
+    global _io_executor
+    if _io_executor is None:
+        with _lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'ASYNC_IO_WORKERS', 16),
+                    thread_name_prefix='async-io',
+                )
+    return _io_executor
@@ -0,0 +1,346 @@
+"""
+Two-tier cache: a small in-process LRU in front of the shared Django cache.
+
+The shared tier is ``caches['default']`` (see CACHE_URL in settings):
+Redis when one is configured, otherwise the database cache table in
+production and local memory in development. Every instance sees the same
+entries there, but on the database cache each lookup is a query. The local
+tier keeps recently used entries in the process for at most
+``CACHE_LOCAL_TIMEOUT`` seconds (and ``CACHE_LOCAL_MAX_ENTRIES`` of them),
+so a hot key costs one shared lookup per instance every few seconds instead
+of one per request. A change made on another instance can therefore take
+up to ``CACHE_LOCAL_TIMEOUT`` to show up.
+
+``get_or_set`` is single-flight: on a miss one caller computes the value
+while the others wait for it, both within a process (a lock per key) and
+across instances (a short lock entry added to the shared cache).
+``get_or_revalidate`` adds stale-while-revalidate for expensive entries:
+once an entry expires or its namespace is bumped, one caller rebuilds it
+and the rest are served the previous value meanwhile instead of waiting,
+so a burst of requests after a change causes one rebuild rather than one
+per request.
+
+Whole groups of entries are invalidated with ``bump(namespace)``: keys
+built with ``key(namespace, ...)`` include the namespace's version, so
+bumping it makes every old entry unreachable without deleting anything;
+they expire on their own.
+
+Hits and misses are counted per namespace; ``stats()`` reports them and
+the hit rate for this process. ``stale_hits`` are the hits that got an
+old value while another caller rebuilt it.
+"""
+from collections import Counter, OrderedDict, defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from .timing import timed
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Stand-in for "not cached", so None can be cached
+MISSING = object()
+
+
+class LocalCache:
+    """Thread-safe LRU of ``key -> (value, expires_at)``."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    """Local LRU in front of a shared Django cache, with single-flight fills."""
+
+    # How long one instance may hold the recompute lock for a key, and how
+    # long the others wait for its result before computing it themselves
+    lock_timeout = 10
+    wait_timeout = 2
+    poll_interval = 0.05
+
+    def __init__(self, alias='default', local_timeout=None, max_entries=None):
+        self.alias = alias
+        self.local_timeout = (settings.CACHE_LOCAL_TIMEOUT
+                              if local_timeout is None else local_timeout)
+        self.local = LocalCache(settings.CACHE_LOCAL_MAX_ENTRIES
+                                if max_entries is None else max_entries)
+        self._key_locks = defaultdict(threading.Lock)
+        self._key_locks_lock = threading.Lock()
+        self._stats = defaultdict(Counter)
+        self._stats_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    # Keys and versions
+
+    def version(self, namespace):
+        """Current version of ``namespace``; starts from a timestamp, not 1."""
+        version_key = f'version:{namespace}'
+        version = self.local.get(version_key)
+        if version is MISSING:
+            with timed('cache'):
+                version = self.shared.get(version_key)
+                if version is None:
+                    # A timestamp rather than 1, so a version entry that was
+                    # evicted doesn't bring back entries from before it
+                    self.shared.add(version_key, time.time_ns(), None)
+                    version = self.shared.get(version_key)
+            self.local.set(version_key, version, self.local_timeout)
+        return version
+
+    def bump(self, namespace):
+        """Invalidate every key built with ``key(namespace, ...)``."""
+        version_key = f'version:{namespace}'
+        with timed('cache'):
+            try:
+                version = self.shared.incr(version_key)
+            except ValueError:
+                version = time.time_ns()
+                self.shared.set(version_key, version, None)
+        self.local.set(version_key, version, self.local_timeout)
+        return version
+
+    def key(self, namespace, *parts):
+        return ':'.join([namespace, str(self.version(namespace)), *map(str, parts)])
+
+    # Reads and writes through both tiers
+
+    def get(self, key, default=None):
+        value = self._get(key)
+        return default if value is MISSING else value
+
+    def set(self, key, value, timeout):
+        with timed('cache'):
+            self.shared.set(key, value, timeout)
+        self.local.set(key, value, min(self.local_timeout, timeout))
+
+    def delete(self, key):
+        """Delete ``key`` here and in the shared tier (other instances' local copies expire)."""
+        self.local.delete(key)
+        with timed('cache'):
+            self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def get_or_set(self, key, compute, timeout):
+        """
+        Return the cached value of ``key`` or store and return ``compute()``.
+
+        Concurrent misses for the same key share one ``compute()``: callers
+        in this process wait on a lock, and other instances wait (up to
+        ``wait_timeout``) for the value to appear in the shared tier.
+        """
+        value = self._get(key)
+        if value is not MISSING:
+            return value
+        return self._fill(key, compute, timeout)
+
+    def get_or_revalidate(self, namespace, name, compute, timeout, stale_timeout):
+        """
+        ``get_or_set`` for ``namespace:name`` that serves stale values
+        rather than making callers wait for a rebuild.
+
+        The entry is fresh for ``timeout`` seconds and until ``namespace``
+        is bumped. After that, the first caller to take the entry's lock
+        rebuilds it; everyone else (here and on other instances) keeps
+        getting the old value until the new one is stored, and so does the
+        rebuilding caller if ``compute()`` raises. Entries are
+        kept ``stale_timeout`` seconds past ``timeout`` for this; only a
+        missing entry makes callers wait, as in ``get_or_set``.
+        """
+        key = f'{namespace}:{name}'
+        version = self.version(namespace)
+
+        def build():
+            value = compute()
+            return version, time.time() + timeout, value
+
+        entry = self._get(key)
+        if entry is MISSING:
+            return self._fill(key, build, timeout + stale_timeout)[2]
+
+        def is_fresh(entry):
+            # Versions only grow; a newer one means another instance has
+            # seen a bump that our local copy of the version hasn't yet
+            entry_version, fresh_until, _ = entry
+            return entry_version >= version and time.time() < fresh_until
+
+        if is_fresh(entry):
+            return entry[2]
+        # Our local copy may be older than a rebuild already shared
+        with timed('cache'):
+            shared_entry = self.shared.get(key, MISSING)
+        if shared_entry is not MISSING and is_fresh(shared_entry):
+            self.local.set(key, shared_entry, self.local_timeout)
+            return shared_entry[2]
+
+        lock_key = f'lock:{key}'
+        with timed('cache'):
+            locked = self.shared.add(lock_key, 1, self.lock_timeout)
+        if not locked:
+            # Someone else is rebuilding it
+            self._count(key, 'stale_hits')
+            return entry[2]
+        try:
+            entry = self._compute(key, build)
+            self.set(key, entry, timeout + stale_timeout)
+        except Exception as e:
+            # The stale value is still better than an error, above all
+            # when the rebuild failed because the database is struggling
+            logger.error(f"Cache: rebuilding {key} failed, serving the stale value: {e}")
+            self._count(key, 'stale_hits')
+        finally:
+            with timed('cache'):
+                self.shared.delete(lock_key)
+        return entry[2]
+
+    def _compute(self, key, compute):
+        started = time.perf_counter()
+        value = compute()
+        self._count(key, 'computes')
+        logger.debug(f"Cache: computed {key} in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return value
+
+    def _fill(self, key, compute, timeout):
+        """Single-flight ``compute()`` and store of a missing ``key``."""
+        with self._key_lock(key):
+            # Another thread may have filled it while we waited
+            value = self._get(key, count=False)
+            if value is not MISSING:
+                return value
+
+            lock_key = f'lock:{key}'
+            with timed('cache'):
+                locked = self.shared.add(lock_key, 1, self.lock_timeout)
+            if not locked:
+                value = self._wait_for(key)
+                if value is not MISSING:
+                    return value
+            try:
+                value = self._compute(key, compute)
+                self.set(key, value, timeout)
+            finally:
+                if locked:
+                    with timed('cache'):
+                        self.shared.delete(lock_key)
+            return value
+
+    def _get(self, key, count=True):
+        value = self.local.get(key)
+        if value is not MISSING:
+            if count:
+                self._count(key, 'local_hits')
+            return value
+        with timed('cache'):
+            value = self.shared.get(key, MISSING)
+        if value is MISSING:
+            if count:
+                self._count(key, 'misses')
+            return MISSING
+        if count:
+            self._count(key, 'shared_hits')
+        self.local.set(key, value, self.local_timeout)
+        return value
+
+    def _wait_for(self, key):
+        """Poll the shared tier for a value another instance is computing."""
+        self._count(key, 'waits')
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            with timed('cache'):
+                value = self.shared.get(key, MISSING)
+            if value is not MISSING:
+                self.local.set(key, value, self.local_timeout)
+                return value
+        logger.warning(f"Cache: gave up waiting for {key} after {self.wait_timeout}s")
+        return MISSING
+
+    def _key_lock(self, key):
+        with self._key_locks_lock:
+            lock = self._key_locks[key]
+            # Drop locks nobody holds so the map doesn't grow with every key
+            if len(self._key_locks) > 1000:
+                for other, other_lock in list(self._key_locks.items()):
+                    if other != key and not other_lock.locked():
+                        del self._key_locks[other]
+            return lock
+
+    # Metrics
+
+    def _count(self, key, event):
+        with self._stats_lock:
+            self._stats[key.split(':', 1)[0]][event] += 1
+
+    def stats(self):
+        """Per-namespace counters and hit rate for this process."""
+        with self._stats_lock:
+            report = {}
+            for namespace, counts in sorted(self._stats.items()):
+                hits = counts['local_hits'] + counts['shared_hits']
+                lookups = hits + counts['misses']
+                report[namespace] = {
+                    'local_hits': counts['local_hits'],
+                    'shared_hits': counts['shared_hits'],
+                    'misses': counts['misses'],
+                    'computes': counts['computes'],
+                    'waits': counts['waits'],
+                    'stale_hits': counts['stale_hits'],
+                    'hit_rate': round(hits / lookups, 3) if lookups else None,
+                }
+            return report
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+
+_tiered_cache = None
+_tiered_cache_lock = threading.Lock()
+
+
+def get_tiered_cache():
+    """The process-wide ``TieredCache`` in front of the default cache."""
+    global _tiered_cache
+    if _tiered_cache is None:
+        with _tiered_cache_lock:
+            if _tiered_cache is None:
+                _tiered_cache = TieredCache()
+    return _tiered_cache
@@ -0,0 +1,304 @@
+"""
+Bulk import and export of the car inventory as CSV or JSON Lines.
+
+Both directions stream: imports parse one record at a time and write cars
+in chunks with ``bulk_create``, exports iterate the inventory in chunks and
+yield one line at a time, so neither holds the whole file or inventory in
+memory.
+
+Each record has the ``Car`` fields in ``RECORD_FIELDS`` plus ``images``: a
+list of image URLs (JSON Lines) or URLs separated by ``|`` (CSV). The
+``import_cars`` command also accepts local file paths. A record is imported
+with all of its images or not at all. Uploads through the admin endpoint
+fetch at most ``CAR_IMPORT_MAX_IMAGES`` images.
+
+Image URLs come from the imported file, so before each request (and each
+redirect) the host is resolved and refused unless every address is public,
+which keeps imports from reaching internal services or cloud metadata
+endpoints. Downloads are capped at ``CAR_IMPORT_MAX_IMAGE_BYTES``.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
+from . import background
+from .inventory import invalidate_inventory
+from .models import Car, CarImage
+from urllib.parse import urljoin, urlsplit
+import csv
+import ipaddress
+import json
+import os
+import socket
+import importlib.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Optional: requests is only imported when first used, which keeps it off
+# the cold-start path
+REQUESTS_AVAILABLE = importlib.util.find_spec('requests') is not None
+if not REQUESTS_AVAILABLE:
+    logger.warning("requests library not available - image URLs cannot be imported")
+
+FORMATS = ('csv', 'jsonl')
+RECORD_FIELDS = [
+    'title', 'car_model', 'year', 'price', 'description',
+    'mileage', 'condition', 'is_sold', 'is_hidden',
+]
+EXPORT_FIELDS = ['id', *RECORD_FIELDS, 'images', 'created_at']
+CSV_IMAGE_SEPARATOR = '|'
+MAX_IMAGE_REDIRECTS = 3
+
+
+def format_for_path(path, default='csv'):
+    """Guess the format from a file name (``.jsonl``/``.ndjson`` or ``.csv``)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension == '.csv':
+        return 'csv'
+    return default
+
+
+def iter_records(lines, fmt):
+    """
+    Parse text ``lines`` lazily into ``(line_number, record)`` pairs.
+
+    Malformed JSON lines are yielded as ``(line_number, ValueError)`` so one
+    bad line doesn't abort the import.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            images = record.get('images') or ''
+            record['images'] = [url.strip() for url in images.split(CSV_IMAGE_SEPARATOR) if url.strip()]
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError('expected a JSON object')
+            except ValueError as e:
+                yield line_number, ValueError(f'Invalid JSON: {e}')
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f'Unknown format: {fmt}')
+
+
+def build_car(record):
+    """Return an unsaved, validated ``Car`` for ``record``."""
+    values = {}
+    for name in RECORD_FIELDS:
+        value = record.get(name)
+        field = Car._meta.get_field(name)
+        if value in ('', None):
+            value = None if field.null else field.get_default()
+        elif field.get_internal_type() == 'BooleanField' and isinstance(value, str):
+            value = value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+        values[name] = value
+    car = Car(**values)
+    car.clean_fields()
+    return car
+
+
+def check_public_url(url):
+    """Raise ValueError unless ``url`` is http(s) on a host with only public addresses."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f'Not an http(s) URL: {url}')
+    try:
+        addresses = socket.getaddrinfo(
+            parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80),
+            proto=socket.IPPROTO_TCP,
+        )
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f'Could not resolve {parts.hostname}: {e}')
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f'{parts.hostname} resolves to a non-public address')
+
+
+def fetch_image(url):
+    """Download a public image URL, following a few checked redirects."""
+    import requests
+    max_bytes = getattr(settings, 'CAR_IMPORT_MAX_IMAGE_BYTES', 10 * 1024 * 1024)
+    for _ in range(MAX_IMAGE_REDIRECTS + 1):
+        check_public_url(url)
+        response = requests.get(url, timeout=30, stream=True, allow_redirects=False)
+        with response:
+            if response.is_redirect:
+                url = urljoin(url, response.headers['Location'])
+                continue
+            response.raise_for_status()
+            if int(response.headers.get('Content-Length') or 0) > max_bytes:
+                raise ValueError(f'Image is larger than {max_bytes} bytes')
+            content = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                content += chunk
+                if len(content) > max_bytes:
+                    raise ValueError(f'Image is larger than {max_bytes} bytes')
+            return bytes(content)
+    raise ValueError(f'Too many redirects for {url}')
+
+
+def store_image(source, allow_local_paths=False):
+    """
+    Copy an image URL (or, if allowed, a local path) into car image
+    storage and return the stored name.
+    """
+    field = CarImage._meta.get_field('image')
+    filename = os.path.basename(source.split('?')[0]) or 'image.jpg'
+    if source.startswith(('http://', 'https://')):
+        if not REQUESTS_AVAILABLE:
+            raise ValueError('requests is not installed')
+        content = ContentFile(fetch_image(source))
+    elif allow_local_paths:
+        content = File(open(source, 'rb'))
+    else:
+        raise ValueError(f'Not an http(s) URL: {source}')
+    try:
+        name = field.generate_filename(CarImage(), filename)
+        return field.storage.save(name, content, max_length=field.max_length)
+    finally:
+        content.close()
+
+
+def _import_chunk(rows, allow_local_paths):
+    """Upload the chunk's images concurrently, then insert cars and images."""
+    executor = background.get_io_executor()
+    uploads = [
+        [executor.submit(store_image, source, allow_local_paths) for source in images]
+        for _, _, images in rows
+    ]
+
+    storage = CarImage._meta.get_field('image').storage
+    errors = []
+    cars = []
+    image_names = []
+    for (line_number, car, _), futures in zip(rows, uploads):
+        names, failure = [], None
+        for future in futures:
+            try:
+                names.append(future.result())
+            except Exception as e:
+                failure = failure or e
+        if failure is not None:
+            errors.append((line_number, f'Image could not be imported: {failure}'))
+            for name in names:
+                storage.delete(name)
+            continue
+        cars.append(car)
+        image_names.append(names)
+
+    try:
+        with transaction.atomic():
+            Car.objects.bulk_create(cars)
+            CarImage.objects.bulk_create([
+                CarImage(car=car, image=name, is_primary=(idx == 0), order=idx)
+                for car, names in zip(cars, image_names)
+                for idx, name in enumerate(names)
+            ])
+            # bulk_create() sends no signals
+            invalidate_inventory()
+    except Exception:
+        # Nothing refers to the uploaded files any more
+        for names in image_names:
+            for name in names:
+                storage.delete(name)
+        raise
+    return len(cars), errors
+
+
+def import_cars(records, chunk_size=200, allow_local_paths=False, max_images=None):
+    """
+    Import ``(line_number, record)`` pairs from ``iter_records``.
+
+    Once ``max_images`` images have been taken, records with images are
+    skipped. Returns ``(created, errors)`` where ``errors`` lists
+    ``(line_number, message)`` for the records that were skipped.
+    """
+    created = 0
+    errors = []
+    chunk = []
+    images_left = max_images
+
+    def flush():
+        nonlocal created
+        count, chunk_errors = _import_chunk(chunk, allow_local_paths)
+        created += count
+        errors.extend(chunk_errors)
+        chunk.clear()
+
+    for line_number, record in records:
+        if isinstance(record, Exception):
+            errors.append((line_number, str(record)))
+            continue
+        try:
+            car = build_car(record)
+        except ValidationError as e:
+            errors.append((line_number, '; '.join(
+                f'{field}: {" ".join(messages)}' for field, messages in e.message_dict.items()
+            )))
+            continue
+        images = record.get('images') or []
+        if isinstance(images, str):
+            images = [images]
+        if images_left is not None:
+            if len(images) > images_left:
+                errors.append((line_number, f'Image limit of {max_images} per import reached'))
+                continue
+            images_left -= len(images)
+        chunk.append((line_number, car, images))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    logger.info(f"Car import: {created} created, {len(errors)} skipped")
+    return created, sorted(errors)
+
+
+def export_records(queryset=None, chunk_size=500):
+    """Yield one dict per car, fetching cars and images ``chunk_size`` at a time."""
+    if queryset is None:
+        queryset = Car.objects.all()
+    cars = queryset.prefetch_related('images').order_by('pk').iterator(chunk_size=chunk_size)
+    for car in cars:
+        record = {name: getattr(car, name) for name in RECORD_FIELDS}
+        record['id'] = car.pk
+        record['price'] = str(car.price)
+        record['images'] = [image.image.url for image in car.images.all()]
+        record['created_at'] = car.created_at.isoformat()
+        yield record
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the line for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def export_lines(fmt, queryset=None, chunk_size=500):
+    """Yield the inventory line by line as CSV (with a header) or JSON Lines."""
+    records = export_records(queryset, chunk_size)
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+        yield writer.writeheader()
+        for record in records:
+            record['images'] = CSV_IMAGE_SEPARATOR.join(record['images'])
+            yield writer.writerow(record)
+    elif fmt == 'jsonl':
+        for record in records:
+            yield json.dumps({name: record[name] for name in EXPORT_FIELDS}) + '\n'
+    else:
+        raise ValueError(f'Unknown format: {fmt}')
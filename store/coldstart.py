@@ -0,0 +1,78 @@
+"""
+Cold-start measurement for the WSGI entry point.
+
+A fresh serverless instance imports ``mrmotors.wsgi`` (settings, every
+installed app, ``django.setup()``) before it can answer its first request.
+``measure`` does the same in a new interpreter, optionally with
+``-X importtime``, and reports how long it took and which modules it
+loaded. Integrations that only some requests need (``LAZY_MODULES``) must
+be imported on first use rather than at startup.
+"""
+from collections import defaultdict, namedtuple
+from django.conf import settings
+import json
+import os
+import subprocess
+import sys
+
+ENTRY_POINT = 'mrmotors.wsgi'
+
+# Imported on first use, never while starting up
+LAZY_MODULES = ('cloudinary', 'cloudinary_storage.storage', 'twilio')
+
+ImportTiming = namedtuple('ImportTiming', 'module self_us cumulative_us depth')
+
+_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({{'ms': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def measure(module=ENTRY_POINT, importtime=False):
+    """
+    Import ``module`` in a new interpreter and return a dict with ``ms``
+    (import wall time), ``modules`` (everything loaded) and, with
+    ``importtime``, ``imports``: the ``ImportTiming`` of every import.
+    """
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'mrmotors.settings')}
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []),
+               '-c', _SCRIPT.format(module=module)]
+    result = subprocess.run(command, cwd=settings.BASE_DIR, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f'Importing {module} failed:\n{result.stderr[-2000:]}')
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    if importtime:
+        report['imports'] = parse_importtime(result.stderr)
+    return report
+
+
+def parse_importtime(output):
+    """Parse ``-X importtime`` output into ``ImportTiming`` tuples."""
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        timings.append(ImportTiming(name.strip(), int(self_us), int(cumulative_us), depth))
+    return timings
+
+
+def by_package(imports):
+    """Total self time per top-level package, slowest first, in microseconds."""
+    totals = defaultdict(int)
+    for timing in imports:
+        totals[timing.module.split('.')[0]] += timing.self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def eager_lazy_modules(modules):
+    """The ``LAZY_MODULES`` (or their submodules) among ``modules``."""
+    return sorted(
+        name for name in modules
+        if any(name == lazy or name.startswith(f'{lazy}.') for lazy in LAZY_MODULES)
+    )
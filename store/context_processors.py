@@ -0,0 +1,19 @@
+"""Template context shared by every page (see TEMPLATES in settings)."""
+from django.utils.functional import SimpleLazyObject
+from .accounts import is_admin
+
+
+def request_is_admin(request):
+    """``is_admin(request.user)``, computed at most once per request."""
+    if not hasattr(request, '_is_admin'):
+        request._is_admin = is_admin(request.user)
+    return request._is_admin
+
+
+def navigation(request):
+    """
+    ``is_admin`` for the admin links in base.html. It is lazy, so it is
+    only evaluated when a signed-in user's navigation is rendered, and
+    memoized on the request however many times it is used.
+    """
+    return {'is_admin': SimpleLazyObject(lambda: request_is_admin(request))}
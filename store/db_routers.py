@@ -0,0 +1,71 @@
+"""
+Read-replica routing for read-only views.
+
+Views decorated with ``@read_replica`` send their ORM reads to the database
+alias named by ``settings.DATABASE_READ_REPLICA`` (see DATABASE_REPLICA_URL
+in settings); everything else, and every write, uses ``default``.
+
+A replica can lag behind the primary, so only views that can show slightly
+stale data should use it. Sessions and users (the ``auth`` and
+``sessions`` apps) are always read from the primary, so a fresh login or
+password change is seen straight away even inside a replica view, and so
+is the database cache table (``django_cache``).
+"""
+from asgiref.sync import iscoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from functools import wraps
+
+# Apps whose rows must be read from the primary
+PRIMARY_ONLY_APPS = {'auth', 'sessions', 'django_cache'}
+
+_use_replica = ContextVar('use_read_replica', default=False)
+
+
+@contextmanager
+def read_primary():
+    """Send the block's reads to the primary, even inside a ``@read_replica`` view."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_replica(view_func):
+    """Serve ``view_func``'s reads from the read replica, when one is configured."""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def wrapped(request, *args, **kwargs):
+            token = _use_replica.set(True)
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    else:
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            token = _use_replica.set(True)
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+    return wrapped
+
+
+class ReadReplicaRouter:
+    """Route reads made inside ``@read_replica`` views to the replica."""
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(settings, 'DATABASE_READ_REPLICA', None)
+        if replica and _use_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
@@ -0,0 +1,120 @@
+"""Email backends for the store app."""
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+from .timing import timed
+import atexit
+import smtplib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One live SMTP connection per (host, port, user, tls, ssl) in this process:
+# key -> [smtplib.SMTP, last_used]
+_pool = {}
+_pool_lock = threading.RLock()
+
+
+def close_pool():
+    """Close every pooled SMTP connection."""
+    with _pool_lock:
+        for connection, _ in _pool.values():
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        _pool.clear()
+
+
+atexit.register(close_pool)
+
+
+class PooledEmailBackend(EmailBackend):
+    """
+    SMTP backend that keeps its connection open between sends.
+
+    The standard backend opens (and TLS-negotiates) a new connection for
+    every ``send_mail`` call. This one parks the connection in a
+    process-wide pool when it is "closed" and hands it to the next backend
+    instance, after a NOOP health check if it has been idle for more than
+    ``EMAIL_POOL_HEALTH_CHECK_SECONDS``. Connections idle for longer than
+    ``EMAIL_POOL_MAX_IDLE_SECONDS`` are replaced, since SMTP servers drop
+    them anyway.
+    """
+
+    def _pool_key(self):
+        return (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+
+    def _is_healthy(self, connection, last_used):
+        idle = time.monotonic() - last_used
+        if idle > getattr(settings, 'EMAIL_POOL_MAX_IDLE_SECONDS', 60):
+            return False
+        if idle <= getattr(settings, 'EMAIL_POOL_HEALTH_CHECK_SECONDS', 5):
+            return True
+        try:
+            return connection.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _discard(self):
+        with _pool_lock:
+            entry = _pool.pop(self._pool_key(), None)
+        if entry:
+            try:
+                entry[0].close()
+            except (smtplib.SMTPException, OSError):
+                pass
+        self.connection = None
+
+    def open(self):
+        if self.connection:
+            return False
+        with _pool_lock:
+            entry = _pool.get(self._pool_key())
+            if entry and self._is_healthy(*entry):
+                self.connection = entry[0]
+                return True
+            if entry:
+                self._discard()
+            opened = super().open()
+            if self.connection:
+                _pool[self._pool_key()] = [self.connection, time.monotonic()]
+            return opened
+
+    def _touch(self):
+        """Mark our connection as just used, if it is the pooled one."""
+        with _pool_lock:
+            entry = _pool.get(self._pool_key())
+            if entry and self.connection is not None and entry[0] is self.connection:
+                entry[1] = time.monotonic()
+                return True
+            return False
+
+    def close(self):
+        """Return the connection to the pool instead of closing it."""
+        if self.connection is None:
+            return
+        with _pool_lock:
+            if not self._touch():
+                super().close()
+        self.connection = None
+
+    def send_messages(self, email_messages):
+        # smtplib connections are not thread-safe, so sends through the
+        # shared connection are serialised.
+        with _pool_lock, timed('email'):
+            try:
+                return super().send_messages(email_messages)
+            except OSError as e:
+                # SMTP errors such as a refused recipient leave the
+                # connection usable; socket errors and disconnects don't.
+                if isinstance(e, smtplib.SMTPServerDisconnected) or not isinstance(e, smtplib.SMTPException):
+                    logger.warning(f"Pooled SMTP connection failed, discarding it: {e}")
+                    self._discard()
+                raise
+            finally:
+                # A backend held open across many sends (e.g. an outbox
+                # drain) must not look idle to the next open() and be
+                # discarded while still in use
+                self._touch()
@@ -0,0 +1,163 @@
+"""
+The public inventory, its facets and the home page's featured cars, served
+from the tiered cache.
+
+They are read far more often than the inventory changes, so they are
+computed once per change rather than once per request: entries live in the
+``inventory`` namespace of the tiered cache (store/cache.py), and any
+change to a car or its images bumps the namespace so the next request
+rebuilds them. Rebuilds are stale-while-revalidate: while one request
+rebuilds an entry, concurrent ones get the previous version rather than
+each querying the database. Saves and car deletes do that through signals
+(store/signals.py); bulk writes, which send no signals, and image deletes
+call ``invalidate_inventory`` themselves.
+"""
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Q
+from .cache import get_tiered_cache
+from .db_routers import read_primary
+from .models import Car
+import json
+
+INVENTORY = 'inventory'
+
+# Upper bounds of the price facet's bands; the last band is open-ended
+PRICE_BANDS = (10000, 20000, 30000, 50000)
+
+
+def bump_inventory():
+    get_tiered_cache().bump(INVENTORY)
+
+
+class PendingBump:
+    """Commit hook that bumps the inventory once, however many share it."""
+
+    done = False
+
+    def __call__(self):
+        if not self.done:
+            self.done = True
+            bump_inventory()
+
+
+def invalidate_inventory(using=None):
+    """
+    Make the cached inventory stale once the current transaction commits.
+
+    Bumping before the commit would let a request rebuild the cache from
+    the old rows in between. Calls within one transaction (a bulk delete
+    cascading to images) share one ``PendingBump`` kept on the connection,
+    so it still bumps only once; the next call after it has run starts a
+    new one. One left pending by a rollback is simply reused.
+    """
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, 'pending_inventory_bump', None)
+    if pending is None or pending.done:
+        pending = connection.pending_inventory_bump = PendingBump()
+    transaction.on_commit(pending, using=using)
+
+
+def public_car_data(car):
+    """JSON-ready fields of a public car; its images should be prefetched."""
+    # Prefetched images follow CarImage ordering, so the primary one is first
+    car_images = list(car.images.all())
+    return {
+        'id': car.id,
+        'title': car.title,
+        'car_model': car.car_model,
+        'year': car.year,
+        'price': float(car.price),
+        'description': car.description,
+        'mileage': car.mileage,
+        'condition': car.condition,
+        'is_sold': car.is_sold,
+        'is_hidden': car.is_hidden,
+        'images': [{'url': img.image.url, 'is_primary': img.is_primary} for img in car_images],
+        'primary_image': car_images[0].image.url if car_images else None,
+        'created_at': car.created_at.isoformat(),
+    }
+
+
+def build_public_cars_json():
+    """The ``/api/cars/`` response body, serialized once for every request."""
+    cars = Car.objects.filter(is_hidden=False).prefetch_related('images')
+    return json.dumps(
+        {'cars': [public_car_data(car) for car in cars]}, cls=DjangoJSONEncoder
+    ).encode()
+
+
+def build_car_facets():
+    """Counts of public cars by model, year, condition, price band and availability."""
+    cars = Car.objects.filter(is_hidden=False)
+
+    def counts(field):
+        rows = cars.order_by(field).values(field).annotate(count=Count('id'))
+        return [{'value': row[field], 'count': row['count']} for row in rows]
+
+    bands = []
+    lower = None
+    for upper in (*PRICE_BANDS, None):
+        band = Q()
+        if lower is not None:
+            band &= Q(price__gte=lower)
+        if upper is not None:
+            band &= Q(price__lt=upper)
+        bands.append((lower, upper, band))
+        lower = upper
+    totals = cars.aggregate(
+        total=Count('id'),
+        available=Count('id', filter=Q(is_sold=False)),
+        **{f'price_{n}': Count('id', filter=band) for n, (_, _, band) in enumerate(bands)},
+    )
+
+    return {
+        'total': totals['total'],
+        'available': totals['available'],
+        'sold': totals['total'] - totals['available'],
+        'car_model': counts('car_model'),
+        'year': counts('year'),
+        'condition': counts('condition'),
+        'price': [
+            {'min': lower, 'max': upper, 'count': totals[f'price_{n}']}
+            for n, (lower, upper, _) in enumerate(bands)
+        ],
+    }
+
+
+def build_featured_cars():
+    """The newest available public cars, for the home page."""
+    cars = (Car.objects.filter(is_hidden=False, is_sold=False)
+            .prefetch_related('images')[:settings.FEATURED_CARS])
+    return [public_car_data(car) for car in cars]
+
+
+def cached(name, build):
+    """
+    ``build()``, cached in the inventory namespace with stale-while-revalidate.
+
+    Rebuilds read from the primary: a rebuild follows a committed change,
+    and one made from a replica that hasn't caught up yet would store the
+    old rows as fresh under the new version.
+    """
+    def build_from_primary():
+        with read_primary():
+            return build()
+
+    return get_tiered_cache().get_or_revalidate(
+        INVENTORY, name, build_from_primary,
+        settings.INVENTORY_CACHE_TIMEOUT, settings.INVENTORY_CACHE_STALE_TIMEOUT,
+    )
+
+
+def public_cars_json():
+    return cached('cars', build_public_cars_json)
+
+
+def car_facets():
+    return cached('facets', build_car_facets)
+
+
+def featured_cars():
+    return cached('featured', build_featured_cars)
@@ -0,0 +1,136 @@
+"""
+Durable background jobs: SMS sends and profile picture syncs.
+
+``queue_job`` stores a ``QueuedJob`` row in the caller's transaction, so
+the job exists exactly when the change that needs it was committed. Like
+the email outbox (store/outbox.py), jobs then run outside the
+request/response critical path:
+
+- after the response, for jobs queued during that request
+  (``JOBS_RUN_AFTER_RESPONSE``, wired up in store/signals.py);
+- by ``python manage.py run_jobs`` or the ``_admin/run-jobs/`` endpoint
+  (a Vercel Cron), which also retry failed jobs with exponential backoff.
+
+This keeps them working on Vercel, where threads left running after the
+response are frozen. Jobs are looked up by name in ``JOBS`` and called
+with the stored keyword arguments; a job fails by raising.
+"""
+from contextvars import ContextVar
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import QueuedJob
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOBS = {
+    'sms': 'store.sms.deliver_sms',
+    'google_picture_sync': 'store.profile_pictures.sync_google_profile_picture',
+}
+
+# How long a claimed job is hidden from other runners while it runs
+CLAIM_LEASE = timedelta(minutes=5)
+
+# IDs queued by the current request (see store/outbox.py)
+_pending = ContextVar('jobs_pending')
+
+
+def queue_job(name, user=None, **kwargs):
+    """Store a job; it runs once the transaction commits."""
+    if name not in JOBS:
+        raise ValueError(f'Unknown job: {name}')
+    job = QueuedJob.objects.create(name=name, user=user, kwargs=kwargs)
+    if getattr(settings, 'JOBS_RUN_AFTER_RESPONSE', True):
+        transaction.on_commit(lambda: _pending_ids().append(job.pk))
+    return job
+
+
+def _pending_ids():
+    try:
+        return _pending.get()
+    except LookupError:
+        ids = []
+        _pending.set(ids)
+        return ids
+
+
+def start_request():
+    """Give the request that is starting its own list of queued IDs."""
+    _pending.set([])
+
+
+def run_queued_after_response():
+    """
+    Run the jobs queued by the request that just finished.
+
+    Returns whether there were any.
+    """
+    pending = _pending_ids()
+    ids = pending[:]
+    pending.clear()
+    if not ids:
+        return False
+    try:
+        run_jobs(batch_size=len(ids), ids=ids)
+    except Exception as e:
+        logger.error(f"Error running queued jobs after response: {e}")
+    return True
+
+
+def retry_delay(attempts):
+    """Exponential backoff before the next attempt."""
+    base = getattr(settings, 'JOBS_BACKOFF_SECONDS', 30)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def _claim_batch(batch_size, ids=None):
+    """Lock and lease a batch of due jobs so concurrent runners skip them."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = QueuedJob.objects.select_for_update(skip_locked=True).filter(
+            status=QueuedJob.STATUS_PENDING, next_attempt_at__lte=now
+        )
+        if ids is not None:
+            due = due.filter(pk__in=ids)
+        batch = list(due[:batch_size])
+        for job in batch:
+            job.attempts += 1
+            job.next_attempt_at = now + CLAIM_LEASE
+        QueuedJob.objects.bulk_update(batch, ['attempts', 'next_attempt_at'])
+    return batch
+
+
+def run_jobs(batch_size=50, ids=None):
+    """
+    Run one batch of due jobs.
+
+    Returns ``(done, failed)`` counts. Failed jobs are rescheduled with
+    exponential backoff until ``JOBS_MAX_ATTEMPTS`` is reached.
+    """
+    batch = _claim_batch(batch_size, ids)
+    max_attempts = getattr(settings, 'JOBS_MAX_ATTEMPTS', 5)
+    done = failed = 0
+    for job in batch:
+        try:
+            import_string(JOBS[job.name])(**job.kwargs)
+        except Exception as e:
+            failed += 1
+            logger.error(f"Job {job.name} {job.pk} failed: {e}")
+            job.last_error = str(e)
+            if job.attempts >= max_attempts:
+                job.status = QueuedJob.STATUS_FAILED
+            else:
+                job.next_attempt_at = timezone.now() + retry_delay(job.attempts)
+            job.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+        else:
+            done += 1
+            job.status = QueuedJob.STATUS_DONE
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'finished_at'])
+
+    if batch:
+        logger.info(f"Job batch: {done} done, {failed} failed")
+    return done, failed
@@ -0,0 +1,327 @@
+"""
+Load-test scenarios and an in-process runner (see the ``loadtest`` command).
+
+Each scenario replays what a page does in the browser, e.g. browsing the
+inventory loads the page and then ``/api/cars/``. Virtual users, one per
+thread like gunicorn's ``--threads``, pick scenarios at random in
+proportion to the traffic mix and send their requests through Django's
+WSGI handler with the test ``Client``, so a run measures the application
+and its database without a web server or network in the way.
+
+Timings are recorded per endpoint, and ``LoadTestStats.summary`` reports
+requests/second and p50/p95/p99 latencies for each one.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from .inventory import invalidate_inventory
+from .models import AdminUser, Car, CarImage, FavoriteCar, UserProfile
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+
+PASSWORD = 'loadtest-pass'
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Create a test database for the duration of the block and destroy it
+    afterwards. SQLite databases are file based so every thread shares
+    them (in-memory ones are per connection).
+
+    A configured read replica is pointed at the same database, the way
+    Django's test runner mirrors it, so replica reads don't hit the real one.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    tmpdir = tempfile.TemporaryDirectory()
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tmpdir.name, 'bench.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    replica_alias = getattr(settings, 'DATABASE_READ_REPLICA', None)
+    replica = connections[replica_alias] if replica_alias else None
+    if replica is not None:
+        old_replica_settings = replica.settings_dict
+        replica.close()
+        replica.creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        if replica is not None:
+            replica.settings_dict = old_replica_settings
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        tmpdir.cleanup()
+        teardown_test_environment()
+
+
+def seed(cars=200, images_per_car=3, customers=50, favorites_per_customer=5, rng=None):
+    """
+    Fill the database with an inventory, customers and one admin.
+
+    Returns the ids and accounts scenarios need. Image rows point at names
+    that were never uploaded, which is fine with a fake storage backend.
+    """
+    rng = rng or random.Random(0)
+    password = make_password(PASSWORD)
+    inventory = Car.objects.bulk_create([
+        Car(title=f'Car {n}', car_model=f'Model {n % 40}', year=2000 + n % 25,
+            price=Decimal(5000 + n * 10), description='A well kept car.',
+            mileage=rng.randint(1000, 150000), condition='Used',
+            is_sold=n % 7 == 0, is_hidden=n % 11 == 0)
+        for n in range(cars)
+    ])
+    CarImage.objects.bulk_create([
+        CarImage(car=car, image=f'car_images/{car.pk}_{n}.jpg', is_primary=n == 0, order=n)
+        for car in inventory
+        for n in range(images_per_car)
+    ])
+    accounts = User.objects.bulk_create([
+        User(username=f'customer{n}', email=f'customer{n}@example.com', password=password)
+        for n in range(customers)
+    ])
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in accounts])
+    FavoriteCar.objects.bulk_create([
+        FavoriteCar(user=user, car_id=str(car.pk), car_title=car.title, car_price=car.price)
+        for user in accounts
+        for car in rng.sample(inventory, min(favorites_per_customer, len(inventory)))
+    ])
+    admin = User.objects.create_user('loadtest-admin', 'loadtest-admin@example.com', PASSWORD)
+    AdminUser.objects.create(user=admin)
+    # bulk_create() sends no signals
+    invalidate_inventory()
+    return {
+        'car_ids': [car.pk for car in inventory if not car.is_hidden],
+        'admin_car_ids': [car.pk for car in inventory],
+        'customers': accounts,
+        'admin': admin,
+    }
+
+
+class LoadTestStats:
+    """Thread-safe per-endpoint latencies (in milliseconds) and error counts."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, milliseconds, ok=True):
+        with self._lock:
+            self.latencies[endpoint].append(milliseconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        """One row per endpoint plus a ``total`` row, for a run of ``elapsed`` seconds."""
+        rows = []
+        groups = sorted(self.latencies.items())
+        groups.append(('total', [ms for _, values in groups for ms in values]))
+        for endpoint, values in groups:
+            values = sorted(values)
+            errors = sum(self.errors.values()) if endpoint == 'total' else self.errors[endpoint]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(values),
+                'errors': errors,
+                'rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+            })
+        return rows
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of already sorted values (None if empty)."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return round(sorted_values[rank - 1], 1)
+
+
+class VirtualUser:
+    """One simulated visitor: a customer account with its own sessions."""
+
+    def __init__(self, stats, data, rng):
+        self.stats = stats
+        self.data = data
+        self.rng = rng
+        self.customer = rng.choice(data['customers'])
+        self._clients = {}
+
+    def client(self, role):
+        """Logged-in ``Client`` for ``'anonymous'``, ``'customer'`` or ``'admin'``."""
+        if role not in self._clients:
+            client = Client()
+            if role == 'customer':
+                client.force_login(self.customer)
+            elif role == 'admin':
+                client.force_login(self.data['admin'])
+            self._clients[role] = client
+        return self._clients[role]
+
+    def request(self, client, method, path, name=None, data=None, json_body=False, expect=200):
+        """Send a request and record its latency under ``name`` (default: ``METHOD path``)."""
+        kwargs = {}
+        if json_body:
+            data = json.dumps(data)
+            kwargs['content_type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            response = getattr(client, method.lower())(path, data, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            ok = response.status_code == expect
+        except Exception:
+            response, ok = None, False
+        self.stats.record(name or f'{method} {path}', (time.perf_counter() - started) * 1000, ok)
+        return response
+
+    def car_id(self, admin=False):
+        return self.rng.choice(self.data['admin_car_ids' if admin else 'car_ids'])
+
+    def run(self, scenario):
+        SCENARIOS[scenario](self)
+
+
+def browse_inventory(user):
+    """Open the inventory page, which loads every listing from the API."""
+    client = user.client('anonymous')
+    user.request(client, 'GET', '/inventory/')
+    user.request(client, 'GET', '/api/cars/')
+
+
+def view_detail(user):
+    """Open a car's page as a signed-in customer, which checks their favorites."""
+    client = user.client('customer')
+    car_id = user.car_id()
+    user.request(client, 'GET', f'/car/{car_id}/', name='GET /car/<id>/')
+    user.request(client, 'GET', '/api/cars/')
+    user.request(client, 'GET', '/favorites/list/')
+
+
+def favorite_toggle(user):
+    """Heart a car from the inventory page, the way inventory.html does."""
+    client = user.client('customer')
+    car_id = str(user.car_id())
+    response = user.request(client, 'GET', '/favorites/list/')
+    favorites = response.json()['favorite_ids'] if response is not None and response.status_code == 200 else []
+    if car_id in favorites:
+        user.request(client, 'POST', '/favorites/remove/', data={'car_id': car_id}, json_body=True)
+    else:
+        user.request(client, 'POST', '/favorites/add/', data={
+            'car_id': car_id, 'car_title': 'Car', 'car_price': 10000, 'car_image_url': '',
+        }, json_body=True)
+
+
+def login(user):
+    """Sign in with email and password, then sign out."""
+    client = Client()
+    user.request(client, 'GET', '/login/')
+    user.request(client, 'POST', '/login/', data={
+        'email': user.customer.email, 'password': PASSWORD,
+    }, expect=302)
+    user.request(client, 'GET', '/logout/', expect=302)
+
+
+def admin_edit(user):
+    """Load the admin panel's car list, edit one car and toggle it sold and back."""
+    client = user.client('admin')
+    car_id = user.car_id(admin=True)
+    user.request(client, 'GET', '/api/admin/cars/')
+    user.request(client, 'POST', f'/api/cars/{car_id}/update/', name='POST /api/cars/<id>/update/',
+                 data={'price': str(user.rng.randint(5000, 50000))})
+    for _ in range(2):
+        user.request(client, 'POST', f'/api/cars/{car_id}/toggle-sold/',
+                     name='POST /api/cars/<id>/toggle-sold/')
+
+
+SCENARIOS = {
+    'browse_inventory': browse_inventory,
+    'view_detail': view_detail,
+    'favorite_toggle': favorite_toggle,
+    'login': login,
+    'admin_edit': admin_edit,
+}
+
+# Relative weights of each scenario in the default traffic mix
+DEFAULT_MIX = {
+    'browse_inventory': 40,
+    'view_detail': 30,
+    'favorite_toggle': 15,
+    'login': 10,
+    'admin_edit': 5,
+}
+
+
+def parse_mix(value):
+    """Parse ``'browse_inventory=60,login=5'`` into a scenario weight dict."""
+    mix = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario: {name} (choose from {", ".join(SCENARIOS)})')
+        try:
+            mix[name] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f'Invalid weight for {name}: {weight}')
+        if mix[name] < 0:
+            raise ValueError(f'Invalid weight for {name}: {weight}')
+    if not any(mix.values()):
+        raise ValueError('The mix needs at least one scenario with a positive weight')
+    return mix
+
+
+def run(data, mix=None, users=8, duration=None, iterations=None, seed=0):
+    """
+    Run ``users`` virtual users until ``duration`` seconds have passed or
+    ``iterations`` scenarios have been run in total, whichever comes first.
+
+    Returns ``(stats, elapsed_seconds)``.
+    """
+    if duration is None and iterations is None:
+        raise ValueError('Pass a duration or a number of iterations')
+    mix = mix or DEFAULT_MIX
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    stats = LoadTestStats()
+    lock = threading.Lock()
+    remaining = [iterations]
+
+    def claim():
+        if remaining[0] is None:
+            return True
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def virtual_user(number):
+        rng = random.Random(seed * 1000 + number)
+        user = VirtualUser(stats, data, rng)
+        try:
+            while (deadline is None or time.perf_counter() < deadline) and claim():
+                user.run(rng.choices(names, weights)[0])
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else None
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix='loadtest') as pool:
+        list(pool.map(virtual_user, range(users)))
+    return stats, time.perf_counter() - started
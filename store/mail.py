@@ -0,0 +1,42 @@
+"""
+Compose transactional emails from templates in ``templates/emails/``.
+
+Each email is a ``<name>.txt`` / ``<name>.html`` pair rendered into a
+multipart message (plain text with an HTML alternative). The engine's
+cached template loader (TEMPLATES in settings) compiles each template once
+per process, so a send only pays for rendering.
+"""
+from django.template.loader import get_template
+from .outbox import queue_email, queue_emails
+
+
+def render_email(template_name, context):
+    """Render the text and HTML bodies of ``template_name``."""
+    text_body = get_template(f'emails/{template_name}.txt').render(context)
+    html_body = get_template(f'emails/{template_name}.html').render(context)
+    return text_body.strip() + '\n', html_body
+
+
+def queue_templated_email(subject, template_name, context, to):
+    """Render ``template_name`` and queue it in the outbox."""
+    text_body, html_body = render_email(template_name, context)
+    return queue_email(subject, text_body, to, html_body=html_body)
+
+
+def queue_templated_emails(subject, template_name, recipients):
+    """
+    Render ``template_name`` once per recipient and queue all messages
+    with a single INSERT.
+
+    ``recipients`` is an iterable of ``(email_address, context)`` pairs.
+    """
+    messages = []
+    for address, context in recipients:
+        text_body, html_body = render_email(template_name, context)
+        messages.append({
+            'subject': subject,
+            'body': text_body,
+            'html_body': html_body,
+            'to': [address],
+        })
+    return queue_emails(messages)
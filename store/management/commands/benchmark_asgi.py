@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from store.loadtest import throwaway_database
+from store.models import AdminUser
+import asyncio
+import threading
+import time
+
+
+class SlowSMSTransport:
+    """SMS transport standing in for the Twilio API round-trip."""
+    latency = 0.2
+
+    def send(self, to, body):
+        time.sleep(self.latency)
+        return 'SLOW'
+
+    async def asend(self, to, body):
+        await asyncio.sleep(self.latency)
+        return 'SLOW'
+
+
+class SlowStorage(InMemoryStorage):
+    """Storage standing in for a Cloudinary upload."""
+    latency = 0.2
+
+    def _save(self, name, content):
+        time.sleep(self.latency)
+        return super()._save(name, content)
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent throughput of the async views served through WSGI and ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=40,
+                            help='Requests per scenario (default: 40)')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='WSGI worker threads, like gunicorn --threads (default: 4)')
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Simulated Twilio/Cloudinary round-trip in seconds (default: 0.2)')
+        parser.add_argument('--images', type=int, default=3,
+                            help='Images uploaded per add-car request (default: 3)')
+
+    def handle(self, *args, **options):
+        """
+        Send the same burst of requests through Django's WSGI handler
+        (a bounded thread pool, one request per thread) and its ASGI
+        handler (one event loop, as under ``uvicorn mrmotors.asgi:application``)
+        against a throwaway database, and report requests/second.
+        """
+        SlowSMSTransport.latency = SlowStorage.latency = options['latency']
+        count = options['requests']
+        images = options['images']
+
+        with throwaway_database():
+            user = User.objects.create_user('bench', 'bench@example.com', 'bench-pass')
+            user.profile.phone_number = '+15550001111'
+            user.profile.save(update_fields=['phone_number'])
+            AdminUser.objects.create(user=user)
+
+            def add_car_data():
+                return {
+                    'title': 'Bench', 'car_model': 'Bench', 'year': '2020',
+                    'price': '1000', 'description': 'Benchmark car',
+                    'images': [
+                        SimpleUploadedFile(f'{i}.jpg', b'jpeg', content_type='image/jpeg')
+                        for i in range(images)
+                    ],
+                }
+
+            scenarios = [
+                ('send SMS', '/send-phone-verification/', dict),
+                (f'add car, {images} images', '/api/cars/add/', add_car_data),
+            ]
+            with override_settings(
+                RATELIMIT_ENABLED=False,
+                SMS_TRANSPORT=f'{__name__}.SlowSMSTransport',
+                STORAGES={
+                    'default': {'BACKEND': f'{__name__}.SlowStorage'},
+                    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+                },
+            ):
+                for label, path, data in scenarios:
+                    elapsed = self.run_wsgi(user, path, data, count, options['threads'])
+                    self.report(f'{label}, WSGI x{options["threads"]}', count, elapsed)
+                    elapsed = asyncio.run(self.run_asgi(user, path, data, count))
+                    self.report(f'{label}, ASGI', count, elapsed)
+
+    def report(self, label, count, elapsed):
+        self.stdout.write(f'{label:>28}: {count} requests in {elapsed:.2f}s ({count / elapsed:.1f} req/s)')
+
+    def run_wsgi(self, user, path, data, count, threads):
+        local = threading.local()
+
+        def request(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            response = local.client.post(path, data())
+            assert response.status_code == 200, response.content
+            connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            start = time.perf_counter()
+            list(pool.map(request, range(count)))
+            return time.perf_counter() - start
+
+    async def run_asgi(self, user, path, data, count):
+        client = AsyncClient()
+        await client.aforce_login(user)
+
+        async def request():
+            response = await client.post(path, data())
+            assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*[request() for _ in range(count)])
+        return time.perf_counter() - start
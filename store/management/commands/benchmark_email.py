@@ -0,0 +1,111 @@
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from store.email_backends import close_pool
+import socketserver
+import threading
+import time
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages from smtplib and count them."""
+
+    def reply(self, line):
+        self.wfile.write(line + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        # Stand-in for the TCP + TLS handshake cost of a real SMTP server
+        time.sleep(self.server.connect_latency)
+        self.reply(b'220 localhost ESMTP stand-in')
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b'.\r\n':
+                    in_data = False
+                    self.server.received += 1
+                    self.reply(b'250 OK: queued')
+                continue
+            command = line[:4].upper()
+            if command == b'DATA':
+                in_data = True
+                self.reply(b'354 End data with <CR><LF>.<CR><LF>')
+            elif command == b'QUIT':
+                self.reply(b'221 Bye')
+                return
+            else:
+                self.reply(b'250 OK')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_latency):
+        super().__init__(('127.0.0.1', 0), SMTPStandInHandler)
+        self.connect_latency = connect_latency
+        self.received = 0
+        self.connections = 0
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-message SMTP connections against the pooled email backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=200,
+                            help='Messages sent per scenario (default: 200)')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Messages per send_messages call in the batched scenario (default: 50)')
+        parser.add_argument('--connect-latency', type=float, default=0.05,
+                            help='Simulated handshake delay per new connection in seconds (default: 0.05)')
+
+    def handle(self, *args, **options):
+        """Run each sending strategy against a local SMTP stand-in and report messages/second."""
+        count = options['messages']
+        batch_size = options['batch_size']
+        server = SMTPStandIn(options['connect_latency'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+
+        def backend(path):
+            return get_connection(
+                path, host=host, port=port, username='', password='',
+                use_tls=False, use_ssl=False, fail_silently=False,
+            )
+
+        def message(i, connection=None):
+            return EmailMessage(f'Benchmark {i}', 'Body', 'bench@example.com',
+                                ['to@example.com'], connection=connection)
+
+        def per_message(path):
+            # What send_mail() does: a fresh backend for every message
+            for i in range(count):
+                message(i, backend(path)).send()
+
+        def batched(path):
+            connection = backend(path)
+            for start in range(0, count, batch_size):
+                connection.send_messages([message(i) for i in range(start, min(start + batch_size, count))])
+
+        scenarios = [
+            ('smtp, per message', lambda: per_message('django.core.mail.backends.smtp.EmailBackend')),
+            ('pooled, per message', lambda: per_message('store.email_backends.PooledEmailBackend')),
+            ('pooled, batched', lambda: batched('store.email_backends.PooledEmailBackend')),
+        ]
+        try:
+            for label, run in scenarios:
+                close_pool()
+                received_before = server.received
+                connections_before = server.connections
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+                delivered = server.received - received_before
+                connections = server.connections - connections_before
+                self.stdout.write(
+                    f'{label:>20}: {delivered} messages over {connections} connections '
+                    f'in {elapsed:.2f}s ({delivered / elapsed:.0f} msg/s)'
+                )
+        finally:
+            close_pool()
+            server.shutdown()
+            server.server_close()
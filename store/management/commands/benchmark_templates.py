@@ -0,0 +1,95 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine, RequestContext, engines
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from store.loadtest import throwaway_database
+from store.mail import render_email
+from store.models import AdminUser
+import time
+
+
+EMAIL_CONTEXTS = {
+    'verification': {'first_name': 'Jane', 'verification_url': 'https://example.com/verify-email/token/'},
+    'verification_code': {'first_name': 'Jane', 'code': '123456'},
+    'password_reset': {'first_name': 'Jane', 'reset_url': 'https://example.com/password-reset/token/'},
+}
+
+# Page templates rendered for a signed-in admin, as their views do
+PAGES = {
+    'home': ('home.html', '/'),
+    'inventory': ('inventory.html', '/inventory/'),
+    'profile': ('profile.html', '/profile/'),
+    'admin_panel': ('admin_panel.html', '/admin-panel/'),
+}
+
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark template rendering with and without precompiled templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000,
+                            help='Renders per template (default: 1000)')
+
+    def timed(self, label, iterations, render):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            render()
+        per_render = (time.perf_counter() - start) / iterations * 1_000_000
+        self.stdout.write(f'{label:>40}: {per_render:8.1f} µs/render')
+
+    def handle(self, *args, **options):
+        """
+        Time each email template parsed per send against the cached,
+        compiled template, and each page template (with base.html and
+        the context processors) through uncached loaders against the
+        configured cached loader.
+        """
+        iterations = options['iterations']
+        engine = engines['django'].engine
+
+        self.stdout.write('Email templates (text + HTML):')
+        for name, context in EMAIL_CONTEXTS.items():
+            sources = [
+                engine.find_template(f'emails/{name}.{ext}')[0].source
+                for ext in ('txt', 'html')
+            ]
+
+            def parse_and_render():
+                for source in sources:
+                    engine.from_string(source).render(Context(context))
+
+            self.timed(f'{name} (parsed per send)', iterations, parse_and_render)
+            self.timed(f'{name} (compiled once)', iterations, lambda: render_email(name, context))
+
+        self.stdout.write('\nPage templates (signed-in admin):')
+        uncached = Engine(
+            dirs=engine.dirs, context_processors=engine.context_processors,
+            loaders=UNCACHED_LOADERS, libraries=engine.libraries,
+        )
+        with throwaway_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            user = User.objects.create_user('bench', 'bench@example.com', 'bench-pass',
+                                            first_name='Bench', last_name='User')
+            AdminUser.objects.create(user=user)
+            user = User.objects.select_related('profile', 'admin_profile').get(pk=user.pk)
+
+            for name, (template_name, path) in PAGES.items():
+                def request():
+                    request = RequestFactory().get(path)
+                    request.user = user
+                    return request
+
+                self.timed(
+                    f'{name} (uncached loaders)', iterations,
+                    lambda: uncached.get_template(template_name).render(RequestContext(request())),
+                )
+                self.timed(
+                    f'{name} (cached loader)', iterations,
+                    lambda: render_to_string(template_name, request=request()),
+                )
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from store.accounts import allocate_username
+import time
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded benchmark users."""
+
+
+def probe_username(email):
+    """The previous allocator: probe base, base1, base2... one query each."""
+    base_username = email.split('@')[0]
+    username = base_username
+    counter = 1
+    while User.objects.filter(username=username).exists():
+        username = f"{base_username}{counter}"
+        counter += 1
+    return username
+
+
+class Command(BaseCommand):
+    help = 'Benchmark username allocation against thousands of colliding users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000,
+                            help='Number of colliding users to seed (default: 5000)')
+        parser.add_argument('--base', default='benchjohn',
+                            help='Base username to collide on (default: benchjohn)')
+
+    def handle(self, *args, **options):
+        """Seed colliding users inside a transaction, time both allocators, roll back."""
+        count = options['users']
+        base = options['base']
+        email = f'{base}@example.com'
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    [User(username=base, email=email)] +
+                    [User(username=f'{base}{i}', email=email) for i in range(1, count)],
+                    batch_size=1000,
+                )
+                self.stdout.write(f'Seeded {count} users colliding on "{base}"')
+
+                for label, allocator in (('probe loop', probe_username),
+                                         ('prefix scan', allocate_username)):
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.perf_counter()
+                        username = allocator(email)
+                        elapsed = (time.perf_counter() - start) * 1000
+                    self.stdout.write(
+                        f'{label:>12}: {username} in {elapsed:.1f} ms, '
+                        f'{len(queries.captured_queries)} queries'
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished; seeded users rolled back.'))
@@ -0,0 +1,3 @@
+# cloudinary_storage isn't an installed app (see CLOUDINARY_STORAGE in
+# settings), so its command is made available here
+from cloudinary_storage.management.commands.deleteorphanedmedia import Command  # noqa: F401
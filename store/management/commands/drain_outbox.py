@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from store.outbox import drain_outbox
+import time
+
+
+class Command(BaseCommand):
+    help = 'Send pending outbox emails in batches, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Emails sent per SMTP connection (default: 50)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running as a worker instead of exiting when the outbox is empty')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to sleep between polls in --loop mode (default: 5)')
+
+    def handle(self, *args, **options):
+        """Drain due emails until none are left (or forever with --loop)."""
+        batch_size = options['batch_size']
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = drain_outbox(batch_size=batch_size)
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Batch: {sent} sent, {failed} failed')
+
+            if sent + failed < batch_size:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Outbox drained: {total_sent} sent, {total_failed} failed'
+        ))
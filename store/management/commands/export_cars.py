@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from store.car_io import FORMATS, export_lines, format_for_path
+
+
+class Command(BaseCommand):
+    help = 'Export the car inventory as CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Output format (default: from the file extension, else csv)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Cars fetched per query (default: 500)')
+
+    def handle(self, *args, **options):
+        """Write the inventory one line at a time."""
+        output = options['output']
+        fmt = options['format'] or format_for_path(output or '')
+        lines = export_lines(fmt, chunk_size=options['chunk_size'])
+        if output:
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
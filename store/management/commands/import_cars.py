@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from store.car_io import FORMATS, format_for_path, import_cars, iter_records
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Import cars from a CSV or JSON Lines file (images as URLs or local paths)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format (default: from the file extension, else csv)')
+        parser.add_argument('--chunk-size', type=int, default=200,
+                            help='Cars inserted per bulk_create (default: 200)')
+
+    def handle(self, *args, **options):
+        """Stream the file into import_cars and report skipped lines."""
+        path = options['path']
+        fmt = options['format'] or format_for_path(path)
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+
+        with stream:
+            created, errors = import_cars(
+                iter_records(stream, fmt),
+                chunk_size=options['chunk_size'],
+                allow_local_paths=True,
+            )
+
+        for line_number, message in errors:
+            self.stderr.write(f'Line {line_number}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} cars, skipped {len(errors)}'
+        ))
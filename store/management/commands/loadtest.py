@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from store import loadtest
+import json
+import random
+
+
+class Command(BaseCommand):
+    help = 'Load-test a traffic mix against a throwaway database and report latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=8,
+                            help='Concurrent virtual users, like gunicorn --threads (default: 8)')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Seconds to run for (default: 30)')
+        parser.add_argument('--iterations', type=int,
+                            help='Stop after this many scenarios instead of after --duration')
+        parser.add_argument('--mix',
+                            help='Scenario weights, e.g. "browse_inventory=60,login=5" '
+                                 f'(default: {",".join(f"{k}={v}" for k, v in loadtest.DEFAULT_MIX.items())})')
+        parser.add_argument('--cars', type=int, default=200,
+                            help='Cars in the seeded inventory (default: 200)')
+        parser.add_argument('--customers', type=int, default=50,
+                            help='Customer accounts seeded (default: 50)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed, so runs are repeatable (default: 0)')
+        parser.add_argument('--json', metavar='PATH',
+                            help='Also write the results to PATH as JSON, e.g. to compare deploys')
+
+    def handle(self, *args, **options):
+        """
+        Seed a throwaway database (SQLite file, or a test database on the
+        configured Postgres), run the mix through the WSGI handler with
+        in-memory file storage, and print one row per endpoint.
+        """
+        try:
+            mix = loadtest.parse_mix(options['mix']) if options['mix'] else loadtest.DEFAULT_MIX
+        except ValueError as e:
+            raise CommandError(str(e))
+        duration = None if options['iterations'] else options['duration']
+
+        with loadtest.throwaway_database(), override_settings(
+            # Measure capacity, not the abuse limits or the per-request budget log
+            RATELIMIT_ENABLED=False,
+            PERFORMANCE_BUDGETS={},
+            SMS_TRANSPORT='store.sms.LocMemTransport',
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+        ):
+            data = loadtest.seed(cars=options['cars'], customers=options['customers'],
+                                 rng=random.Random(options['seed']))
+            self.stdout.write(
+                f"Running {', '.join(f'{k}={v:g}' for k, v in mix.items())} "
+                f"with {options['users']} users..."
+            )
+            stats, elapsed = loadtest.run(
+                data, mix, users=options['users'], duration=duration,
+                iterations=options['iterations'], seed=options['seed'],
+            )
+
+        rows = stats.summary(elapsed)
+        self.write_table(rows, elapsed)
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump({'users': options['users'], 'mix': mix, 'elapsed_s': round(elapsed, 2),
+                           'endpoints': rows}, f, indent=2)
+            self.stdout.write(f"Results written to {options['json']}")
+
+    def write_table(self, rows, elapsed):
+        def ms(value):
+            return '-' if value is None else f'{value:.1f}'
+
+        self.stdout.write(f'\n{elapsed:.1f}s elapsed')
+        self.stdout.write(
+            f"{'endpoint':<36} {'requests':>8} {'errors':>6} {'req/s':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for row in rows:
+            line = (
+                f"{row['endpoint']:<36} {row['requests']:>8} {row['errors']:>6} {row['rps']:>7.1f} "
+                f"{ms(row['p50_ms']):>8} {ms(row['p95_ms']):>8} {ms(row['p99_ms']):>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
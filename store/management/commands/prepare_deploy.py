@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pathlib import Path
+from store.warmup import warm_up
+import compileall
+
+
+class Command(BaseCommand):
+    help = 'Build step for serverless deploys: byte-compile sources and check the warm-up'
+
+    def handle(self, *args, **options):
+        """
+        Byte-compile the project's packages so instances don't compile them
+        on import, then run the start-up warm-up strictly: a URLconf or
+        template that fails to load fails the build instead of the first
+        request.
+        """
+        base_dir = Path(settings.BASE_DIR).resolve()
+        packages = {base_dir / settings.WSGI_APPLICATION.split('.')[0]}
+        packages.update(
+            Path(config.path).resolve() for config in apps.get_app_configs()
+            if Path(config.path).resolve().is_relative_to(base_dir)
+        )
+        for package in sorted(packages):
+            if not compileall.compile_dir(package, quiet=1):
+                raise CommandError(f'Byte-compiling {package} failed')
+            self.stdout.write(f'Byte-compiled {package.relative_to(base_dir)}')
+
+        try:
+            timings = warm_up(strict=True)
+        except Exception as e:
+            raise CommandError(f'Warm-up failed: {e}')
+        for step, ms in timings.items():
+            self.stdout.write(f'{step:>14}: {ms:.1f} ms')
+        self.stdout.write(self.style.SUCCESS('Deploy build prepared'))
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from store import coldstart
+
+
+class Command(BaseCommand):
+    help = 'Profile the cold start of the WSGI entry point with python -X importtime'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default=coldstart.ENTRY_POINT,
+                            help=f'Module to import (default: {coldstart.ENTRY_POINT})')
+        parser.add_argument('--runs', type=int, default=3,
+                            help='Cold starts to time; the fastest is reported (default: 3)')
+        parser.add_argument('--top', type=int, default=20,
+                            help='Packages and imports to list (default: 20)')
+
+    def handle(self, *args, **options):
+        """
+        Time ``--runs`` cold imports, then break one ``-X importtime`` run
+        down by package and by slowest import, and check the result against
+        ``COLD_START_BUDGET_MS``.
+        """
+        module, top = options['module'], options['top']
+        runs = [coldstart.measure(module) for _ in range(max(options['runs'], 1))]
+        profile = coldstart.measure(module, importtime=True)
+
+        self.stdout.write(f'Self time by package ({module}):')
+        for package, self_us in coldstart.by_package(profile['imports'])[:top]:
+            self.stdout.write(f'{package:>40}: {self_us / 1000:8.1f} ms')
+
+        self.stdout.write('\nSlowest imports (cumulative):')
+        slowest = sorted(profile['imports'], key=lambda timing: timing.cumulative_us, reverse=True)
+        for timing in slowest[:top]:
+            self.stdout.write(f'{timing.module:>40}: {timing.cumulative_us / 1000:8.1f} ms')
+
+        eager = coldstart.eager_lazy_modules(profile['modules'])
+        if eager:
+            self.stdout.write(self.style.WARNING(
+                f'\nImported at startup but meant to be lazy: {", ".join(eager)}'
+            ))
+
+        best = min(run['ms'] for run in runs)
+        budget = settings.COLD_START_BUDGET_MS
+        summary = (f'\nCold start: {best:.0f} ms (best of {len(runs)}, '
+                   f'{len(profile["modules"])} modules), budget {budget:.0f} ms')
+        self.stdout.write(self.style.SUCCESS(summary) if best <= budget else self.style.ERROR(summary))
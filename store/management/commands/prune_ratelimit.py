@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from store.ratelimit import prune_buckets
+
+
+class Command(BaseCommand):
+    help = 'Delete rate-limit buckets that have been idle long enough to be full again'
+
+    def handle(self, *args, **options):
+        pruned = prune_buckets()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} idle rate-limit buckets'))
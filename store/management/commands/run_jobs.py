@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from store.jobs import run_jobs
+import time
+
+
+class Command(BaseCommand):
+    help = 'Run due queued jobs in batches, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Jobs claimed at a time (default: 50)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running as a worker instead of exiting when no jobs are due')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to sleep between polls in --loop mode (default: 5)')
+
+    def handle(self, *args, **options):
+        """Run due jobs until none are left (or forever with --loop)."""
+        batch_size = options['batch_size']
+        total_done = total_failed = 0
+
+        while True:
+            done, failed = run_jobs(batch_size=batch_size)
+            total_done += done
+            total_failed += failed
+            if done or failed:
+                self.stdout.write(f'Batch: {done} done, {failed} failed')
+
+            if done + failed < batch_size:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Jobs run: {total_done} done, {total_failed} failed'
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from store.models import CODE_LIFETIME, UserProfile
+
+# (code, created, attempts) field triples swept by this command
+CODE_FIELDS = [
+    ('verification_code', 'verification_code_created', 'verification_code_attempts'),
+    ('phone_verification_code', 'phone_verification_code_created', 'phone_verification_code_attempts'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Clear expired email and phone verification codes in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Profiles updated per UPDATE statement (default: 500)')
+
+    def handle(self, *args, **options):
+        """Null out codes older than CODE_LIFETIME, one short UPDATE per batch."""
+        batch_size = options['batch_size']
+        cutoff = timezone.now() - CODE_LIFETIME
+
+        for code_field, created_field, attempts_field in CODE_FIELDS:
+            cleared = 0
+            expired = UserProfile.objects.filter(**{f'{created_field}__lt': cutoff})
+            while True:
+                ids = list(expired.values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                cleared += UserProfile.objects.filter(pk__in=ids).update(**{
+                    code_field: None, created_field: None, attempts_field: 0,
+                })
+            self.stdout.write(f'{code_field}: {cleared} expired codes cleared')
+
+        self.stdout.write(self.style.SUCCESS('Verification code sweep complete'))
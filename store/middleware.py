@@ -0,0 +1,125 @@
+"""Request middleware for the store app."""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import load_backend
+from django.contrib.auth.models import AnonymousUser, User
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+from . import timing
+
+
+def get_user_with_profile(request):
+    """
+    Load the session's user together with its profile and admin record.
+
+    Mirrors ``django.contrib.auth.get_user`` for the common case of a valid
+    session, but fetches ``User``, ``UserProfile`` and ``AdminUser`` in one
+    joined query. Anything unusual (unknown backend, stale session hash,
+    rotated secret keys) is handed to Django's own implementation.
+    """
+    try:
+        user_id = User._meta.pk.to_python(request.session[auth.SESSION_KEY])
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+
+    if backend_path in settings.AUTHENTICATION_BACKENDS:
+        user = (
+            User._default_manager
+            .select_related('profile', 'admin_profile')
+            .filter(pk=user_id)
+            .first()
+        )
+        if user is not None and load_backend(backend_path).user_can_authenticate(user):
+            session_hash = request.session.get(auth.HASH_SESSION_KEY)
+            if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+                return user
+
+    return auth.get_user(request)
+
+
+def get_cached_user(request):
+    """Return the request's user, loading it at most once per request."""
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user_with_profile(request)
+    return request._cached_user
+
+
+async def aget_cached_user(request):
+    """Async version of ``get_cached_user``, backing ``request.auser()``."""
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = await sync_to_async(get_user_with_profile)(request)
+    return request._cached_user
+
+
+class UserProfileMiddleware:
+    """
+    Replace the lazy ``request.user`` and ``request.auser`` set by
+    AuthenticationMiddleware with versions that load the profile in the
+    same query, so templates and views reading ``request.user.profile``
+    don't trigger a second lookup. Both share one cached user, and the
+    middleware runs natively under ASGI so async views stay on the event
+    loop.
+
+    Must be listed after ``AuthenticationMiddleware``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _set_user(self, request):
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+        request.auser = lambda: aget_cached_user(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._set_user(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._set_user(request)
+        return await self.get_response(request)
+
+
+class ServerTimingMiddleware:
+    """
+    Measure each request and report where the time went (store/timing.py):
+    DB, storage, email and SMS time plus the total, as a ``Server-Timing``
+    header and a log line, with a warning for requests over
+    ``PERFORMANCE_BUDGETS``.
+
+    List it first so the timings cover the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = timing.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.finish(timings, token)
+        timing.report(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        timings, token = timing.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.finish(timings, token)
+        timing.report(request, response, timings)
+        return response
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Index auth_user.email case-insensitively for the email lookups in
+    store.accounts. auth.User is not ours to add Meta.indexes to, so the
+    expression index is created with raw SQL (valid on PostgreSQL and SQLite).
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('store', '0010_userprofile_phone_verification_code_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_email_lower_idx ON auth_user (LOWER(email));',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_email_lower_idx;',
+        ),
+    ]
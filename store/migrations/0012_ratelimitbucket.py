@@ -0,0 +1,22 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_auth_user_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.FloatField(help_text='Unix timestamp of the last refill')),
+            ],
+        ),
+    ]
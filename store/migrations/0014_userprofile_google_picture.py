@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='google_picture_etag',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='google_picture_url',
+            field=models.URLField(blank=True, help_text='Google picture URL the profile picture was last synced from', max_length=500, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_userprofile_google_picture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='html_body',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:55
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_outboundemail_html_body'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='reset_token',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='reset_token_created',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='verification_token',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.11 on 2026-10-19 14:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_remove_stored_tokens'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='phone_verification_code_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='verification_code_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('verification_code_created__isnull', False)), fields=['verification_code_created'], name='profile_email_code_created'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('phone_verification_code_created__isnull', False)), fields=['phone_verification_code_created'], name='profile_phone_code_created'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-19 16:02
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    """
+    Create the database cache table when CACHES uses it (CACHE_URL=db), so
+    deployments that only run migrations (e.g. /_admin/run-migrations/) get
+    it too. Does nothing for other cache backends or an existing table.
+    """
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_verification_code_attempts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
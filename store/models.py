@@ -2,13 +2,20 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from datetime import timedelta
-import secrets
+from .tokens import PASSWORD_RESET, VERIFY_EMAIL, make_token
 import os
 import uuid
 import random
 
+# Verification codes expire after CODE_LIFETIME and are discarded after
+# MAX_CODE_ATTEMPTS wrong guesses
+CODE_LIFETIME = timedelta(minutes=10)
+MAX_CODE_ATTEMPTS = 5
+
 def user_profile_picture_path(instance, filename):
     """Generate upload path for user profile pictures."""
     ext = filename.split('.')[-1]
@@ -32,88 +39,160 @@ class UserProfile(models.Model):
         help_text="Upload a profile picture (JPG, PNG, max 5MB)"
     )
     email_verified = models.BooleanField(default=False)
-    verification_token = models.CharField(max_length=255, blank=True, null=True)
     verification_code = models.CharField(max_length=6, blank=True, null=True)
     verification_code_created = models.DateTimeField(blank=True, null=True)
+    verification_code_attempts = models.PositiveSmallIntegerField(default=0)
     phone_verified = models.BooleanField(default=False)
     phone_verification_code = models.CharField(max_length=6, blank=True, null=True)
     phone_verification_code_created = models.DateTimeField(blank=True, null=True)
-    reset_token = models.CharField(max_length=255, blank=True, null=True)
-    reset_token_created = models.DateTimeField(blank=True, null=True)
+    phone_verification_code_attempts = models.PositiveSmallIntegerField(default=0)
+    google_picture_url = models.URLField(
+        max_length=500,
+        blank=True,
+        null=True,
+        help_text="Google picture URL the profile picture was last synced from"
+    )
+    google_picture_etag = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Partial indexes so the expired-code sweeper only visits rows with a code
+        indexes = [
+            models.Index(
+                fields=['verification_code_created'],
+                name='profile_email_code_created',
+                condition=models.Q(verification_code_created__isnull=False),
+            ),
+            models.Index(
+                fields=['phone_verification_code_created'],
+                name='profile_phone_code_created',
+                condition=models.Q(phone_verification_code_created__isnull=False),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+    def _check_code(self, prefix, code):
+        """
+        Check a submitted code against ``<prefix>_code``.
+
+        Every guess is checked against the stored row, not just this
+        instance, so parallel guesses can't go past MAX_CODE_ATTEMPTS: a
+        wrong guess is counted with a single UPDATE that only matches while
+        the code is unchanged and under the limit, and the guess that
+        reaches the limit discards the code in the same statement. Once it
+        is discarded a new one must be requested, so further guesses cost
+        no writes at all.
+        """
+        code_field, created_field, attempts_field = (
+            prefix, f'{prefix}_created', f'{prefix}_attempts'
+        )
+        stored_code = getattr(self, code_field)
+        created = getattr(self, created_field)
+        if not stored_code or not created:
+            return False
+        if timezone.now() >= created + CODE_LIFETIME:
+            return False
+
+        current = UserProfile.objects.filter(**{
+            'pk': self.pk,
+            code_field: stored_code,
+            f'{attempts_field}__lt': MAX_CODE_ATTEMPTS,
+        })
+        if constant_time_compare(stored_code, code or ''):
+            if current.exists():
+                return True
+        else:
+            reaches_limit = Q(**{f'{attempts_field}__gte': MAX_CODE_ATTEMPTS - 1})
+            counted = current.update(**{
+                attempts_field: F(attempts_field) + 1,
+                code_field: Case(When(reaches_limit, then=Value(None)), default=F(code_field)),
+                created_field: Case(When(reaches_limit, then=Value(None)), default=F(created_field)),
+            })
+            if counted:
+                attempts = getattr(self, attempts_field) + 1
+                setattr(self, attempts_field, attempts)
+                if attempts >= MAX_CODE_ATTEMPTS:
+                    setattr(self, code_field, None)
+                    setattr(self, created_field, None)
+                return False
+
+        # Locked out or replaced by another request meanwhile
+        self.refresh_from_db(fields=[code_field, created_field, attempts_field])
+        return False
+
+    @property
+    def verification_code_locked(self):
+        """True once too many wrong email codes have been entered."""
+        return self.verification_code_attempts >= MAX_CODE_ATTEMPTS
+
+    @property
+    def phone_verification_code_locked(self):
+        """True once too many wrong phone codes have been entered."""
+        return self.phone_verification_code_attempts >= MAX_CODE_ATTEMPTS
+
     def generate_verification_token(self):
-        """Generate a unique verification token."""
-        self.verification_token = secrets.token_urlsafe(32)
-        self.save()
-        return self.verification_token
+        """Generate a signed email verification token (nothing is stored)."""
+        return make_token(self.user, VERIFY_EMAIL)
     
     def generate_verification_code(self):
         """Generate a 6-digit verification code."""
         self.verification_code = ''.join([str(random.randint(0, 9)) for _ in range(6)])
         self.verification_code_created = timezone.now()
-        self.save()
+        self.verification_code_attempts = 0
+        self.save(update_fields=[
+            'verification_code', 'verification_code_created',
+            'verification_code_attempts', 'updated_at',
+        ])
         return self.verification_code
     
     def is_verification_code_valid(self, code):
         """Check if verification code is valid and not expired (10 minutes)."""
-        if not self.verification_code or not self.verification_code_created:
-            return False
-        if self.verification_code != code:
-            return False
-        expiry = self.verification_code_created + timedelta(minutes=10)
-        return timezone.now() < expiry
+        return self._check_code('verification_code', code)
     
     def generate_phone_verification_code(self):
         """Generate a 6-digit phone verification code."""
         self.phone_verification_code = ''.join([str(random.randint(0, 9)) for _ in range(6)])
         self.phone_verification_code_created = timezone.now()
-        self.save()
+        self.phone_verification_code_attempts = 0
+        self.save(update_fields=[
+            'phone_verification_code', 'phone_verification_code_created',
+            'phone_verification_code_attempts', 'updated_at',
+        ])
         return self.phone_verification_code
     
     def is_phone_verification_code_valid(self, code):
         """Check if phone verification code is valid and not expired (10 minutes)."""
-        if not self.phone_verification_code or not self.phone_verification_code_created:
-            return False
-        if self.phone_verification_code != code:
-            return False
-        expiry = self.phone_verification_code_created + timedelta(minutes=10)
-        return timezone.now() < expiry
+        return self._check_code('phone_verification_code', code)
 
     def generate_reset_token(self):
-        """Generate a unique password reset token."""
-        self.reset_token = secrets.token_urlsafe(32)
-        self.reset_token_created = timezone.now()
-        self.save()
-        return self.reset_token
+        """Generate a signed password reset token, valid for 24 hours (nothing is stored)."""
+        return make_token(self.user, PASSWORD_RESET)
 
     def verify_email(self):
         """Mark email as verified."""
         self.email_verified = True
-        self.verification_token = None
         self.verification_code = None
         self.verification_code_created = None
-        self.save()
+        self.verification_code_attempts = 0
+        self.save(update_fields=[
+            'email_verified', 'verification_code', 'verification_code_created',
+            'verification_code_attempts', 'updated_at',
+        ])
     
     def verify_phone(self):
         """Mark phone as verified."""
         self.phone_verified = True
         self.phone_verification_code = None
         self.phone_verification_code_created = None
-        self.save()
+        self.phone_verification_code_attempts = 0
+        self.save(update_fields=[
+            'phone_verified', 'phone_verification_code',
+            'phone_verification_code_created', 'phone_verification_code_attempts', 'updated_at',
+        ])
 
-    @property
-    def is_reset_token_valid(self):
-        """Check if reset token is still valid (24 hours)."""
-        if not self.reset_token or not self.reset_token_created:
-            return False
-        expiry = self.reset_token_created + timedelta(hours=24)
-        return timezone.now() < expiry
-    
     @property
     def favorite_cars_count(self):
         """Get count of favorite cars."""
@@ -188,25 +267,85 @@ class AdminUser(models.Model):
         return f"Admin: {self.user.email}"
 
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Create a UserProfile whenever a User is created."""
-    if created:
-        UserProfile.objects.create(user=instance)
+class OutboundEmail(models.Model):
+    """Email waiting in the outbox for delivery (see store/outbox.py)."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, default='')
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+    
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+
+class QueuedJob(models.Model):
+    """Background job waiting to run (see store/jobs.py)."""
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=50)
+    kwargs = models.JSONField(default=dict)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True,
+                             related_name='queued_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+    
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class RateLimitBucket(models.Model):
+    """Token-bucket state for store.ratelimit.DatabaseStore."""
+    key = models.CharField(max_length=255, unique=True)
+    tokens = models.FloatField()
+    updated_at = models.FloatField(help_text="Unix timestamp of the last refill")
+    
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.2f} tokens"
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def create_user_profile(sender, instance, created, **kwargs):
     """
-    Save the UserProfile whenever the User is saved.
-    Made defensive to handle database schema issues during deployment.
+    Create a UserProfile whenever a User is created.
+
+    Profile changes are saved explicitly where they are made, so ordinary
+    User saves (e.g. the last_login update on every login) never touch the
+    profile row.
     """
-    if hasattr(instance, 'profile'):
-        try:
-            instance.profile.save()
-        except Exception as e:
-            # Log error but don't fail the user save
-            # This handles cases where database schema isn't fully migrated yet
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Failed to save user profile for user {instance.id}: {e}")
+    if created:
+        UserProfile.objects.get_or_create(user=instance)
@@ -0,0 +1,173 @@
+"""
+Transactional outbox for transactional email.
+
+Views call ``queue_email`` inside the same database transaction that
+creates the token or code being mailed, so either both are stored or
+neither is. Delivery happens outside the request/response critical path:
+
+- after the response, for emails queued during that request
+  (``EMAIL_OUTBOX_SEND_AFTER_RESPONSE``, wired up in store/signals.py);
+- by ``python manage.py drain_outbox`` or the ``_admin/drain-outbox/``
+  endpoint, which also retry failed sends with exponential backoff.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboundEmail
+from contextvars import ContextVar
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed email is hidden from other drains while being sent
+CLAIM_LEASE = timedelta(minutes=5)
+
+# IDs queued by the current request; a context variable rather than a
+# thread-local, since async requests share threads
+_pending = ContextVar('outbox_pending')
+
+
+def queue_email(subject, body, to, from_email=None, html_body=''):
+    """Store an email in the outbox; it is sent once the transaction commits."""
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+    _send_after_response([email.pk])
+    return email
+
+
+def queue_emails(messages):
+    """
+    Store several emails in the outbox with one INSERT.
+
+    ``messages`` are dicts of ``queue_email`` keyword arguments.
+    """
+    emails = OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=message['subject'],
+            body=message['body'],
+            html_body=message.get('html_body', ''),
+            from_email=message.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+            to=list(message['to']),
+        )
+        for message in messages
+    ])
+    _send_after_response([email.pk for email in emails if email.pk])
+    return emails
+
+
+def _send_after_response(ids):
+    if ids and getattr(settings, 'EMAIL_OUTBOX_SEND_AFTER_RESPONSE', True):
+        transaction.on_commit(lambda: _pending_ids().extend(ids))
+
+
+def _pending_ids():
+    try:
+        return _pending.get()
+    except LookupError:
+        ids = []
+        _pending.set(ids)
+        return ids
+
+
+def start_request():
+    """
+    Give the request that is starting its own list of queued IDs.
+
+    Set where the request starts so that views running in a copy of its
+    context (async views, ``sync_to_async``) add to the same list that
+    ``send_queued_after_response`` reads.
+    """
+    _pending.set([])
+
+
+def send_queued_after_response():
+    """
+    Deliver the emails queued by the request that just finished.
+
+    Returns whether there were any.
+    """
+    pending = _pending_ids()
+    ids = pending[:]
+    pending.clear()
+    if not ids:
+        return False
+    try:
+        drain_outbox(batch_size=len(ids), ids=ids)
+    except Exception as e:
+        logger.error(f"Error sending queued emails after response: {e}")
+    return True
+
+
+def retry_delay(attempts):
+    """Exponential backoff before the next attempt."""
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_SECONDS', 30)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def _claim_batch(batch_size, ids=None):
+    """Lock and lease a batch of due emails so concurrent drains skip them."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+            status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now
+        )
+        if ids is not None:
+            due = due.filter(pk__in=ids)
+        batch = list(due[:batch_size])
+        for email in batch:
+            email.attempts += 1
+            email.next_attempt_at = now + CLAIM_LEASE
+        OutboundEmail.objects.bulk_update(batch, ['attempts', 'next_attempt_at'])
+    return batch
+
+
+def drain_outbox(batch_size=50, ids=None):
+    """
+    Send one batch of due emails over a single SMTP connection.
+
+    Returns ``(sent, failed)`` counts. Failed emails are rescheduled with
+    exponential backoff until ``EMAIL_OUTBOX_MAX_ATTEMPTS`` is reached.
+    """
+    batch = _claim_batch(batch_size, ids)
+    if not batch:
+        return 0, 0
+
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    sent = failed = 0
+    with get_connection(fail_silently=False) as connection:
+        for email in batch:
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email,
+                to=email.to,
+                connection=connection,
+            )
+            if email.html_body:
+                message.attach_alternative(email.html_body, 'text/html')
+            try:
+                message.send()
+            except Exception as e:
+                failed += 1
+                logger.error(f"Error sending outbox email {email.pk} to {email.to}: {e}")
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = OutboundEmail.STATUS_FAILED
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                email.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+            else:
+                sent += 1
+                email.status = OutboundEmail.STATUS_SENT
+                email.sent_at = timezone.now()
+                email.save(update_fields=['status', 'sent_at'])
+
+    logger.info(f"Outbox batch: {sent} sent, {failed} failed")
+    return sent, failed
@@ -0,0 +1,95 @@
+"""
+Sync profile pictures from Google accounts.
+
+The OAuth signal handlers only compare the Google picture URL with the one
+last synced and, if it changed, queue ``sync_google_profile_picture`` as a
+job (store/jobs.py), which runs after the login response or from the
+job cron. The job downloads the picture with a conditional request
+(``If-None-Match``) and skips the storage upload when Google reports the
+image unchanged.
+"""
+from django.core.files.base import ContentFile
+from .jobs import queue_job
+from .models import UserProfile
+import importlib.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Optional: requests is only imported when first used, which keeps it off
+# the cold-start path
+REQUESTS_AVAILABLE = importlib.util.find_spec('requests') is not None
+if not REQUESTS_AVAILABLE:
+    logger.warning("requests library not available - profile picture sync disabled")
+
+
+def schedule_google_picture_sync(user, picture_url):
+    """Queue a picture sync for ``user`` if ``picture_url`` is new to us."""
+    if not REQUESTS_AVAILABLE or not picture_url or not hasattr(user, 'profile'):
+        return False
+
+    profile = user.profile
+    if profile.google_picture_url == picture_url and profile.profile_picture:
+        return False
+
+    queue_job('google_picture_sync', user=user, user_id=user.pk, picture_url=picture_url)
+    return True
+
+
+def _file_extension(picture_url):
+    """Get file extension from URL or default to jpg."""
+    last_segment = picture_url.split('?')[0].rsplit('/', 1)[-1]
+    if '.' in last_segment:
+        return last_segment.rsplit('.', 1)[-1]
+    return 'jpg'
+
+
+def sync_google_profile_picture(user_id, picture_url):
+    """Download the Google picture and store it as the user's profile picture."""
+    profile = UserProfile.objects.filter(user_id=user_id).first()
+    if profile is None:
+        return False
+
+    import requests
+
+    headers = {}
+    if profile.google_picture_etag:
+        headers['If-None-Match'] = profile.google_picture_etag
+
+    try:
+        response = requests.get(picture_url, headers=headers, timeout=5)
+    except requests.RequestException as e:
+        logger.warning(f"Failed to download Google profile picture: {e}")
+        return False
+
+    etag = response.headers.get('ETag')
+    unchanged = response.status_code == 304 or (
+        response.status_code == 200 and etag and etag == profile.google_picture_etag
+        and profile.profile_picture
+    )
+    if unchanged:
+        profile.google_picture_url = picture_url
+        profile.save(update_fields=['google_picture_url', 'updated_at'])
+        logger.info(f"Google profile picture unchanged for user {user_id}")
+        return False
+
+    if response.status_code != 200:
+        logger.warning(f"Google profile picture request returned {response.status_code}")
+        return False
+
+    # Delete old picture if exists
+    if profile.profile_picture:
+        try:
+            profile.profile_picture.delete(save=False)
+        except Exception as e:
+            logger.warning(f"Failed to delete old profile picture for user {user_id}: {e}")
+
+    file_name = f'google_profile_{user_id}.{_file_extension(picture_url)}'
+    profile.profile_picture.save(file_name, ContentFile(response.content), save=False)
+    profile.google_picture_url = picture_url
+    profile.google_picture_etag = etag
+    profile.save(update_fields=[
+        'profile_picture', 'google_picture_url', 'google_picture_etag', 'updated_at',
+    ])
+    logger.info(f"Synced Google profile picture for user {user_id}")
+    return True
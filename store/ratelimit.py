@@ -0,0 +1,224 @@
+"""
+Token-bucket rate limiting for the auth and verification views.
+
+Each limited view gets a bucket per client IP and per account. A bucket
+holds up to ``capacity`` tokens and refills at ``capacity / period`` tokens
+per second; every request takes one token and is rejected when the bucket
+is empty. Bucket state lives in a pluggable store selected by
+``settings.RATELIMIT_STORE``:
+
+- ``store.ratelimit.LocalMemoryStore``: process-local, exact, not shared.
+- ``store.ratelimit.CacheStore``: Django's default cache (shared when the
+  cache is).
+- ``store.ratelimit.DatabaseStore``: ``RateLimitBucket`` rows, shared and
+  consistent across instances at the cost of one locked write per request.
+  Rows of idle buckets are deleted by ``prune_buckets``, run by the
+  ``prune_ratelimit`` command or the ``_admin/prune-ratelimit/`` cron.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.utils.module_loading import import_string
+from .accounts import normalize_email
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+LIMITED_MESSAGE = 'Too many attempts. Please wait a moment and try again.'
+
+
+def parse_rate(rate):
+    """Parse a rate such as ``'5/m'`` into ``(capacity, tokens_per_second)``."""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period]
+
+
+def take_token(state, capacity, refill_rate, now):
+    """
+    Refill a bucket and try to take one token from it.
+
+    ``state`` is ``(tokens, updated_at)`` or None for a new, full bucket.
+    Returns ``(new_state, allowed, retry_after_seconds)``.
+    """
+    tokens, updated_at = state if state else (capacity, now)
+    tokens = min(capacity, tokens + max(0, now - updated_at) * refill_rate)
+    if tokens >= 1:
+        return (tokens - 1, now), True, 0
+    return (tokens, now), False, (1 - tokens) / refill_rate
+
+
+class LocalMemoryStore:
+    """Keep buckets in this process, bounded to the most recent keys."""
+
+    max_entries = 10000
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        with self._lock:
+            state, allowed, retry_after = take_token(
+                self._buckets.pop(key, None), capacity, refill_rate, time.time()
+            )
+            self._buckets[key] = state
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class CacheStore:
+    """
+    Keep buckets in the default Django cache.
+
+    The read-modify-write is not atomic, so concurrent requests may
+    occasionally both get the last token; that is fine for throttling.
+    """
+
+    key_prefix = 'ratelimit:'
+
+    def consume(self, key, capacity, refill_rate):
+        cache_key = self.key_prefix + key
+        state, allowed, retry_after = take_token(
+            cache.get(cache_key), capacity, refill_rate, time.time()
+        )
+        # Once a bucket would have refilled completely it no longer matters
+        cache.set(cache_key, state, timeout=int(capacity / refill_rate) + 1)
+        return allowed, retry_after
+
+
+class DatabaseStore:
+    """Keep buckets in the RateLimitBucket table, locking the row per request."""
+
+    def consume(self, key, capacity, refill_rate):
+        from .models import RateLimitBucket
+
+        now = time.time()
+        with transaction.atomic():
+            bucket, created = RateLimitBucket.objects.select_for_update().get_or_create(
+                key=key, defaults={'tokens': capacity, 'updated_at': now}
+            )
+            state, allowed, retry_after = take_token(
+                (bucket.tokens, bucket.updated_at), capacity, refill_rate, now
+            )
+            bucket.tokens, bucket.updated_at = state
+            bucket.save(update_fields=['tokens', 'updated_at'])
+        return allowed, retry_after
+
+
+def prune_buckets(now=None):
+    """
+    Delete ``RateLimitBucket`` rows that have refilled completely.
+
+    A bucket left alone for the longest period is full again whatever its
+    rate, which is the same as having no row. Returns how many were deleted.
+    """
+    from .models import RateLimitBucket
+
+    cutoff = (now or time.time()) - max(PERIODS.values())
+    deleted, _ = RateLimitBucket.objects.filter(updated_at__lt=cutoff).delete()
+    return deleted
+
+
+_stores = {}
+
+
+def get_store():
+    """Return the configured bucket store, instantiated once per process."""
+    path = getattr(settings, 'RATELIMIT_STORE', 'store.ratelimit.CacheStore')
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
+
+
+def client_ip(request):
+    """
+    Return the client IP as seen by the outermost trusted proxy.
+
+    Each of the ``RATELIMIT_TRUSTED_PROXIES`` proxies in front of the app
+    appends the address it got the request from to ``X-Forwarded-For``, so
+    the client is that many entries from the right; entries further left
+    come from the client and could be anything.
+    """
+    depth = getattr(settings, 'RATELIMIT_TRUSTED_PROXIES', 1)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    hops = [hop.strip() for hop in forwarded.split(',') if hop.strip()]
+    if depth and hops:
+        return hops[-min(depth, len(hops))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def account_key(request):
+    """Identify the account a request acts on: the user, else the posted email."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    email = normalize_email(request.POST.get('email'))
+    return f'email:{email}' if email else None
+
+
+def ratelimit(scope, rate, methods=('POST',), json=False, redirect_to=None):
+    """
+    Limit a view to ``rate`` requests per client IP and per account.
+
+    ``rate`` can be overridden per scope with ``settings.RATELIMIT_RATES``.
+    Limited requests get a 429 JSON error when ``json`` is set, otherwise a
+    flash message and a redirect to ``redirect_to`` (default: the same path).
+    """
+    def limit(request):
+        """Consume a token per key; return the throttled response, if any."""
+        if not getattr(settings, 'RATELIMIT_ENABLED', True) or request.method not in methods:
+            return None
+
+        capacity, refill_rate = parse_rate(
+            getattr(settings, 'RATELIMIT_RATES', {}).get(scope, rate)
+        )
+        store = get_store()
+        keys = [f'{scope}:ip:{client_ip(request)}']
+        account = account_key(request)
+        if account:
+            keys.append(f'{scope}:{account}')
+
+        for key in keys:
+            allowed, retry_after = store.consume(key, capacity, refill_rate)
+            if not allowed:
+                logger.warning(f'Rate limit exceeded for {key}')
+                if json:
+                    response = JsonResponse(
+                        {'success': False, 'error': LIMITED_MESSAGE}, status=429
+                    )
+                else:
+                    messages.error(request, LIMITED_MESSAGE)
+                    response = redirect(redirect_to or request.path)
+                response['Retry-After'] = str(int(retry_after) + 1)
+                return response
+        return None
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            # The stores do blocking I/O (cache, database), so run them off the loop
+            @wraps(view_func)
+            async def async_wrapped(request, *args, **kwargs):
+                response = await sync_to_async(limit)(request)
+                if response is not None:
+                    return response
+                return await view_func(request, *args, **kwargs)
+            return async_wrapped
+
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            response = limit(request)
+            if response is not None:
+                return response
+            return view_func(request, *args, **kwargs)
+        return wrapped
+    return decorator
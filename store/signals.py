@@ -1,21 +1,20 @@
 from django.dispatch import receiver
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 from allauth.socialaccount.signals import pre_social_login, social_account_updated
 from allauth.account.signals import user_signed_up
-from django.core.files.base import ContentFile
-from django.conf import settings
+from store.accounts import admin_cache_key
+from store.cache import get_tiered_cache
+from store.inventory import invalidate_inventory
+from store.models import AdminUser, Car, CarImage
+from store.profile_pictures import schedule_google_picture_sync
 import logging
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Optional: Only import requests if available (for development/debugging)
-try:
-    import requests
-    REQUESTS_AVAILABLE = True
-except ImportError:
-    REQUESTS_AVAILABLE = False
-    logger.warning("requests library not available - profile picture sync disabled")
-
 
 @receiver(pre_social_login)
 def populate_profile_from_social(sender, request, sociallogin, **kwargs):
@@ -45,45 +44,16 @@ def populate_profile_from_social(sender, request, sociallogin, **kwargs):
 @receiver(user_signed_up)
 def save_google_profile_picture(sender, request, user, **kwargs):
     """
-    Download and save Google profile picture after user signs up.
-    Only runs if requests library is available.
+    Sync the Google profile picture after user signs up.
+    The download runs as a queued job, outside the OAuth callback.
     """
-    # Skip if requests not available (serverless environment)
-    if not REQUESTS_AVAILABLE:
-        return
-    
     try:
         # Get the social account
         social_account = user.socialaccount_set.filter(provider='google').first()
         
         if social_account:
-            extra_data = social_account.extra_data
-            picture_url = extra_data.get('picture')
-            
-            if picture_url and hasattr(user, 'profile'):
-                try:
-                    # Download the profile picture with short timeout
-                    response = requests.get(picture_url, timeout=5)
-                    if response.status_code == 200:
-                        # Get file extension from URL or default to jpg
-                        file_ext = 'jpg'
-                        if '.' in picture_url:
-                            file_ext = picture_url.split('.')[-1].split('?')[0]
-                        
-                        # Create a file name
-                        file_name = f'google_profile_{user.id}.{file_ext}'
-                        
-                        # Save the image to the profile
-                        user.profile.profile_picture.save(
-                            file_name,
-                            ContentFile(response.content),
-                            save=True
-                        )
-                        logger.info(f"Saved Google profile picture for user {user.id}")
-                except requests.RequestException as e:
-                    logger.warning(f"Failed to download Google profile picture: {e}")
-                except Exception as e:
-                    logger.error(f"Error saving Google profile picture: {e}")
+            picture_url = social_account.extra_data.get('picture')
+            schedule_google_picture_sync(user, picture_url)
     except Exception as e:
         logger.error(f"Error in save_google_profile_picture signal: {e}")
         # Don't raise - allow signup to continue
@@ -93,46 +63,55 @@ def save_google_profile_picture(sender, request, user, **kwargs):
 def update_google_profile_picture(sender, request, sociallogin, **kwargs):
     """
     Update Google profile picture when social account is updated.
-    Only runs if requests library is available.
+    Only schedules a download when the picture URL has changed.
     """
-    # Skip if requests not available (serverless environment)
-    if not REQUESTS_AVAILABLE:
-        return
-    
     try:
-        user = sociallogin.user
-        
-        if sociallogin.account.provider == 'google' and hasattr(user, 'profile'):
-            extra_data = sociallogin.account.extra_data
-            picture_url = extra_data.get('picture')
-            
-            if picture_url:
-                try:
-                    # Download the profile picture with short timeout
-                    response = requests.get(picture_url, timeout=5)
-                    if response.status_code == 200:
-                        # Get file extension
-                        file_ext = 'jpg'
-                        if '.' in picture_url:
-                            file_ext = picture_url.split('.')[-1].split('?')[0]
-                        
-                        file_name = f'google_profile_{user.id}.{file_ext}'
-                        
-                        # Delete old picture if exists
-                        if user.profile.profile_picture:
-                            user.profile.profile_picture.delete(save=False)
-                        
-                        # Save the new image
-                        user.profile.profile_picture.save(
-                            file_name,
-                            ContentFile(response.content),
-                            save=True
-                        )
-                        logger.info(f"Updated Google profile picture for user {user.id}")
-                except requests.RequestException as e:
-                    logger.warning(f"Failed to update Google profile picture: {e}")
-                except Exception as e:
-                    logger.error(f"Error updating Google profile picture: {e}")
+        if sociallogin.account.provider == 'google':
+            picture_url = sociallogin.account.extra_data.get('picture')
+            schedule_google_picture_sync(sociallogin.user, picture_url)
     except Exception as e:
         logger.error(f"Error in update_google_profile_picture signal: {e}")
         # Don't raise - allow update to continue
+
+
+@receiver(request_started)
+def start_outbox_request(sender, **kwargs):
+    from store import jobs, outbox
+    outbox.start_request()
+    jobs.start_request()
+
+
+@receiver(request_finished)
+def send_outbox_after_response(sender, **kwargs):
+    """Deliver emails and run jobs queued during the request once the response is done."""
+    from store import jobs, outbox
+    sent = outbox.send_queued_after_response()
+    ran = jobs.run_queued_after_response()
+    if sent or ran:
+        # Django has already closed the request's connections by now; close
+        # the one the drain opened too, unless CONN_MAX_AGE keeps it
+        close_old_connections()
+
+
+@receiver(connection_created)
+def time_database_queries(sender, connection, **kwargs):
+    """Report every query to the per-request timings (store/timing.py)."""
+    from store.timing import install_db_timing
+    install_db_timing(connection)
+
+
+@receiver([post_save, post_delete], sender=Car)
+@receiver(post_save, sender=CarImage)
+def invalidate_cached_inventory(sender, using, **kwargs):
+    """
+    Rebuild the cached public inventory and facets after a car changes.
+    Image deletes call invalidate_inventory themselves: a post_delete
+    receiver would stop Django from deleting a car's images in one query.
+    """
+    invalidate_inventory(using=using)
+
+
+@receiver([post_save, post_delete], sender=AdminUser)
+def invalidate_cached_admin_permission(sender, instance, **kwargs):
+    """Forget the cached admin check of a user who was added or removed."""
+    get_tiered_cache().delete(admin_cache_key(instance.user_id))
@@ -0,0 +1,114 @@
+"""
+Outgoing SMS for phone verification.
+
+Messages go through a transport chosen by ``settings.SMS_TRANSPORT``:
+
+- ``store.sms.TwilioTransport``: sends via Twilio using one lazily-created
+  client per process, whose HTTP session keeps connections alive between
+  messages. Falls back to the console when Twilio isn't configured.
+- ``store.sms.ConsoleTransport``: logs the message (development).
+- ``store.sms.LocMemTransport``: collects messages in ``store.sms.outbox``
+  (tests).
+
+Views call ``queue_sms``, which records a job (store/jobs.py) that sends
+the message after the response, so no request waits on the Twilio API.
+``deliver_sms`` is the job itself and raises when the provider rejects
+the message; the failure is kept on the job for the view to report.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .jobs import queue_job
+from .timing import timed
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Messages sent through LocMemTransport
+outbox = []
+
+_lock = threading.Lock()
+_client = None
+_transports = {}
+
+
+def twilio_configured():
+    """Return True if Twilio credentials and a sender number are set."""
+    return all([
+        getattr(settings, 'TWILIO_ACCOUNT_SID', None),
+        getattr(settings, 'TWILIO_AUTH_TOKEN', None),
+        getattr(settings, 'TWILIO_PHONE_NUMBER', None),
+    ])
+
+
+def get_twilio_client():
+    """Return the process-wide Twilio client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from twilio.http.http_client import TwilioHttpClient
+                from twilio.rest import Client
+                _client = Client(
+                    settings.TWILIO_ACCOUNT_SID,
+                    settings.TWILIO_AUTH_TOKEN,
+                    http_client=TwilioHttpClient(pool_connections=True, timeout=10),
+                )
+    return _client
+
+
+class ConsoleTransport:
+    """Log messages instead of sending them."""
+
+    def send(self, to, body):
+        logger.info(f'SMS to {to}: {body}')
+        print(f'📱 SMS to {to}:\n{body}')
+        return None
+
+
+class LocMemTransport:
+    """Keep messages in memory for tests."""
+
+    def send(self, to, body):
+        outbox.append({'to': to, 'body': body})
+        return f'LOCMEM{len(outbox)}'
+
+
+class TwilioTransport:
+    """Send messages with the shared Twilio client."""
+
+    def send(self, to, body):
+        if not twilio_configured():
+            logger.warning('Twilio credentials not configured. SMS not sent.')
+            return ConsoleTransport().send(to, body)
+        try:
+            client = get_twilio_client()
+        except ImportError:
+            logger.warning('Twilio not installed. SMS not sent.')
+            return ConsoleTransport().send(to, body)
+        message = client.messages.create(
+            body=body,
+            from_=settings.TWILIO_PHONE_NUMBER,
+            to=to,
+        )
+        logger.info(f'SMS sent successfully. SID: {message.sid}')
+        return message.sid
+
+
+def get_transport():
+    """Return the configured transport, instantiated once per process."""
+    path = getattr(settings, 'SMS_TRANSPORT', 'store.sms.TwilioTransport')
+    if path not in _transports:
+        _transports[path] = import_string(path)()
+    return _transports[path]
+
+
+def deliver_sms(to, body):
+    """Send an SMS through the configured transport and return its id."""
+    with timed('sms'):
+        return get_transport().send(to, body)
+
+
+def queue_sms(to, body, user=None):
+    """Queue an SMS to be sent once the transaction commits; returns the job."""
+    return queue_job('sms', user=user, to=to, body=body)
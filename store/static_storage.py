@@ -0,0 +1,129 @@
+"""
+Static files storage for deploys: minified, fingerprinted and precompressed.
+
+At ``collectstatic`` time ``CompressedManifestStaticFilesStorage``:
+
+1. minifies JavaScript and CSS (with rjsmin / rcssmin, when installed);
+2. fingerprints every file name with its content hash, as
+   ``ManifestStaticFilesStorage`` does (``js/admin.3f2a9c1b7e4d.js``), and
+   ``{% static %}`` links to the fingerprinted name. A changed file gets a
+   new URL, so vercel.json can serve fingerprinted files with immutable,
+   far-future cache headers;
+3. writes ``.gz`` and ``.br`` (brotli, when installed) copies of text assets
+   next to the fingerprinted files for servers that send precompressed
+   files.
+
+It lives apart from store/storage.py so that ``{% static %}`` doesn't
+import the Cloudinary SDK.
+"""
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+import gzip
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Optional: minifiers and brotli are used when installed (see requirements.txt)
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.xml', '.html')
+
+
+def minifiers():
+    """Map of file extension to minifying function, for what's installed."""
+    available = {}
+    if rjsmin is not None:
+        available['.js'] = rjsmin.jsmin
+    if rcssmin is not None:
+        available['.css'] = rcssmin.cssmin
+    return available
+
+
+def compressors():
+    """``(suffix, compress)`` pairs; gzip output is reproducible (no mtime)."""
+    available = [('.gz', lambda content: gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        available.append(('.br', lambda content: brotli.compress(content, quality=11)))
+    return available
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that minifies before hashing and compresses after."""
+
+    # Files missing from the manifest are looked up by hashing them, and
+    # stored_name() falls back to the plain name when that fails too
+    manifest_strict = False
+
+    def stored_name(self, name):
+        """
+        The fingerprinted name of ``name``, or ``name`` itself when it hasn't
+        been collected (no collectstatic output, or a file added since). A
+        missing asset then 404s on its own instead of failing every page
+        that links to it.
+        """
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+
+        available = minifiers()
+        for name in paths:
+            self.minify(name, available)
+
+        # Hash the minified copies collected here rather than the sources
+        collected = {name: (self, name) for name in paths}
+        yield from super().post_process(collected, dry_run, **options)
+
+        compressed = 0
+        for name in sorted(set(self.hashed_files.values())):
+            compressed += self.compress(name)
+        logger.info(f"Static files: {compressed} precompressed copies written")
+
+    def minify(self, name, available):
+        """Minify ``name`` in place if a minifier handles its type."""
+        root, extension = os.path.splitext(name)
+        minify = available.get(extension)
+        if minify is None or root.endswith('.min'):
+            return False
+        with self.open(name) as original:
+            source = original.read().decode('utf-8')
+        minified = minify(source)
+        if len(minified) >= len(source):
+            return False
+        self.delete(name)
+        self._save(name, ContentFile(minified.encode('utf-8')))
+        return True
+
+    def compress(self, name):
+        """Write compressed copies of ``name``; returns how many were worth keeping."""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return 0
+        with self.open(name) as original:
+            content = original.read()
+        written = 0
+        for suffix, compress in compressors():
+            data = compress(content)
+            if len(data) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(data))
+            written += 1
+        return written
@@ -0,0 +1,31 @@
+"""File storage backends that report their time to store/timing.py."""
+from cloudinary_storage.storage import MediaCloudinaryStorage
+from .timing import timed
+
+
+class TimedStorageMixin:
+    """Count storage calls (uploads, downloads, deletes, URLs) as ``storage`` time."""
+
+    def _save(self, name, content):
+        with timed('storage'):
+            return super()._save(name, content)
+
+    def _open(self, name, mode='rb'):
+        with timed('storage'):
+            return super()._open(name, mode)
+
+    def delete(self, name):
+        with timed('storage'):
+            return super().delete(name)
+
+    def exists(self, name):
+        with timed('storage'):
+            return super().exists(name)
+
+    def url(self, name):
+        with timed('storage'):
+            return super().url(name)
+
+
+class TimedMediaCloudinaryStorage(TimedStorageMixin, MediaCloudinaryStorage):
+    """Cloudinary media storage with timing."""
@@ -1,11 +1,16 @@
 from django import template
-from django.conf import settings
+from store.accounts import is_admin as user_is_admin
 
 register = template.Library()
 
 @register.filter(name='is_admin')
 def is_admin(user):
-    """Check if user is an admin based on email."""
-    if not user or not user.is_authenticated:
+    """
+    Check if user is an admin (ADMIN_EMAILS or an AdminUser record).
+
+    Pages get the same check as ``is_admin`` from the navigation context
+    processor, evaluated once per request.
+    """
+    if not user:
         return False
-    return user.email in settings.ADMIN_EMAILS
+    return user_is_admin(user)
@@ -0,0 +1,294 @@
+"""
+Query-count and wall-time budgets for every endpoint in store/urls.py.
+
+Each endpoint is requested once against a realistically sized data set
+(hundreds of cars with several images each, thousands of users and
+favorites) and must stay within its budget. Query budgets are exact
+ceilings: a change that adds queries to an endpoint, or makes its query
+count grow with the data (an N+1), fails here. If the extra queries are
+intended, raise the budget in ``ENDPOINTS`` in the same change.
+
+Wall-time budgets are deliberately loose and can be scaled for slow CI
+machines with the ``ENDPOINT_TIME_BUDGET_SCALE`` environment variable.
+
+Every request runs in a transaction that is rolled back afterwards, so
+endpoints that modify data don't affect the ones after them.
+"""
+from collections import namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+from .cache import get_tiered_cache
+from .models import AdminUser, Car, CarImage, FavoriteCar, OutboundEmail, UserProfile
+from .tokens import PASSWORD_RESET, VERIFY_EMAIL, make_token
+import os
+import random
+import time
+
+# Seeded data set
+CARS = 300
+IMAGES_PER_CAR = 3
+USERS = 2000
+FAVORITES = 5000
+FAN_FAVORITES = 40
+
+TIME_SCALE = float(os.getenv('ENDPOINT_TIME_BUDGET_SCALE', '1'))
+
+# as_user: None (anonymous), 'fan' (regular user) or 'admin'.
+# path and string values in data are formatted with the test's refs;
+# data may also be a callable returning fresh data (e.g. uploads).
+Endpoint = namedtuple(
+    'Endpoint', 'name method path as_user data json status queries ms',
+    defaults=(None, None, False, 200, 0, 500),
+)
+
+
+def car_upload():
+    return {
+        'title': 'Budget', 'car_model': 'Budget Car', 'year': '2021',
+        'price': '20000', 'description': 'New arrival',
+        'images': [
+            SimpleUploadedFile(f'{n}.jpg', b'jpeg', content_type='image/jpeg')
+            for n in range(IMAGES_PER_CAR)
+        ],
+    }
+
+
+def cars_csv():
+    rows = ''.join(
+        f'Imported {n},Model,2020,{10000 + n},Imported car,,,,,\n' for n in range(20)
+    )
+    return {'file': SimpleUploadedFile(
+        'cars.csv', ('title,car_model,year,price,description,mileage,condition,'
+                     'is_sold,is_hidden,images\n' + rows).encode()
+    )}
+
+
+ENDPOINTS = [
+    # Deployment utilities (the schema checks are PostgreSQL-only and fail on SQLite)
+    Endpoint('check_varchar', 'get', '/_admin/check-varchar/', status=None, queries=1),
+    Endpoint('fix_schema', 'get', '/_admin/fix-schema/', status=None, queries=1),
+    Endpoint('run_migrations', 'post', '/_admin/run-migrations/', status=403),
+    Endpoint('migration_status', 'get', '/_admin/migration-status/', queries=2, ms=1500),
+    Endpoint('test_email', 'get', '/_admin/test-email/'),
+    Endpoint('drain_outbox', 'post', '/_admin/drain-outbox/', queries=3),
+    Endpoint('run_jobs', 'post', '/_admin/run-jobs/', queries=3),
+    Endpoint('prune_ratelimit', 'post', '/_admin/prune-ratelimit/', queries=1),
+    Endpoint('cache_stats', 'get', '/_admin/cache-stats/', status=403),
+
+    # Pages
+    Endpoint('home', 'get', '/', queries=2),
+    Endpoint('inventory', 'get', '/inventory/'),
+    Endpoint('car_detail', 'get', '/car/{car}/'),
+    Endpoint('location', 'get', '/location/'),
+    Endpoint('admin_panel', 'get', '/admin-panel/', 'admin', queries=1),
+
+    # Authentication
+    Endpoint('login', 'post', '/login/', data={'email': '{fan_email}', 'password': 'budget-pass'},
+             status=302, queries=10),
+    Endpoint('signup', 'post', '/signup/', data={
+        'full_name': 'New User', 'email': 'new.user@example.com',
+        'password': 'budget-pass-123', 'password_confirm': 'budget-pass-123',
+    }, status=302, queries=18),
+    Endpoint('logout', 'get', '/logout/', 'fan', status=302, queries=3),
+    Endpoint('password_reset', 'post', '/password-reset/', data={'email': '{fan_email}'},
+             status=302, queries=3),
+    Endpoint('password_reset_confirm', 'get', '/password-reset/{reset_token}/', queries=1),
+    Endpoint('verify_email', 'get', '/verify-email/{verify_token}/', status=302, queries=3),
+    Endpoint('verify_email_sent', 'get', '/verify-email-sent/{fan_email}/'),
+    Endpoint('verify_email_prompt', 'get', '/verify-email-prompt/', 'fan', queries=1),
+    Endpoint('resend_verification', 'post', '/resend-verification/', 'fan', status=302, queries=3),
+
+    # Phone verification
+    Endpoint('verify_phone_prompt', 'get', '/verify-phone/', 'fan', queries=6),
+    Endpoint('send_phone_verification', 'post', '/send-phone-verification/', 'fan', queries=5),
+
+    # Profile
+    Endpoint('profile', 'get', '/profile/', 'fan', queries=4),
+    Endpoint('update_profile', 'post', '/profile/update/', 'fan', data={
+        'first_name': 'Fan', 'last_name': 'Updated', 'email': 'user0@example.com',
+        'phone': '+15550002222',
+    }, status=302, queries=3),
+    Endpoint('change_password', 'get', '/profile/change-password/', 'fan', status=302, queries=1),
+    Endpoint('delete_account', 'post', '/profile/delete-account/', 'fan', status=302, queries=14),
+    Endpoint('remove_profile_picture', 'post', '/profile/remove-picture/', 'fan',
+             status=302, queries=1),
+
+    # Favorites
+    Endpoint('favorites', 'get', '/favorites/', 'fan', queries=3),
+    Endpoint('add_to_favorites', 'post', '/favorites/add/', 'fan', data={
+        'car_id': 'new-car', 'car_title': 'New car', 'car_price': 1000,
+    }, json=True, queries=5),
+    Endpoint('remove_from_favorites', 'post', '/favorites/remove/', 'fan',
+             data={'car_id': '{fan_favorite}'}, json=True, queries=2),
+    Endpoint('check_favorite', 'get', '/favorites/check/{fan_favorite}/', 'fan', queries=2),
+    Endpoint('get_user_favorites', 'get', '/favorites/list/', 'fan', queries=2),
+
+    # Cars
+    Endpoint('get_cars_api', 'get', '/api/cars/', queries=2, ms=1000),
+    Endpoint('get_car_facets_api', 'get', '/api/cars/facets/', queries=4),
+    Endpoint('get_admin_cars_api', 'get', '/api/admin/cars/', 'admin', queries=3, ms=1000),
+    Endpoint('add_car', 'post', '/api/cars/add/', 'admin', data=car_upload, queries=5),
+    Endpoint('import_cars', 'post', '/api/cars/import/', 'admin', data=cars_csv, queries=4),
+    Endpoint('export_cars', 'get', '/api/cars/export/', 'admin', queries=3, ms=1000),
+    Endpoint('bulk_car_action', 'post', '/api/cars/bulk/', 'admin', data={
+        'action': 'hide', 'car_ids': '{car_ids}',
+    }, json=True, queries=5),
+    Endpoint('update_car', 'post', '/api/cars/{car}/update/', 'admin',
+             data={'title': 'Renamed', 'price': '15000'}, queries=3),
+    Endpoint('delete_car', 'post', '/api/cars/{car}/delete/', 'admin', queries=4),
+    Endpoint('toggle_car_sold', 'post', '/api/cars/{car}/toggle-sold/', 'admin', queries=3),
+    Endpoint('toggle_car_hidden', 'post', '/api/cars/{car}/toggle-hidden/', 'admin', queries=3),
+    Endpoint('delete_car_image', 'post', '/api/cars/image/{image}/delete/', 'admin', queries=3),
+
+    # Admin users
+    Endpoint('get_admin_users', 'get', '/api/admin-users/', 'admin', queries=2),
+    Endpoint('add_admin_user', 'post', '/api/admin-users/add/', 'admin',
+             data={'email': '{fan_email}'}, json=True, queries=4),
+    Endpoint('remove_admin_user', 'post', '/api/admin-users/{other_admin}/remove/', 'admin',
+             queries=4),
+]
+
+
+@override_settings(
+    ADMIN_EMAILS=[],
+    CRON_SECRET='budget-secret',
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_OUTBOX_SEND_AFTER_RESPONSE=False,
+    # Hashing cost isn't what these budgets measure
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    RATELIMIT_ENABLED=False,
+    SERVER_TIMING_HEADER=False,
+    SMS_TRANSPORT='store.sms.LocMemTransport',
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': settings.STORAGES['staticfiles'],
+    },
+)
+class EndpointBudgetTests(TestCase):
+    """Every endpoint stays within its query and wall-time budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        password = make_password('budget-pass', hasher='md5')
+
+        users = User.objects.bulk_create([
+            User(username=f'user{n}', email=f'user{n}@example.com', password=password,
+                 first_name='User', last_name=str(n))
+            for n in range(USERS)
+        ])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+
+        cars = Car.objects.bulk_create([
+            Car(title=f'Car {n}', car_model=f'Model {n % 40}', year=2000 + n % 25,
+                price=Decimal(5000 + n * 10), description='A well kept car.',
+                mileage=rng.randint(1000, 150000), condition='Used',
+                is_sold=n % 7 == 0, is_hidden=n % 11 == 0)
+            for n in range(CARS)
+        ])
+        CarImage.objects.bulk_create([
+            CarImage(car=car, image=f'car_images/{car.pk}_{n}.jpg', is_primary=n == 0, order=n)
+            for car in cars
+            for n in range(IMAGES_PER_CAR)
+        ])
+        FavoriteCar.objects.bulk_create([
+            FavoriteCar(user=user, car_id=str(car.pk), car_title=car.title, car_price=car.price)
+            for user, car in {
+                (rng.choice(users), rng.choice(cars)) for _ in range(FAVORITES)
+            }
+        ], ignore_conflicts=True)
+
+        cls.fan = users[0]
+        UserProfile.objects.filter(user=cls.fan).update(phone_number='+15550001111')
+        FavoriteCar.objects.bulk_create([
+            FavoriteCar(user=cls.fan, car_id=str(car.pk), car_title=car.title, car_price=car.price)
+            for car in cars[:FAN_FAVORITES]
+        ], ignore_conflicts=True)
+
+        cls.admin = users[1]
+        AdminUser.objects.create(user=cls.admin)
+        cls.other_admin = AdminUser.objects.create(user=users[2], created_by=cls.admin)
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(subject='Sent', body='Body', from_email='shop@example.com',
+                          to=[f'user{n}@example.com'], status=OutboundEmail.STATUS_SENT)
+            for n in range(100)
+        ])
+
+        cls.car = cars[0]
+        cls.car_ids = [car.pk for car in cars[:50]]
+        cls.image = cls.car.images.first()
+
+    def setUp(self):
+        # Budgets are for a cold cache
+        get_tiered_cache().clear()
+        fan = User.objects.select_related('profile').get(pk=self.fan.pk)
+        self.refs = {
+            'car': self.car.pk,
+            'car_ids': self.car_ids,
+            'image': self.image.pk,
+            'fan_email': self.fan.email,
+            'fan_favorite': str(self.car.pk),
+            'other_admin': self.other_admin.pk,
+            'reset_token': make_token(fan, PASSWORD_RESET),
+            'verify_token': make_token(fan, VERIFY_EMAIL),
+        }
+        self.users = {'fan': self.fan, 'admin': self.admin}
+
+    def format(self, value):
+        if isinstance(value, str):
+            # A whole-value placeholder keeps its type (e.g. a list of ids)
+            if value.startswith('{') and value.endswith('}') and value[1:-1] in self.refs:
+                return self.refs[value[1:-1]]
+            return value.format(**self.refs)
+        if isinstance(value, dict):
+            return {key: self.format(item) for key, item in value.items()}
+        return value
+
+    def request(self, endpoint):
+        """Request ``endpoint``; return its status, queries and milliseconds."""
+        data = endpoint.data() if callable(endpoint.data) else self.format(endpoint.data or {})
+        kwargs = {'content_type': 'application/json'} if endpoint.json else {}
+        if endpoint.name in ('drain_outbox', 'run_jobs', 'prune_ratelimit'):
+            kwargs['HTTP_AUTHORIZATION'] = 'Bearer budget-secret'
+
+        with transaction.atomic():
+            if endpoint.as_user:
+                self.client.force_login(self.users[endpoint.as_user])
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(self.client, endpoint.method)(
+                    self.format(endpoint.path), data, **kwargs
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = (time.perf_counter() - started) * 1000
+            transaction.set_rollback(True)
+        self.client.logout()
+        return response.status_code, queries.captured_queries, elapsed
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in get_resolver('store.urls').url_patterns}
+        self.assertEqual(names - {endpoint.name for endpoint in ENDPOINTS}, set())
+
+    def test_endpoint_budgets(self):
+        for endpoint in ENDPOINTS:
+            with self.subTest(endpoint=endpoint.name):
+                status, queries, elapsed = self.request(endpoint)
+                if endpoint.status is not None:
+                    self.assertEqual(status, endpoint.status)
+                self.assertLessEqual(
+                    len(queries), endpoint.queries,
+                    f'{endpoint.name} ran {len(queries)} queries (budget {endpoint.queries}):\n'
+                    + '\n'.join(query['sql'][:200] for query in queries),
+                )
+                self.assertLessEqual(
+                    elapsed, endpoint.ms * TIME_SCALE,
+                    f'{endpoint.name} took {elapsed:.0f}ms (budget {endpoint.ms * TIME_SCALE:.0f}ms)',
+                )
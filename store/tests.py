@@ -1,3 +1,1418 @@
-from django.test import TestCase
+import contextvars
+import gzip
+import json
+import random
+import socket
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail, signing
+from django.core.files.storage import InMemoryStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.template import engines
+from django.test import (
+    AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from io import StringIO
+from pathlib import Path
+
+from . import coldstart, context_processors, email_backends, loadtest, sms, timing, warmup
+from .accounts import allocate_username, get_user_by_email, is_admin
+from .cache import TieredCache, get_tiered_cache
+from .car_io import export_lines, fetch_image, import_cars, iter_records
+from .email_backends import close_pool
+from .inventory import bump_inventory, invalidate_inventory
+from .jobs import run_jobs, run_queued_after_response
+from .mail import queue_templated_emails
+from .management.commands.benchmark_email import SMTPStandIn
+from .models import (
+    CODE_LIFETIME, MAX_CODE_ATTEMPTS, AdminUser, Car, CarImage, FavoriteCar, OutboundEmail,
+    QueuedJob, RateLimitBucket, UserProfile, create_user_profile,
+)
+from .outbox import drain_outbox, queue_email, send_queued_after_response, start_request
+from .profile_pictures import schedule_google_picture_sync, sync_google_profile_picture
+from .ratelimit import (
+    CacheStore, DatabaseStore, LocalMemoryStore, client_ip, prune_buckets, take_token,
+)
+from .storage import TimedStorageMixin
+from .tokens import PASSWORD_RESET, VERIFY_EMAIL, get_user_for_token
+from .views import send_verification_email
+
+
+class AllocateUsernameTests(TestCase):
+    """Username allocation for email signups."""
+
+    def test_free_base_is_used(self):
+        self.assertEqual(allocate_username('john@example.com'), 'john')
+
+    def test_collision_uses_next_suffix_in_one_query(self):
+        User.objects.create(username='john')
+        User.objects.create(username='john7')
+        User.objects.create(username='johnny')
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_username('john@example.com'), 'john8')
+
+    def test_base_reused_when_only_suffixed_names_exist(self):
+        User.objects.create(username='john3')
+        self.assertEqual(allocate_username('john@example.com'), 'john')
+
+    def test_regex_characters_in_local_part_are_literal(self):
+        User.objects.create(username='a.b')
+        User.objects.create(username='axb1')
+        self.assertEqual(allocate_username('a.b@example.com'), 'a.b1')
+
+
+class EmailLookupTests(TestCase):
+    """Case-insensitive email lookups used by the auth views."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='jane', email='Jane.Doe@Example.com', password='s3cret-pass'
+        )
+
+    def test_lookup_ignores_case_and_whitespace(self):
+        self.assertEqual(get_user_by_email(' jane.doe@example.COM '), self.user)
+
+    def test_missing_email_returns_none(self):
+        self.assertIsNone(get_user_by_email('nobody@example.com'))
+        self.assertIsNone(get_user_by_email(None))
+
+    def test_login_accepts_differently_cased_email(self):
+        response = self.client.post('/login/', {
+            'email': 'JANE.DOE@example.com', 'password': 's3cret-pass',
+        })
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+
+
+class RateLimitTests(TestCase):
+    """Token-bucket throttling of the auth views."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_take_token_refills_over_time(self):
+        state, allowed, _ = take_token(None, 2, 1.0, now=100)
+        state, allowed, _ = take_token(state, 2, 1.0, now=100)
+        self.assertTrue(allowed)
+        state, allowed, retry_after = take_token(state, 2, 1.0, now=100)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1.0)
+        _, allowed, _ = take_token(state, 2, 1.0, now=101)
+        self.assertTrue(allowed)
+
+    def test_stores_share_bucket_semantics(self):
+        for store in (LocalMemoryStore(), CacheStore(), DatabaseStore()):
+            with self.subTest(store=type(store).__name__):
+                results = [store.consume('test:key', 3, 0.001)[0] for _ in range(4)]
+                self.assertEqual(results, [True, True, True, False])
+
+    def test_client_ip_ignores_client_supplied_hops(self):
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.7', REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(client_ip(request), '203.0.113.7')
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=2):
+            self.assertEqual(client_ip(request), '1.1.1.1')
+        with override_settings(RATELIMIT_TRUSTED_PROXIES=0):
+            self.assertEqual(client_ip(request), '10.0.0.1')
+
+    def test_idle_buckets_are_pruned(self):
+        now = time.time()
+        RateLimitBucket.objects.create(key='old', tokens=0, updated_at=now - 2 * 86400)
+        RateLimitBucket.objects.create(key='recent', tokens=0, updated_at=now - 60)
+        self.assertEqual(prune_buckets(now), 1)
+        self.assertEqual(list(RateLimitBucket.objects.values_list('key', flat=True)), ['recent'])
+
+    @override_settings(RATELIMIT_RATES={'login': '2/m'})
+    def test_login_is_throttled_per_account(self):
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            self.client.post('/login/', {'email': 'a@example.com', 'password': 'x'},
+                             REMOTE_ADDR=ip)
+        response = self.client.post('/login/', {'email': 'a@example.com', 'password': 'x'},
+                                    REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('Retry-After', response)
+
+
+class UserProfileMiddlewareTests(TestCase):
+    """request.user is loaded together with its profile."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='sam', email='sam@example.com', password='s3cret-pass'
+        )
+        self.client.force_login(self.user)
+
+    def test_page_view_uses_single_auth_query(self):
+        # base.html reads user.profile on every page
+        with self.assertNumQueries(1):
+            response = self.client.get('/location/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_stale_session_hash_logs_out(self):
+        self.user.set_password('new-pass-123')
+        self.user.save()
+        response = self.client.get('/')
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+
+class ProfilePersistenceTests(TestCase):
+    """Profile rows are only written when profile data changes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='lee', email='lee@example.com', password='s3cret-pass'
+        )
+
+    def test_login_does_not_write_profile(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/login/', {
+                'email': 'lee@example.com', 'password': 's3cret-pass',
+            })
+        self.assertEqual(response.status_code, 302)
+        writes = [q['sql'] for q in ctx.captured_queries
+                  if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertFalse([sql for sql in writes if 'store_userprofile' in sql])
+        user_writes = [sql for sql in writes if 'auth_user' in sql]
+        self.assertEqual(len(user_writes), 1)
+        self.assertIn('last_login', user_writes[0])
+
+    def test_profile_creation_is_idempotent(self):
+        create_user_profile(User, self.user, created=True)
+        self.assertEqual(UserProfile.objects.filter(user=self.user).count(), 1)
+
+    def test_generate_code_writes_only_code_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.profile.generate_verification_code()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('phone_number', ctx.captured_queries[0]['sql'])
+
+
+class OutboxTests(TestCase):
+    """Emails are stored in the outbox and delivered outside the request."""
+
+    def test_signup_queues_verification_email_without_sending(self):
+        self.client.post('/signup/', {
+            'full_name': 'Ana Lima', 'email': 'ana@example.com',
+            'password': 's3cret-pass', 'password_confirm': 's3cret-pass',
+        })
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.to, ['ana@example.com'])
+        self.assertIn('/verify-email/', queued.body)
+        self.assertEqual(mail.outbox, [])
+
+    def test_queued_email_sent_after_commit_and_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queue_email('Hello', 'Body', ['a@example.com'])
+        send_queued_after_response()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.STATUS_SENT)
+
+    def test_email_queued_in_copied_context_is_sent_after_response(self):
+        # Async views run in a copy of the request's context
+        start_request()
+
+        def view():
+            with self.captureOnCommitCallbacks(execute=True):
+                queue_email('Hello', 'Body', ['a@example.com'])
+
+        contextvars.copy_context().run(view)
+        self.assertTrue(send_queued_after_response())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(send_queued_after_response())
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_send_backs_off_then_gives_up(self):
+        email = queue_email('Hello', 'Body', ['a@example.com'])
+        with mock.patch('store.outbox.EmailMultiAlternatives.send', side_effect=OSError('down')):
+            self.assertEqual(drain_outbox(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutboundEmail.STATUS_PENDING)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            # Not due yet, so nothing is retried
+            self.assertEqual(drain_outbox(), (0, 0))
+
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(drain_outbox(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.STATUS_FAILED)
+        self.assertEqual(email.last_error, 'down')
+
+
+class PooledEmailBackendTests(TestCase):
+    """The pooled SMTP backend reuses one connection across sends."""
+
+    def setUp(self):
+        self.server = SMTPStandIn(connect_latency=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(close_pool)
+
+    def send(self, subject):
+        host, port = self.server.server_address
+        connection = get_connection(
+            'store.email_backends.PooledEmailBackend', host=host, port=port,
+            username='', password='', use_tls=False, fail_silently=False,
+        )
+        EmailMessage(subject, 'Body', 'from@example.com', ['to@example.com'],
+                     connection=connection).send()
+
+    def test_sends_share_one_connection(self):
+        self.send('First')
+        self.send('Second')
+        self.assertEqual(self.server.received, 2)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_sends_on_open_backend_keep_connection_fresh(self):
+        host, port = self.server.server_address
+        with get_connection(
+            'store.email_backends.PooledEmailBackend', host=host, port=port,
+            username='', password='', use_tls=False, fail_silently=False,
+        ) as held:
+            entry = next(iter(email_backends._pool.values()))
+            entry[1] -= 3600
+            EmailMessage('First', 'Body', 'from@example.com', ['to@example.com'],
+                         connection=held).send()
+            # Another sender while the first is still open reuses it
+            self.send('Second')
+        self.assertEqual(self.server.received, 2)
+        self.assertEqual(self.server.connections, 1)
+
+    @override_settings(EMAIL_POOL_HEALTH_CHECK_SECONDS=-1)
+    def test_dead_connection_is_replaced(self):
+        self.send('First')
+        with email_backends._pool_lock:
+            for connection, _ in email_backends._pool.values():
+                connection.sock.shutdown(socket.SHUT_RDWR)
+        self.send('Second')
+        self.assertEqual(self.server.received, 2)
+        self.assertEqual(self.server.connections, 2)
+
+
+@override_settings(SMS_TRANSPORT='store.sms.LocMemTransport')
+class SMSDispatchTests(TestCase):
+    """Phone verification SMS go through the pluggable transport."""
+
+    def setUp(self):
+        sms.outbox.clear()
+        self.user = User.objects.create_user(
+            username='kim', email='kim@example.com', password='s3cret-pass'
+        )
+        self.user.profile.phone_number = '+15550001111'
+        self.user.profile.save()
+        self.client.force_login(self.user)
+
+    def test_queued_sms_is_sent_after_commit_and_response(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = sms.queue_sms('+15550001111', 'Hello')
+        self.assertEqual(sms.outbox, [])
+        self.assertTrue(run_queued_after_response())
+        self.assertEqual(sms.outbox, [{'to': '+15550001111', 'body': 'Hello'}])
+        job.refresh_from_db()
+        self.assertEqual(job.status, QueuedJob.STATUS_DONE)
+
+    def test_send_phone_verification_queues_code(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/send-phone-verification/')
+        self.assertEqual(response.json()['success'], True)
+        self.assertEqual(sms.outbox, [])
+        run_queued_after_response()
+        self.user.profile.refresh_from_db()
+        self.assertIn(self.user.profile.phone_verification_code, sms.outbox[0]['body'])
+
+    def test_failed_send_is_reported_on_verification_page(self):
+        with mock.patch.object(sms.LocMemTransport, 'send', side_effect=RuntimeError('bad number')):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/send-phone-verification/')
+            run_queued_after_response()
+        self.assertEqual(QueuedJob.objects.get().last_error, 'bad number')
+        response = self.client.get('/verify-phone/')
+        self.assertContains(response, "We couldn&#x27;t deliver your last verification code")
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2)
+    def test_failed_job_backs_off_then_gives_up(self):
+        job = sms.queue_sms('+15550001111', 'Hello')
+        with mock.patch.object(sms.LocMemTransport, 'send', side_effect=RuntimeError('down')):
+            self.assertEqual(run_jobs(), (0, 1))
+            # Not due yet, so nothing is retried
+            self.assertEqual(run_jobs(), (0, 0))
+            QueuedJob.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(run_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, QueuedJob.STATUS_FAILED)
+
+    def test_twilio_client_is_created_once(self):
+        with mock.patch('twilio.rest.Client') as client_class:
+            sms._client = None
+            self.addCleanup(setattr, sms, '_client', None)
+            self.assertIs(sms.get_twilio_client(), sms.get_twilio_client())
+        client_class.assert_called_once()
+
+
+@override_settings(
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': settings.STORAGES['staticfiles'],
+    },
+)
+class GooglePictureSyncTests(TestCase):
+    """Google profile pictures are synced by a queued job, only when changed."""
+
+    picture_url = 'https://lh3.googleusercontent.com/a/abc123=s96-c'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='goog', email='goog@example.com')
+
+    def fake_response(self, status_code=200, etag='"v1"'):
+        return mock.Mock(status_code=status_code, content=b'image-bytes',
+                         headers={'ETag': etag} if etag else {})
+
+    def test_new_url_is_synced_after_the_response(self):
+        with mock.patch('requests.get',
+                        return_value=self.fake_response()) as get:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(schedule_google_picture_sync(self.user, self.picture_url))
+            get.assert_not_called()
+            run_queued_after_response()
+        get.assert_called_once()
+        self.assertEqual(get.call_args.kwargs['timeout'], 5)
+        self.assertEqual(QueuedJob.objects.get().status, QueuedJob.STATUS_DONE)
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.google_picture_url, self.picture_url)
+        self.assertEqual(profile.google_picture_etag, '"v1"')
+        self.assertTrue(profile.profile_picture.name.startswith('profile_pictures/'))
+
+    def test_unchanged_url_is_not_refetched(self):
+        profile = self.user.profile
+        profile.google_picture_url = self.picture_url
+        profile.profile_picture.name = 'profile_pictures/profile_1.jpg'
+        profile.save()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertFalse(schedule_google_picture_sync(self.user, self.picture_url))
+        self.assertEqual(callbacks, [])
+        self.assertFalse(QueuedJob.objects.exists())
+
+    def test_not_modified_skips_upload(self):
+        profile = self.user.profile
+        profile.google_picture_etag = '"v1"'
+        profile.profile_picture.name = 'profile_pictures/existing.jpg'
+        profile.save()
+        with mock.patch('requests.get',
+                        return_value=self.fake_response(status_code=304)) as get:
+            self.assertFalse(sync_google_profile_picture(self.user.pk, self.picture_url))
+        self.assertEqual(get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+        profile.refresh_from_db()
+        self.assertEqual(profile.profile_picture.name, 'profile_pictures/existing.jpg')
+        self.assertEqual(profile.google_picture_url, self.picture_url)
+
+
+class TemplatedEmailTests(TestCase):
+    """Transactional emails are rendered from templates as multipart messages."""
+
+    def test_verification_email_has_text_and_html_parts(self):
+        user = User.objects.create_user(username='mo', email='mo@example.com', first_name='Mo')
+        with self.captureOnCommitCallbacks(execute=True):
+            send_verification_email(user, 'tok<en>')
+        send_queued_after_response()
+        message = mail.outbox[0]
+        self.assertIn('Hi Mo,', message.body)
+        self.assertIn('/verify-email/tok<en>/', message.body)
+        html, mimetype = message.alternatives[0]
+        self.assertEqual(mimetype, 'text/html')
+        self.assertIn('/verify-email/tok&lt;en&gt;/', html)
+
+    def test_batch_queues_one_row_per_recipient_in_one_insert(self):
+        recipients = [(f'user{i}@example.com', {'first_name': f'U{i}', 'code': '000111'})
+                      for i in range(3)]
+        with self.assertNumQueries(1):
+            queue_templated_emails('Code', 'verification_code', recipients)
+        self.assertEqual(
+            sorted(to for email in OutboundEmail.objects.all() for to in email.to),
+            [address for address, _ in recipients],
+        )
+
+
+class SignedTokenTests(TestCase):
+    """Verification and reset links use stateless signed tokens."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rae', email='rae@example.com', password='old-pass-123'
+        )
+
+    def test_generating_a_token_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.user.profile.generate_reset_token()
+            self.user.profile.generate_verification_token()
+
+    def test_forged_token_is_rejected_without_queries(self):
+        token = self.user.profile.generate_reset_token()
+        with self.assertNumQueries(0):
+            with self.assertRaises(signing.BadSignature):
+                get_user_for_token(token[:-1] + ('A' if token[-1] != 'A' else 'B'), PASSWORD_RESET)
+
+    def test_reset_token_works_once(self):
+        token = self.user.profile.generate_reset_token()
+        response = self.client.post(f'/password-reset/{token}/', {
+            'password': 'new-pass-456', 'password_confirm': 'new-pass-456',
+        })
+        self.assertRedirects(response, '/login/', fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-pass-456'))
+        self.assertIsNone(get_user_for_token(token, PASSWORD_RESET))
+
+    def test_expired_reset_token(self):
+        token = self.user.profile.generate_reset_token()
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 25 * 3600):
+            with self.assertRaises(signing.SignatureExpired):
+                get_user_for_token(token, PASSWORD_RESET)
+
+    def test_verification_token_is_bound_to_email(self):
+        token = self.user.profile.generate_verification_token()
+        self.user.email = 'other@example.com'
+        self.user.save()
+        self.assertIsNone(get_user_for_token(token, VERIFY_EMAIL))
+
+    def test_verify_email_link(self):
+        token = self.user.profile.generate_verification_token()
+        self.client.get(f'/verify-email/{token}/')
+        self.user.profile.refresh_from_db()
+        self.assertTrue(self.user.profile.email_verified)
+        self.assertIsNone(get_user_for_token(token, VERIFY_EMAIL))
+
+
+class VerificationCodeAttemptTests(TestCase):
+    """Wrong verification codes are counted and lock the code out."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user('codes', 'codes@example.com', 'pass-123')
+        self.profile = self.user.profile
+
+    def test_wrong_guess_is_one_update(self):
+        code = self.profile.generate_verification_code()
+        with self.assertNumQueries(1):
+            self.assertFalse(self.profile.is_verification_code_valid('x' + code[1:]))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.verification_code_attempts, 1)
+        self.assertTrue(self.profile.is_verification_code_valid(code))
+
+    def test_lockout_discards_code(self):
+        code = self.profile.generate_phone_verification_code()
+        for _ in range(MAX_CODE_ATTEMPTS):
+            self.profile.is_phone_verification_code_valid('wrong')
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.phone_verification_code_locked)
+        self.assertIsNone(self.profile.phone_verification_code)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.profile.is_phone_verification_code_valid(code))
+
+        self.profile.generate_phone_verification_code()
+        self.assertEqual(self.profile.phone_verification_code_attempts, 0)
+
+    def test_guesses_with_a_stale_count_are_still_limited(self):
+        code = self.profile.generate_verification_code()
+        # Parallel requests each loaded the profile before any guess landed
+        stale = [UserProfile.objects.get(pk=self.profile.pk) for _ in range(MAX_CODE_ATTEMPTS + 2)]
+        for profile in stale:
+            self.assertFalse(profile.is_verification_code_valid('wrong'))
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.verification_code_attempts, MAX_CODE_ATTEMPTS)
+        self.assertIsNone(self.profile.verification_code)
+        self.assertFalse(stale[0].is_verification_code_valid(code))
+
+    @override_settings(RATELIMIT_RATES={'verification_code': '2/h'})
+    def test_code_guesses_are_rate_limited(self):
+        self.profile.generate_verification_code()
+        self.client.force_login(self.user)
+        for _ in range(2):
+            self.client.post('/verify-email-prompt/', {'code': 'wrong'})
+        response = self.client.post('/verify-email-prompt/', {'code': 'wrong'})
+        self.assertRedirects(response, '/profile/', fetch_redirect_response=False)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.verification_code_attempts, 2)
+
+    def test_prompt_reports_lockout(self):
+        self.profile.generate_verification_code()
+        self.client.force_login(self.user)
+        for _ in range(MAX_CODE_ATTEMPTS):
+            response = self.client.post('/verify-email-prompt/', {'code': 'wrong'}, follow=True)
+        self.assertContains(response, 'Too many incorrect attempts')
+
+    def test_sweeper_clears_expired_codes(self):
+        fresh = User.objects.create_user('fresh', 'fresh@example.com', 'pass-123').profile
+        fresh.generate_verification_code()
+        self.profile.generate_verification_code()
+        self.profile.generate_phone_verification_code()
+        UserProfile.objects.filter(pk=self.profile.pk).update(
+            verification_code_created=timezone.now() - CODE_LIFETIME * 2,
+            phone_verification_code_created=timezone.now() - CODE_LIFETIME * 2,
+            verification_code_attempts=2,
+        )
+        call_command('sweep_verification_codes', batch_size=1, stdout=StringIO())
+
+        self.profile.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertIsNone(self.profile.verification_code)
+        self.assertIsNone(self.profile.phone_verification_code_created)
+        self.assertEqual(self.profile.verification_code_attempts, 0)
+        self.assertIsNotNone(fresh.verification_code)
+
+
+@override_settings(
+    ADMIN_EMAILS=['boss@example.com'],
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': settings.STORAGES['staticfiles'],
+    },
+)
+class AsyncViewTests(TestCase):
+    """I/O-bound views run natively under ASGI."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('fan', 'fan@example.com', 'pass-123')
+        self.admin = User.objects.create_user('boss', 'boss@example.com', 'pass-123')
+        self.async_client = AsyncClient()
+
+    def test_auser_loads_profile_once(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/favorites/list/')
+        self.assertEqual(response.json(), {'favorite_ids': []})
+        user_queries = [q for q in queries if 'auth_user' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+
+    async def test_favorites_round_trip(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            '/favorites/add/', {'car_id': 'c1', 'car_title': 'Civic'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['action'], 'added')
+        response = await self.async_client.get('/favorites/check/c1/')
+        self.assertTrue(response.json()['is_favorite'])
+        response = await self.async_client.post(
+            '/favorites/remove/', {'car_id': 'c1'}, content_type='application/json',
+        )
+        self.assertEqual(response.json()['action'], 'removed')
+        self.assertFalse(await FavoriteCar.objects.aexists())
+
+    def test_add_car_uploads_images(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/api/cars/add/', {
+            'title': 'Civic', 'car_model': 'Honda Civic', 'year': '2020',
+            'price': '15000', 'description': 'Clean',
+            'images': [
+                SimpleUploadedFile('front.jpg', b'front', content_type='image/jpeg'),
+                SimpleUploadedFile('back.jpg', b'back', content_type='image/jpeg'),
+            ],
+        })
+        car = Car.objects.get(pk=response.json()['car_id'])
+        images = list(car.images.all())
+        self.assertEqual([image.order for image in images], [0, 1])
+        self.assertTrue(images[0].is_primary)
+        self.assertTrue(all(default_storage.exists(image.image.name) for image in images))
+
+    def car_images_in_storage(self):
+        if not default_storage.exists('car_images'):
+            return set()
+        return set(default_storage.listdir('car_images')[1])
+
+    def post_car_with_images(self):
+        return self.client.post('/api/cars/add/', {
+            'title': 'Civic', 'car_model': 'Honda Civic', 'year': '2020',
+            'price': '15000', 'description': 'Clean',
+            'images': [
+                SimpleUploadedFile('front.jpg', b'front', content_type='image/jpeg'),
+                SimpleUploadedFile('back.jpg', b'back', content_type='image/jpeg'),
+            ],
+        })
+
+    def test_add_car_removes_uploads_when_one_fails(self):
+        from . import views
+        stored_before = self.car_images_in_storage()
+        real_store = views.store_car_image
+
+        def store(image):
+            if image.name == 'back.jpg':
+                raise OSError('storage down')
+            return real_store(image)
+
+        self.client.force_login(self.admin)
+        with mock.patch('store.views.store_car_image', side_effect=store):
+            response = self.post_car_with_images()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Car.objects.exists())
+        self.assertEqual(self.car_images_in_storage(), stored_before)
+
+    def test_add_car_removes_uploads_when_insert_fails(self):
+        stored_before = self.car_images_in_storage()
+        self.client.force_login(self.admin)
+        with mock.patch('store.views.create_car_with_images', side_effect=RuntimeError('db down')):
+            response = self.post_car_with_images()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.car_images_in_storage(), stored_before)
+
+    def test_add_car_requires_admin(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/api/cars/add/', {'title': 'Civic'})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.assertFalse(Car.objects.exists())
+
+    def test_cars_api_prefetches_images(self):
+        get_tiered_cache().clear()
+        for n in range(3):
+            car = Car.objects.create(title=f'Car {n}', car_model='Model', year=2020,
+                                     price=1000, description='')
+            CarImage.objects.create(car=car, image=f'car_images/{n}b.jpg', order=1)
+            CarImage.objects.create(car=car, image=f'car_images/{n}a.jpg', order=0, is_primary=True)
+        Car.objects.create(title='Hidden', car_model='Model', year=2020, price=1,
+                           description='', is_hidden=True)
+
+        with self.assertNumQueries(2):
+            cars = self.client.get('/api/cars/').json()['cars']
+        self.assertEqual(len(cars), 3)
+        self.assertTrue(cars[0]['primary_image'].endswith('a.jpg'))
+        self.assertEqual(len(cars[0]['images']), 2)
+
+
+@override_settings(
+    ADMIN_EMAILS=['boss@example.com'],
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': settings.STORAGES['staticfiles'],
+    },
+)
+class CarImportExportTests(TestCase):
+    """Bulk car import and export stream CSV and JSON Lines."""
+
+    csv_data = (
+        'title,car_model,year,price,description,mileage,condition,is_sold,is_hidden,images\n'
+        'Civic,Honda Civic,2020,15000,Clean,42000,Used,false,,https://img.example.com/a.jpg|https://img.example.com/b.jpg\n'
+        'Broken,Honda Civic,not-a-year,15000,Clean,,,,,\n'
+        'Corolla,Toyota Corolla,2019,12000.50,Tidy,,,yes,,\n'
+    )
+
+    def stored_images(self):
+        if not default_storage.exists('car_images'):
+            return set()
+        return set(default_storage.listdir('car_images')[1])
+
+    def setUp(self):
+        # img.example.com resolves to a public address
+        patcher = mock.patch('store.car_io.socket.getaddrinfo', return_value=[
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('93.184.216.34', 443)),
+        ])
+        self.getaddrinfo = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_response(self, content=b'', headers=None, status_code=200):
+        response = mock.MagicMock(status_code=status_code, headers=headers or {},
+                                  is_redirect=status_code in (301, 302))
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [content]
+        return response
+
+    def fake_get(self, url, **kwargs):
+        return self.fake_response(url.encode())
+
+    def test_csv_import_in_chunks(self):
+        with mock.patch('requests.get', side_effect=self.fake_get):
+            # Both valid rows land in one chunk: one INSERT each for cars and images
+            with self.assertNumQueries(4):
+                created, errors = import_cars(
+                    iter_records(StringIO(self.csv_data), 'csv'), chunk_size=2
+                )
+        self.assertEqual(created, 2)
+        self.assertEqual([line for line, _ in errors], [3])
+        civic = Car.objects.get(title='Civic')
+        self.assertEqual(civic.mileage, 42000)
+        self.assertEqual([image.is_primary for image in civic.images.all()], [True, False])
+        self.assertTrue(Car.objects.get(title='Corolla').is_sold)
+
+    def test_failed_image_skips_record(self):
+        lines = StringIO(
+            '{"title": "Civic", "car_model": "Civic", "year": 2020, "price": 1, '
+            '"description": "x", "images": ["https://img.example.com/a.jpg", "/etc/passwd"]}\n'
+            'not json\n'
+        )
+        stored_before = self.stored_images()
+        with mock.patch('requests.get', side_effect=self.fake_get) as get:
+            created, errors = import_cars(iter_records(lines, 'jsonl'))
+        self.assertEqual(created, 0)
+        self.assertEqual([line for line, _ in errors], [1, 2])
+        self.assertFalse(CarImage.objects.exists())
+        # The image that did upload is removed again
+        get.assert_called_once()
+        self.assertEqual(self.stored_images(), stored_before)
+
+    def test_image_limit_skips_later_records(self):
+        with mock.patch('requests.get', side_effect=self.fake_get) as get:
+            created, errors = import_cars(
+                iter_records(StringIO(self.csv_data), 'csv'), max_images=1
+            )
+        get.assert_not_called()
+        # Civic has two images; Corolla has none and is still imported
+        self.assertEqual(created, 1)
+        self.assertEqual([line for line, _ in errors], [2, 3])
+        self.assertIn('Image limit', dict(errors)[2])
+
+    def test_failed_insert_removes_uploaded_images(self):
+        stored_before = self.stored_images()
+        with mock.patch('requests.get', side_effect=self.fake_get), \
+                mock.patch.object(CarImage.objects, 'bulk_create', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                import_cars(iter_records(StringIO(self.csv_data), 'csv'))
+        self.assertFalse(Car.objects.exists())
+        self.assertEqual(self.stored_images(), stored_before)
+
+    def test_image_urls_must_resolve_to_public_addresses(self):
+        for address in ('127.0.0.1', '10.0.0.5', '169.254.169.254', '::1', '::ffff:192.168.0.1'):
+            with self.subTest(address=address):
+                self.getaddrinfo.return_value = [(socket.AF_INET6, socket.SOCK_STREAM, 6, '', (address, 80))]
+                with mock.patch('requests.get') as get:
+                    with self.assertRaisesRegex(ValueError, 'non-public'):
+                        fetch_image('http://internal.example.com/a.jpg')
+                get.assert_not_called()
+        with self.assertRaisesRegex(ValueError, 'Not an http'):
+            fetch_image('file:///etc/passwd')
+
+    def test_redirects_are_checked_too(self):
+        redirect = self.fake_response(status_code=302,
+                                      headers={'Location': 'http://169.254.169.254/latest/'})
+
+        def resolve(host, *args, **kwargs):
+            address = '169.254.169.254' if host == '169.254.169.254' else '93.184.216.34'
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, 80))]
+
+        self.getaddrinfo.side_effect = resolve
+        with mock.patch('requests.get', return_value=redirect) as get:
+            with self.assertRaisesRegex(ValueError, 'non-public'):
+                fetch_image('https://img.example.com/a.jpg')
+        get.assert_called_once()
+        self.assertFalse(get.call_args.kwargs['allow_redirects'])
+
+    @override_settings(CAR_IMPORT_MAX_IMAGE_BYTES=4)
+    def test_image_size_is_capped(self):
+        with mock.patch('requests.get', return_value=self.fake_response(b'12345')):
+            with self.assertRaisesRegex(ValueError, 'larger than 4 bytes'):
+                fetch_image('https://img.example.com/a.jpg')
+        too_long = self.fake_response(headers={'Content-Length': '5'})
+        with mock.patch('requests.get', return_value=too_long):
+            with self.assertRaisesRegex(ValueError, 'larger than 4 bytes'):
+                fetch_image('https://img.example.com/a.jpg')
+        too_long.iter_content.assert_not_called()
+
+    def test_export_round_trips(self):
+        car = Car.objects.create(title='Civic', car_model='Honda Civic', year=2020,
+                                 price=15000, description='Clean')
+        CarImage.objects.create(car=car, image='car_images/a.jpg', is_primary=True)
+        lines = list(export_lines('jsonl'))
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record['images'], ['/media/car_images/a.jpg'])
+
+        csv_lines = list(export_lines('csv'))
+        rows = list(iter_records(csv_lines, 'csv'))
+        self.assertEqual(rows[0][1]['title'], 'Civic')
+        self.assertEqual(rows[0][1]['images'], ['/media/car_images/a.jpg'])
+
+    def test_admin_endpoints(self):
+        admin = User.objects.create_user('boss', 'boss@example.com', 'pass-123')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('cars.csv', self.csv_data.replace(
+            'https://img.example.com/a.jpg|https://img.example.com/b.jpg', ''
+        ).encode())
+        response = self.client.post('/api/cars/import/', {'file': upload})
+        self.assertEqual(response.json()['created'], 2)
+
+        response = self.client.get('/api/cars/export/?format=csv')
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(body.strip().splitlines()), 3)
+
+    def test_endpoints_require_admin(self):
+        self.client.force_login(User.objects.create_user('fan', 'fan@example.com', 'pass-123'))
+        self.assertEqual(self.client.get('/api/cars/export/').status_code, 403)
+
+
+@override_settings(ADMIN_EMAILS=['boss@example.com'])
+class BulkCarActionTests(TestCase):
+    """Bulk admin actions run as one UPDATE/DELETE per request."""
+
+    def setUp(self):
+        self.cars = [
+            Car.objects.create(title=f'Car {n}', car_model='Model', year=2020,
+                               price=1000 + n, description='')
+            for n in range(3)
+        ]
+        self.client.force_login(User.objects.create_user('boss', 'boss@example.com', 'pass-123'))
+
+    def post(self, payload):
+        return self.client.post('/api/cars/bulk/', payload, content_type='application/json')
+
+    def car_writes(self, queries):
+        return [q['sql'] for q in queries
+                if q['sql'].startswith(('UPDATE "store_car"', 'DELETE FROM "store_car"'))]
+
+    def test_hide_is_one_update(self):
+        ids = [self.cars[0].pk, self.cars[1].pk, 999]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post({'action': 'hide', 'car_ids': ids})
+        self.assertEqual(response.json()['affected_ids'], ids[:2])
+        self.assertEqual(len(self.car_writes(queries)), 1)
+        self.assertEqual(Car.objects.filter(is_hidden=True).count(), 2)
+
+    def test_reprice_by_percentage(self):
+        response = self.post({'action': 'reprice', 'car_ids': [self.cars[2].pk], 'percent': -10})
+        self.assertTrue(response.json()['success'])
+        self.cars[2].refresh_from_db()
+        self.assertEqual(str(self.cars[2].price), '901.80')
+
+    def test_delete(self):
+        CarImage.objects.create(car=self.cars[0], image='car_images/a.jpg')
+        response = self.post({'action': 'delete', 'car_ids': [self.cars[0].pk, self.cars[1].pk]})
+        self.assertEqual(len(response.json()['affected_ids']), 2)
+        self.assertEqual(list(Car.objects.values_list('pk', flat=True)), [self.cars[2].pk])
+        self.assertFalse(CarImage.objects.exists())
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.post({'action': 'explode', 'car_ids': [1]}).status_code, 400)
+        self.assertEqual(self.post({'action': 'hide', 'car_ids': []}).status_code, 400)
+        self.assertEqual(self.post({'action': 'reprice', 'car_ids': [1], 'percent': 'NaN'}).status_code, 400)
+        self.assertEqual(self.post({'action': 'reprice', 'car_ids': [1], 'percent': -100}).status_code, 400)
+
+    def test_requires_admin(self):
+        self.client.force_login(User.objects.create_user('fan', 'fan@example.com', 'pass-123'))
+        self.assertEqual(self.post({'action': 'delete', 'car_ids': [self.cars[0].pk]}).status_code, 403)
+        self.assertEqual(Car.objects.count(), 3)
+
+
+class TimedInMemoryStorage(TimedStorageMixin, InMemoryStorage):
+    pass
+
+
+@override_settings(
+    PERFORMANCE_BUDGETS={'db_count': 50},
+    SERVER_TIMING_HEADER=True,
+    SMS_TRANSPORT='store.sms.LocMemTransport',
+    STORAGES={
+        'default': {'BACKEND': 'store.tests.TimedInMemoryStorage'},
+        'staticfiles': settings.STORAGES['staticfiles'],
+    },
+)
+class ServerTimingTests(TestCase):
+    """Requests report DB/storage/SMS time in Server-Timing and the log."""
+
+    def setUp(self):
+        get_tiered_cache().clear()
+        car = Car.objects.create(title='Civic', car_model='Civic', year=2020, price=1, description='')
+        CarImage.objects.create(car=car, image='car_images/a.jpg')
+
+    def metrics(self, response):
+        return dict(
+            (part.split(';')[0].strip(), part) for part in response['Server-Timing'].split(',')
+        )
+
+    def test_header_counts_queries_and_storage(self):
+        with self.assertLogs('store.timing', 'INFO') as logs:
+            response = self.client.get('/api/cars/')
+        metrics = self.metrics(response)
+        self.assertIn('desc="2 calls"', metrics['db'])
+        self.assertIn('storage', metrics)
+        self.assertIn('total', metrics)
+        record = json.loads(logs.output[0].split('Request timing: ', 1)[1])
+        self.assertEqual(record['view'], 'get_cars_api')
+        self.assertEqual(record['db_count'], 2)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_header_can_be_turned_off(self):
+        with self.assertLogs('store.timing', 'INFO'):
+            response = self.client.get('/api/cars/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(PERFORMANCE_BUDGETS={'db_count': 1})
+    def test_over_budget_is_flagged(self):
+        with self.assertLogs('store.timing', 'WARNING') as logs:
+            self.client.get('/api/cars/')
+        self.assertIn('"over_budget": ["db_count"]', logs.output[0])
+
+    def test_async_view_reports_db_time_but_not_queued_sms(self):
+        user = User.objects.create_user('kim', 'kim@example.com', 'pass-123')
+        UserProfile.objects.filter(user=user).update(phone_number='+15550001111')
+        self.client.force_login(user)
+        response = self.client.post('/send-phone-verification/')
+        # The SMS itself is sent after the response
+        self.assertNotIn('sms', self.metrics(response))
+        self.assertIn('db', self.metrics(response))
+
+    def test_no_collector_outside_requests(self):
+        self.assertIsNone(timing.current())
+        with timing.timed('db'):
+            pass
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    RATELIMIT_ENABLED=False,
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+        'staticfiles': settings.STORAGES['staticfiles'],
+    },
+)
+class LoadTestTests(TestCase):
+    """Load-test scenarios, mixes and percentile reporting."""
+
+    def setUp(self):
+        self.data = loadtest.seed(cars=5, images_per_car=1, customers=2)
+
+    def test_every_scenario_runs_without_errors(self):
+        stats = loadtest.LoadTestStats()
+        user = loadtest.VirtualUser(stats, self.data, random.Random(1))
+        for name in loadtest.SCENARIOS:
+            user.run(name)
+        self.assertEqual(dict(stats.errors), {})
+        self.assertIn('POST /login/', stats.latencies)
+        self.assertIn('POST /api/cars/<id>/update/', stats.latencies)
+
+    def test_unexpected_status_is_an_error(self):
+        stats = loadtest.LoadTestStats()
+        user = loadtest.VirtualUser(stats, self.data, random.Random(1))
+        user.request(user.client('anonymous'), 'GET', '/api/admin/cars/')
+        self.assertEqual(stats.errors['GET /api/admin/cars/'], 1)
+
+    def test_summary_reports_percentiles_and_rps(self):
+        stats = loadtest.LoadTestStats()
+        for ms in range(1, 101):
+            stats.record('GET /', ms)
+        stats.record('GET /inventory/', 500, ok=False)
+        rows = {row['endpoint']: row for row in stats.summary(elapsed=10)}
+        self.assertEqual(
+            (rows['GET /']['p50_ms'], rows['GET /']['p95_ms'], rows['GET /']['p99_ms']), (50, 95, 99)
+        )
+        self.assertEqual(rows['GET /']['rps'], 10.0)
+        self.assertEqual((rows['total']['requests'], rows['total']['errors']), (101, 1))
+
+    def test_parse_mix(self):
+        self.assertEqual(loadtest.parse_mix('login=5, admin_edit'), {'login': 5.0, 'admin_edit': 1.0})
+        for value in ('checkout=1', 'login=x', 'login=0'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                loadtest.parse_mix(value)
+
+
+class ColdStartTests(TestCase):
+    """The WSGI entry point starts within budget and defers optional SDKs."""
+
+    def test_entry_point_cold_start(self):
+        report = coldstart.measure()
+        self.assertEqual(coldstart.eager_lazy_modules(report['modules']), [])
+        self.assertLessEqual(report['ms'], settings.COLD_START_BUDGET_MS)
+
+    def test_parse_importtime(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     requests.compat\n'
+            'import time:       300 |        420 |   requests\n'
+            'import time:        80 |        500 | mrmotors.wsgi\n'
+        )
+        imports = coldstart.parse_importtime(output)
+        self.assertEqual(imports[1], coldstart.ImportTiming('requests', 300, 420, 1))
+        self.assertEqual(imports[0].depth, 2)
+        self.assertEqual(coldstart.by_package(imports), [('requests', 420), ('mrmotors', 80)])
+
+
+class WarmUpTests(TestCase):
+    """Start-up warm-up of URL resolvers and templates."""
+
+    def test_project_templates_are_warmed(self):
+        names = warmup.project_template_names(engines['django'])
+        self.assertIn('home.html', names)
+        self.assertIn('emails/verification.txt', names)
+        self.assertFalse([name for name in names if name.startswith(('admin/', 'account/'))])
+
+    def test_strict_warm_up_succeeds(self):
+        timings = warmup.warm_up(strict=True)
+        self.assertEqual(list(timings), ['urls', 'templates', 'translations'])
+
+    def test_failures_are_logged_unless_strict(self):
+        with mock.patch('store.warmup.get_resolver', side_effect=ImportError('broken')):
+            with self.assertLogs('store.warmup', 'ERROR'):
+                warmup.warm_up()
+            with self.assertRaises(ImportError):
+                warmup.warm_up(strict=True)
+
+
+@override_settings(ADMIN_EMAILS=['boss@example.com'])
+class PageTemplateTests(TestCase):
+    """Pages render through the cached loader with a memoized admin check."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'pw')
+        AdminUser.objects.create(user=self.admin)
+        self.customer = User.objects.create_user('customer', 'customer@example.com', 'pw')
+
+    def test_templates_use_the_cached_loader(self):
+        loaders = engines['django'].engine.template_loaders
+        self.assertEqual([type(loader).__module__ for loader in loaders],
+                         ['django.template.loaders.cached'])
+
+    def test_admin_links_follow_the_admin_check(self):
+        for user, shown in ((self.admin, True), (self.customer, False)):
+            self.client.force_login(user)
+            response = self.client.get('/')
+            self.assertEqual(response.content.count(b'href="/admin-panel/"'), 2 if shown else 0)
+
+    def test_admin_check_runs_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.customer
+        with mock.patch('store.context_processors.is_admin', return_value=False) as check:
+            for _ in range(2):
+                flag = context_processors.navigation(request)['is_admin']
+                self.assertFalse(flag)
+                self.assertFalse(flag)
+        check.assert_called_once_with(self.customer)
+
+    def test_anonymous_pages_skip_the_admin_check(self):
+        with mock.patch('store.context_processors.is_admin') as check:
+            self.assertEqual(self.client.get('/').status_code, 200)
+        check.assert_not_called()
+
+
+class CompressedManifestStaticFilesStorageTests(TestCase):
+    """collectstatic minifies, fingerprints and precompresses static files."""
+
+    def setUp(self):
+        source = tempfile.TemporaryDirectory()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        (Path(source.name) / 'js').mkdir()
+        (Path(source.name) / 'js' / 'app.js').write_text(
+            '// Greets the visitor\n'
+            'function greet(name) {\n'
+            '    /* a template literal survives minification */\n'
+            '    return `Hello, ${name}!`;\n'
+            '}\n' * 20
+        )
+        (Path(source.name) / 'site.css').write_text(
+            '/* Page background */\nbody {\n    background: url("logo.png");\n}\n'
+        )
+        (Path(source.name) / 'logo.png').write_bytes(b'\x89PNG not really')
+        self.settings = override_settings(
+            STATIC_ROOT=root.name,
+            STATICFILES_DIRS=[source.name],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.manifest = json.loads((self.root / 'staticfiles.json').read_text())['paths']
+
+    def test_files_are_fingerprinted(self):
+        hashed = self.manifest['js/app.js']
+        self.assertRegex(hashed, r'^js/app\.[0-9a-f]{12}\.js$')
+        self.assertEqual(staticfiles_storage.url('js/app.js'), f'/static/{hashed}')
+
+    def test_javascript_and_css_are_minified(self):
+        script = (self.root / self.manifest['js/app.js']).read_text()
+        self.assertNotIn('Greets the visitor', script)
+        self.assertIn('`Hello, ${name}!`', script)
+        css = (self.root / self.manifest['site.css']).read_text()
+        self.assertNotIn('Page background', css)
+        # URLs are rewritten to the fingerprinted names after minifying
+        self.assertIn(self.manifest['logo.png'], css)
+
+    def test_text_assets_are_precompressed(self):
+        hashed = self.root / self.manifest['js/app.js']
+        compressed = Path(f'{hashed}.gz')
+        self.assertEqual(gzip.decompress(compressed.read_bytes()), hashed.read_bytes())
+        self.assertTrue(Path(f'{hashed}.br').exists())
+        self.assertFalse(Path(f'{self.root / self.manifest["logo.png"]}.gz').exists())
+
+    def test_uncollected_files_keep_their_plain_name(self):
+        self.assertEqual(staticfiles_storage.url('js/added-later.js'), '/static/js/added-later.js')
+
+
+@override_settings(DATABASE_READ_REPLICA='replica')
+class ReadReplicaRoutingTests(TestCase):
+    """Read-only views read from the replica alias (a second SQLite database here)."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        get_tiered_cache().clear()
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        # The replica has the user too, but different cars and favorites
+        User.objects.using('replica').bulk_create([
+            User(pk=self.user.pk, username='reader', email='reader@example.com')
+        ])
+        Car.objects.create(title='Primary car', car_model='P', year=2020, price=1, description='x')
+        Car.objects.using('replica').create(
+            title='Replica car', car_model='R', year=2020, price=1, description='x'
+        )
+        FavoriteCar.objects.create(user=self.user, car_id='primary')
+        FavoriteCar.objects.using('replica').create(user_id=self.user.pk, car_id='replica')
+
+    def test_cached_inventory_is_rebuilt_from_primary(self):
+        # A lagging replica must not be cached as the fresh inventory
+        cars = self.client.get('/api/cars/').json()['cars']
+        self.assertEqual([car['title'] for car in cars], ['Primary car'])
+
+    def test_favorites_read_from_replica_but_user_from_primary(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get('/favorites/list/')
+        self.assertEqual(response.json(), {'favorite_ids': ['replica']})
+        self.assertFalse([
+            query for query in replica_queries
+            if 'auth_user' in query['sql'] or 'django_session' in query['sql']
+        ])
+
+    def test_writes_and_other_views_use_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/favorites/add/', json.dumps({'car_id': 'new'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['action'], 'added')
+        self.assertTrue(FavoriteCar.objects.filter(car_id='new').exists())
+        self.assertFalse(FavoriteCar.objects.using('replica').filter(car_id='new').exists())
+
+    def test_without_replica_reads_use_primary(self):
+        self.client.force_login(self.user)
+        with self.settings(DATABASE_READ_REPLICA=None):
+            response = self.client.get('/favorites/list/')
+        self.assertEqual(response.json(), {'favorite_ids': ['primary']})
+
+
+class TieredCacheTests(TestCase):
+    """The in-process tier in front of the shared cache, and single-flight fills."""
+
+    def setUp(self):
+        self.cache = TieredCache(local_timeout=60, max_entries=3)
+        self.cache.clear()
+
+    def test_local_tier_is_a_bounded_lru(self):
+        for n in range(4):
+            self.cache.set(f'test:{n}', n, 60)
+        self.cache.get('test:1')
+        self.cache.set('test:4', 4, 60)
+        self.assertEqual(len(self.cache.local), 3)
+        # Evicted locally but still shared
+        self.assertEqual(self.cache.get('test:0'), 0)
+        self.assertEqual(self.cache.stats()['test']['shared_hits'], 1)
+
+    def test_local_entries_expire(self):
+        self.cache.local_timeout = 0.01
+        self.cache.set('test:a', 'a', 60)
+        time.sleep(0.02)
+        self.cache.shared.delete('test:a')
+        self.assertIsNone(self.cache.get('test:a'))
+
+    def test_get_or_set_counts_hits_and_misses(self):
+        compute = mock.Mock(return_value={'cars': []})
+        for _ in range(3):
+            self.assertEqual(self.cache.get_or_set('test:cars', compute, 60), {'cars': []})
+        compute.assert_called_once()
+        self.assertEqual(self.cache.stats()['test'], {
+            'local_hits': 2, 'shared_hits': 0, 'misses': 1, 'computes': 1, 'waits': 0,
+            'stale_hits': 0, 'hit_rate': 0.667,
+        })
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.cache.get_or_set('test:slow', compute, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_another_instance_computing(self):
+        # Another instance holds the lock and stores its result shortly
+        self.cache.shared.add('lock:test:shared', 1, 10)
+        timer = threading.Timer(0.1, self.cache.shared.set, ('test:shared', 'theirs', 60))
+        timer.start()
+        compute = mock.Mock(return_value='ours')
+        self.assertEqual(self.cache.get_or_set('test:shared', compute, 60), 'theirs')
+        timer.join()
+        compute.assert_not_called()
+        self.assertEqual(self.cache.stats()['test']['waits'], 1)
+
+    def test_bump_invalidates_namespace(self):
+        key = self.cache.key('test', 'cars')
+        self.cache.set(key, 'old', 60)
+        self.cache.bump('test')
+        self.assertNotEqual(self.cache.key('test', 'cars'), key)
+        self.assertEqual(self.cache.get(self.cache.key('test', 'cars'), 'missing'), 'missing')
+
+    def test_stale_value_served_while_another_rebuilds(self):
+        self.cache.get_or_revalidate('test', 'cars', lambda: 'old', 60, 60)
+        self.cache.bump('test')
+        compute = mock.Mock(return_value='new')
+        # Another caller holds the rebuild lock
+        self.cache.shared.add('lock:test:cars', 1, 10)
+        self.assertEqual(self.cache.get_or_revalidate('test', 'cars', compute, 60, 60), 'old')
+        compute.assert_not_called()
+        self.assertEqual(self.cache.stats()['test']['stale_hits'], 1)
+        self.cache.shared.delete('lock:test:cars')
+        self.assertEqual(self.cache.get_or_revalidate('test', 'cars', compute, 60, 60), 'new')
+        self.assertEqual(self.cache.get_or_revalidate('test', 'cars', compute, 60, 60), 'new')
+        compute.assert_called_once()
+
+    def test_stale_value_served_when_rebuild_fails(self):
+        self.cache.get_or_revalidate('test', 'cars', lambda: 'old', 60, 60)
+        self.cache.bump('test')
+        failing = mock.Mock(side_effect=RuntimeError('database down'))
+        with self.assertLogs('store.cache', 'ERROR'):
+            self.assertEqual(self.cache.get_or_revalidate('test', 'cars', failing, 60, 60), 'old')
+        # The lock is released, so the next caller tries again
+        self.assertEqual(self.cache.get_or_revalidate('test', 'cars', lambda: 'new', 60, 60), 'new')
+
+    def test_expired_entry_is_revalidated(self):
+        self.cache.get_or_revalidate('test', 'cars', lambda: 'old', 0, 60)
+        self.assertEqual(self.cache.get_or_revalidate('test', 'cars', lambda: 'new', 60, 60), 'new')
+
+    def test_burst_after_invalidation_rebuilds_once(self):
+        self.cache.get_or_revalidate('test', 'cars', lambda: 'old', 60, 60)
+        self.cache.bump('test')
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'new'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.cache.get_or_revalidate('test', 'cars', compute, 60, 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(set(results)), ['new', 'old'])
+
+    def test_rebuild_by_another_instance_is_used(self):
+        other = TieredCache(local_timeout=60)
+        self.cache.version('test')
+        # The other instance sees a bump this one hasn't yet and rebuilds
+        other.bump('test')
+        other.get_or_revalidate('test', 'cars', lambda: 'new', 60, 60)
+        compute = mock.Mock()
+        self.assertEqual(self.cache.get_or_revalidate('test', 'cars', compute, 60, 60), 'new')
+        compute.assert_not_called()
+
+
+@override_settings(CRON_SECRET='cron-secret')
+class InventoryCacheTests(TransactionTestCase):
+    """
+    The public inventory, facets and admin checks are cached until they
+    change (committing for real, since invalidation waits for the commit).
+    """
+
+    def setUp(self):
+        get_tiered_cache().clear()
+        Car.objects.create(title='Civic', car_model='Honda Civic', year=2020, price=15000,
+                           description='', condition='Used')
+        Car.objects.create(title='Model 3', car_model='Tesla Model 3', year=2022, price=35000,
+                           description='', is_sold=True)
+        Car.objects.create(title='Hidden', car_model='Tesla Model 3', year=2022, price=1,
+                           description='', is_hidden=True)
+
+    def titles(self):
+        return [car['title'] for car in self.client.get('/api/cars/').json()['cars']]
+
+    def test_cars_api_is_cached(self):
+        self.assertEqual(self.titles(), ['Model 3', 'Civic'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['Model 3', 'Civic'])
+
+    def test_saving_a_car_invalidates_after_commit(self):
+        self.titles()
+        with mock.patch('store.inventory.bump_inventory', wraps=bump_inventory) as bump:
+            with transaction.atomic():
+                Car.objects.create(title='Golf', car_model='VW Golf', year=2019, price=9000,
+                                   description='')
+                Car.objects.filter(title='Civic').get().delete()
+                self.assertEqual(self.titles(), ['Model 3', 'Civic'])
+        # One bump per transaction however many rows changed
+        bump.assert_called_once()
+        self.assertEqual(self.titles(), ['Golf', 'Model 3'])
+
+    def test_bulk_updates_invalidate(self):
+        self.titles()
+        Car.objects.filter(title='Civic').update(is_hidden=True)
+        self.assertEqual(self.titles(), ['Model 3', 'Civic'])
+        invalidate_inventory()
+        self.assertEqual(self.titles(), ['Model 3'])
+
+    def test_facets(self):
+        facets = self.client.get('/api/cars/facets/').json()
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual((facets['available'], facets['sold']), (1, 1))
+        self.assertEqual(facets['car_model'], [
+            {'value': 'Honda Civic', 'count': 1}, {'value': 'Tesla Model 3', 'count': 1},
+        ])
+        self.assertEqual([band['count'] for band in facets['price']], [0, 1, 0, 1, 0])
+        self.assertEqual(facets['price'][-1], {'min': 50000, 'max': None, 'count': 0})
+        with self.assertNumQueries(0):
+            self.client.get('/api/cars/facets/')
+
+    def test_admin_check_is_cached_and_cleared(self):
+        user = User.objects.create_user('boss', 'boss@example.com', 'pw')
+        AdminUser.objects.create(user=user)
+        # Users loaded without their admin record
+        with self.assertNumQueries(1):
+            self.assertTrue(is_admin(User(pk=user.pk, email=user.email)))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_admin(User(pk=user.pk, email=user.email)))
+        AdminUser.objects.get(user=user).delete()
+        self.assertFalse(is_admin(User(pk=user.pk, email=user.email)))
+
+    def test_home_page_features_cached_cars(self):
+        response = self.client.get('/')
+        self.assertEqual([car['title'] for car in response.context['featured_cars']], ['Civic'])
+        self.assertContains(response, '$15,000')
+        with self.assertNumQueries(0):
+            self.client.get('/')
+
+    def test_cache_stats_requires_secret(self):
+        self.titles()
+        self.titles()
+        self.assertEqual(self.client.get('/_admin/cache-stats/').status_code, 403)
+        self.assertEqual(self.client.get(
+            '/_admin/cache-stats/', HTTP_AUTHORIZATION='Bearer wrong'
+        ).status_code, 403)
+        stats = self.client.get(
+            '/_admin/cache-stats/', HTTP_AUTHORIZATION='Bearer cron-secret'
+        ).json()
+        self.assertGreaterEqual(stats['namespaces']['inventory']['local_hits'], 1)
@@ -0,0 +1,137 @@
+"""
+Per-request performance timings.
+
+``ServerTimingMiddleware`` (store/middleware.py) starts a ``RequestTimings``
+for each request. Code doing I/O reports into it with ``timed(category)``:
+
+- ``db``: every query, through an execute wrapper installed on each
+  database connection as it is opened (store/signals.py);
+- ``storage``: file storage calls (store/storage.py);
+- ``cache``: lookups in the shared tier of store/cache.py;
+- ``email`` and ``sms``: the SMTP backend and SMS transports.
+
+The collector lives in a context variable, so work done in
+``sync_to_async`` threads still counts towards its request, while
+background jobs don't. Durations are cumulative, so concurrent work (e.g.
+parallel uploads) can add up to more than the request's wall time.
+
+At the end of the request the timings are sent as a ``Server-Timing``
+header and one structured log line, and checked against
+``settings.PERFORMANCE_BUDGETS``.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Cumulative time and call count per category for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, category, seconds):
+        with self._lock:
+            self.durations[category] += seconds
+            self.counts[category] += 1
+
+    def stop(self):
+        self.total = time.perf_counter() - self.started
+
+    def as_dict(self):
+        """Millisecond durations and counts, e.g. ``{'db_ms': 1.2, 'db_count': 3}``."""
+        record = {'total_ms': round(self.total * 1000, 1)}
+        for category in sorted(self.durations):
+            record[f'{category}_ms'] = round(self.durations[category] * 1000, 1)
+            record[f'{category}_count'] = self.counts[category]
+        return record
+
+
+def start():
+    """Begin collecting for the current request; returns ``(timings, token)``."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish(timings, token):
+    timings.stop()
+    _current.reset(token)
+
+
+def current():
+    """The collector of the request being handled, or None."""
+    return _current.get()
+
+
+@contextmanager
+def timed(category):
+    """Add the time spent in the block to the current request's ``category``."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(category, time.perf_counter() - started)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+def install_db_timing(connection):
+    """Time ``connection``'s queries (idempotent; wrappers survive reconnects)."""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+def over_budget(record):
+    """Return the ``PERFORMANCE_BUDGETS`` keys that ``record`` exceeds."""
+    budgets = getattr(settings, 'PERFORMANCE_BUDGETS', {})
+    return sorted(key for key, limit in budgets.items() if record.get(key, 0) > limit)
+
+
+def server_timing_header(timings):
+    """Format ``timings`` as a ``Server-Timing`` header value."""
+    metrics = [
+        f'{category};dur={timings.durations[category] * 1000:.1f};desc="{timings.counts[category]} calls"'
+        for category in sorted(timings.durations)
+    ]
+    metrics.append(f'total;dur={timings.total * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+def report(request, response, timings):
+    """Add the header, log the request's timings and flag budget overruns."""
+    record = {
+        'method': request.method,
+        'path': request.path,
+        'view': getattr(request.resolver_match, 'view_name', None),
+        'status': response.status_code,
+        **timings.as_dict(),
+    }
+    exceeded = over_budget(record)
+    if getattr(settings, 'SERVER_TIMING_HEADER', False):
+        response['Server-Timing'] = server_timing_header(timings)
+    if exceeded:
+        record['over_budget'] = exceeded
+        logger.warning(f"Request over budget: {json.dumps(record)}")
+    else:
+        logger.info(f"Request timing: {json.dumps(record)}")
+    return record
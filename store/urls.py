@@ -9,6 +9,10 @@ urlpatterns = [
     path('_admin/run-migrations/', views_admin.run_migrations, name='run_migrations'),
     path('_admin/migration-status/', views_admin.migration_status, name='migration_status'),
     path('_admin/test-email/', views.test_email_config, name='test_email'),
+    path('_admin/drain-outbox/', views_admin.drain_outbox, name='drain_outbox'),
+    path('_admin/run-jobs/', views_admin.run_jobs, name='run_jobs'),
+    path('_admin/prune-ratelimit/', views_admin.prune_ratelimit, name='prune_ratelimit'),
+    path('_admin/cache-stats/', views_admin.cache_stats, name='cache_stats'),
     
     path('', views.home, name='home'),
     path('inventory/', views.inventory, name='inventory'),
@@ -51,8 +55,12 @@ urlpatterns = [
     
     # Car Management
     path('api/cars/', views.get_cars_api, name='get_cars_api'),
+    path('api/cars/facets/', views.get_car_facets_api, name='get_car_facets_api'),
     path('api/admin/cars/', views.get_admin_cars_api, name='get_admin_cars_api'),
     path('api/cars/add/', views.add_car_view, name='add_car'),
+    path('api/cars/import/', views.import_cars_view, name='import_cars'),
+    path('api/cars/export/', views.export_cars_view, name='export_cars'),
+    path('api/cars/bulk/', views.bulk_car_action, name='bulk_car_action'),
     path('api/cars/<int:car_id>/update/', views.update_car_view, name='update_car'),
     path('api/cars/<int:car_id>/delete/', views.delete_car_view, name='delete_car'),
     path('api/cars/<int:car_id>/toggle-sold/', views.toggle_car_sold_status, name='toggle_car_sold'),
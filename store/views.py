@@ -6,17 +6,38 @@ from django.contrib.auth.decorators import login_required
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from .models import UserProfile, FavoriteCar, Car, CarImage, AdminUser
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Round
+from django.core import signing
+from asgiref.sync import sync_to_async
+from . import background
+from .accounts import aget_profile, ais_admin, allocate_username, get_user_by_email, users_by_email
+from .car_io import FORMATS as CAR_FORMATS, export_lines, format_for_path, import_cars, iter_records
+from .db_routers import read_replica
+from .inventory import car_facets, featured_cars, invalidate_inventory, public_cars_json
+from .mail import queue_templated_email
+from .ratelimit import ratelimit
+from .sms import queue_sms
+from .tokens import PASSWORD_RESET, VERIFY_EMAIL, get_user_for_token
+from .models import UserProfile, FavoriteCar, Car, CarImage, AdminUser, QueuedJob
+from decimal import Decimal, InvalidOperation
+import asyncio
+import csv
+import io
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# How many times signup re-allocates a username after losing a race
+USERNAME_ALLOCATION_ATTEMPTS = 3
+
 def home(request):
-    """Render the home page."""
-    return render(request, 'home.html')
+    """Render the home page with the featured cars."""
+    return render(request, 'home.html', {'featured_cars': featured_cars()})
 
 def inventory(request):
     """Render the inventory page."""
@@ -46,6 +67,7 @@ def admin_panel(request):
     
     return render(request, 'admin_panel.html')
 
+@ratelimit('login', '10/m')
 def login_view(request):
     """Handle user login."""
     if request.user.is_authenticated:
@@ -56,17 +78,18 @@ def login_view(request):
         password = request.POST.get('password')
         remember_me = request.POST.get('remember_me')
         
-        # Try to get user by email
+        # Try to get user by email (case-insensitive, index-backed)
         try:
-            user_obj = User.objects.get(email=email)
-            username = user_obj.username
-        except User.DoesNotExist:
-            messages.error(request, 'Invalid email or password.')
-            return render(request, 'login.html')
+            user_obj = get_user_by_email(email)
         except Exception as e:
             messages.error(request, 'Login temporarily unavailable. Please try again later.')
             return render(request, 'login.html')
         
+        if user_obj is None:
+            messages.error(request, 'Invalid email or password.')
+            return render(request, 'login.html')
+        username = user_obj.username
+        
         # Authenticate user
         user = authenticate(request, username=username, password=password)
         
@@ -101,7 +124,7 @@ def signup_view(request):
             return render(request, 'login.html')
         
         # Check if email already exists
-        existing_user = User.objects.filter(email=email).first()
+        existing_user = get_user_by_email(email)
         if existing_user:
             if existing_user.profile.email_verified:
                 messages.error(request, '❌ This email address is already verified and in use. Please use a different email or log in to your existing account.')
@@ -109,35 +132,33 @@ def signup_view(request):
                 messages.error(request, '❌ An account with this email already exists. Please log in or use a different email.')
             return render(request, 'login.html')
         
-        # Create username from email
-        username = email.split('@')[0]
-        
-        # If username exists, append numbers
-        base_username = username
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        
         # Parse full name
         name_parts = full_name.strip().split(' ', 1)
         first_name = name_parts[0]
         last_name = name_parts[1] if len(name_parts) > 1 else ''
         
         try:
-            # Create user
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=password,
-                first_name=first_name,
-                last_name=last_name
-            )
+            # Create user with a username derived from the email. If a
+            # concurrent signup grabs the same name, allocate again.
+            for attempt in range(USERNAME_ALLOCATION_ATTEMPTS):
+                username = allocate_username(email)
+                try:
+                    with transaction.atomic():
+                        user = User.objects.create_user(
+                            username=username,
+                            email=email,
+                            password=password,
+                            first_name=first_name,
+                            last_name=last_name
+                        )
+                    break
+                except IntegrityError:
+                    if attempt == USERNAME_ALLOCATION_ATTEMPTS - 1:
+                        raise
             
             # Ensure user has a profile (should be auto-created by signal, but just in case)
             if not hasattr(user, 'profile'):
-                from store.models import UserProfile
-                UserProfile.objects.create(user=user)
+                UserProfile.objects.get_or_create(user=user)
             
             # Log the user in with the correct backend
             auth_login(request, user, backend='django.contrib.auth.backends.ModelBackend')
@@ -176,20 +197,21 @@ def logout_view(request):
     messages.success(request, 'You have been logged out successfully.')
     return redirect('home')
 
+@ratelimit('password_reset', '5/h')
 def password_reset_request(request):
     """Handle password reset request."""
     if request.method == 'POST':
         email = request.POST.get('email')
         
-        try:
-            user = User.objects.get(email=email)
+        user = get_user_by_email(email)
+        if user is not None:
             token = user.profile.generate_reset_token()
             
             # Send password reset email
             send_password_reset_email(user, token)
             
             messages.success(request, 'Password reset instructions have been sent to your email.')
-        except User.DoesNotExist:
+        else:
             # Don't reveal that the user doesn't exist
             messages.success(request, 'If an account exists with this email, password reset instructions have been sent.')
         
@@ -200,66 +222,63 @@ def password_reset_request(request):
 def password_reset_confirm(request, token):
     """Handle password reset confirmation."""
     try:
-        profile = UserProfile.objects.get(reset_token=token)
-        
-        if not profile.is_reset_token_valid:
-            messages.error(request, 'This password reset link has expired. Please request a new one.')
-            return redirect('password_reset')
+        user = get_user_for_token(token, PASSWORD_RESET)
+    except signing.SignatureExpired:
+        messages.error(request, 'This password reset link has expired. Please request a new one.')
+        return redirect('password_reset')
+    except signing.BadSignature:
+        user = None
+    
+    # Tokens stop working once the password has been changed
+    if user is None:
+        messages.error(request, 'Invalid password reset link.')
+        return redirect('password_reset')
+    
+    if request.method == 'POST':
+        password = request.POST.get('password')
+        password_confirm = request.POST.get('password_confirm')
         
-        if request.method == 'POST':
-            password = request.POST.get('password')
-            password_confirm = request.POST.get('password_confirm')
-            
-            if password != password_confirm:
-                messages.error(request, 'Passwords do not match.')
-                return render(request, 'password_reset_confirm.html')
-            
-            # Update password
-            user = profile.user
-            user.set_password(password)
-            user.save()
-            
-            # Clear reset token
-            profile.reset_token = None
-            profile.reset_token_created = None
-            profile.save()
-            
-            messages.success(request, 'Your password has been reset successfully. Please log in.')
-            return redirect('login')
+        if password != password_confirm:
+            messages.error(request, 'Passwords do not match.')
+            return render(request, 'password_reset_confirm.html')
         
-        return render(request, 'password_reset_confirm.html')
+        # Update password (this also invalidates the reset token)
+        user.set_password(password)
+        user.save(update_fields=['password'])
         
-    except UserProfile.DoesNotExist:
-        messages.error(request, 'Invalid password reset link.')
-        return redirect('password_reset')
+        messages.success(request, 'Your password has been reset successfully. Please log in.')
+        return redirect('login')
+    
+    return render(request, 'password_reset_confirm.html')
 
 def verify_email(request, token):
     """Handle email verification via token link."""
     try:
-        profile = UserProfile.objects.get(verification_token=token)
-        
-        # Check if this email is already verified by another user
-        email_to_verify = profile.user.email
-        already_verified_user = User.objects.filter(
-            email=email_to_verify,
-            profile__email_verified=True
-        ).exclude(id=profile.user.id).first()
-        
-        if already_verified_user:
-            messages.error(request, f'❌ This email address is already verified and in use by another account. Please use a different email address.')
-            return redirect('profile') if request.user.is_authenticated else redirect('login')
-        
-        # Verify the email
-        profile.verify_email()
-        
-        messages.success(request, '✅ Your email has been verified successfully!')
-        return redirect('profile') if request.user.is_authenticated else redirect('login')
-        
-    except UserProfile.DoesNotExist:
+        user = get_user_for_token(token, VERIFY_EMAIL)
+    except signing.BadSignature:
+        user = None
+    
+    if user is None:
         messages.error(request, '❌ Invalid or expired verification link.')
         return redirect('home')
+    
+    # Check if this email is already verified by another user
+    already_verified_user = users_by_email(user.email).filter(
+        profile__email_verified=True
+    ).exclude(id=user.id).first()
+    
+    if already_verified_user:
+        messages.error(request, f'❌ This email address is already verified and in use by another account. Please use a different email address.')
+        return redirect('profile') if request.user.is_authenticated else redirect('login')
+    
+    # Verify the email
+    user.profile.verify_email()
+    
+    messages.success(request, '✅ Your email has been verified successfully!')
+    return redirect('profile') if request.user.is_authenticated else redirect('login')
 
 @login_required
+@ratelimit('verification_code', '10/h', redirect_to='profile')
 def verify_email_prompt(request):
     """Show email verification code entry form."""
     if request.user.profile.email_verified:
@@ -273,6 +292,8 @@ def verify_email_prompt(request):
             request.user.profile.verify_email()
             messages.success(request, 'Your email has been verified successfully!')
             return redirect('profile')
+        elif request.user.profile.verification_code_locked:
+            messages.error(request, 'Too many incorrect attempts. Please request a new code.')
         else:
             messages.error(request, 'Invalid or expired verification code. Please try again or request a new code.')
     
@@ -282,29 +303,31 @@ def verify_email_sent(request, email):
     """Show email verification sent page."""
     return render(request, 'verify_email.html', {'email': email})
 
-def resend_verification(request):
+@ratelimit('email_verification', '5/h', redirect_to='profile')
+async def resend_verification(request):
     """Resend verification email."""
+    user = await request.auser()
     # Check if user is authenticated
-    if request.user.is_authenticated:
-        user = request.user
+    if user.is_authenticated:
+        profile = await aget_profile(user)
         
         # Check if user signed up via Google (social account)
-        if user.socialaccount_set.filter(provider='google').exists():
+        if await user.socialaccount_set.filter(provider='google').aexists():
             # Mark as verified since Google already verified the email
-            user.profile.email_verified = True
-            user.profile.save()
+            profile.email_verified = True
+            await profile.asave(update_fields=['email_verified', 'updated_at'])
             messages.success(request, 'Your email has been verified via Google.')
             return redirect('profile')
         
         # Check if already verified
-        if user.profile.email_verified:
+        if profile.email_verified:
             messages.info(request, 'Your email is already verified.')
             return redirect('profile')
         
         # Send verification email with link
         try:
-            token = user.profile.generate_verification_token()
-            send_verification_email(user, token)
+            token = profile.generate_verification_token()
+            await sync_to_async(send_verification_email)(user, token)
             messages.success(request, '✅ Verification email has been sent successfully! Please check your inbox and click the link to verify.')
         except Exception as e:
             logger.error(f'Failed to send verification email: {str(e)}')
@@ -316,23 +339,29 @@ def resend_verification(request):
     if request.method == 'POST':
         email = request.POST.get('email')
         
-        try:
-            user = User.objects.get(email=email)
-            
-            if user.profile.email_verified:
-                messages.info(request, 'Your email is already verified.')
-                return redirect('login')
-            
-            code = user.profile.generate_verification_code()
-            send_verification_email_with_code(user, code)
-            
-            messages.success(request, 'Verification email has been resent.')
-        except User.DoesNotExist:
+        user = await users_by_email(email).select_related('profile').order_by('id').afirst()
+        if user is None:
             messages.error(request, 'No account found with this email.')
+            return redirect('login')
+        
+        if user.profile.email_verified:
+            messages.info(request, 'Your email is already verified.')
+            return redirect('login')
+        
+        await sync_to_async(resend_verification_code)(user)
+        messages.success(request, 'Verification email has been resent.')
     
     return redirect('login')
 
+@transaction.atomic
+def resend_verification_code(user):
+    """Store a new email verification code and queue it in one transaction."""
+    code = user.profile.generate_verification_code()
+    send_verification_email_with_code(user, code)
+
 @login_required
+@ratelimit('phone_verification', '5/h', methods=('GET',), redirect_to='profile')
+@ratelimit('verification_code', '10/h', redirect_to='profile')
 def verify_phone_prompt(request):
     """Show phone verification code entry form."""
     if not request.user.profile.phone_number:
@@ -343,6 +372,10 @@ def verify_phone_prompt(request):
         messages.info(request, 'Your phone number is already verified.')
         return redirect('profile')
     
+    # Codes are sent after the response, so a failed send shows up here
+    # on the next visit
+    last_send_failed = phone_verification_sms_failed(request.user)
+    
     if request.method == 'POST':
         code = request.POST.get('code', '').strip()
         
@@ -350,44 +383,43 @@ def verify_phone_prompt(request):
             request.user.profile.verify_phone()
             messages.success(request, 'Your phone number has been verified successfully!')
             return redirect('profile')
+        elif request.user.profile.phone_verification_code_locked:
+            messages.error(request, 'Too many incorrect attempts. Please request a new code.')
         else:
             messages.error(request, 'Invalid or expired verification code. Please try again or request a new code.')
     else:
         # Automatically send code when page is loaded for the first time
         try:
-            code = request.user.profile.generate_phone_verification_code()
-            send_phone_verification_sms(request.user, code)
+            send_phone_verification_code(request.user)
             messages.info(request, f'Verification code sent to {request.user.profile.phone_number}')
         except Exception as e:
             logger.error(f'Error sending phone verification on page load: {e}')
             messages.warning(request, 'Failed to send verification code automatically. Please use the resend button.')
     
+    if last_send_failed:
+        messages.warning(request, "We couldn't deliver your last verification code. Please check your phone number.")
+    
     return render(request, 'verify_phone_code.html')
 
 @login_required
 @require_POST
-def send_phone_verification(request):
+@ratelimit('phone_verification', '5/h', json=True)
+async def send_phone_verification(request):
     """Send phone verification SMS."""
-    if not request.user.profile.phone_number:
+    user = await request.auser()
+    profile = await aget_profile(user)
+    if not profile.phone_number:
         return JsonResponse({'success': False, 'error': 'No phone number set'}, status=400)
     
-    if request.user.profile.phone_verified:
+    if profile.phone_verified:
         return JsonResponse({'success': False, 'error': 'Phone already verified'}, status=400)
     
     try:
-        code = request.user.profile.generate_phone_verification_code()
-        success = send_phone_verification_sms(request.user, code)
-        
-        if success:
-            return JsonResponse({
-                'success': True,
-                'message': 'Verification code sent to your phone'
-            })
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': 'Failed to send SMS. Please check your phone number.'
-            }, status=500)
+        await sync_to_async(send_phone_verification_code)(user)
+        return JsonResponse({
+            'success': True,
+            'message': 'Verification code sent to your phone'
+        })
     except Exception as e:
         logger.error(f'Error sending phone verification: {e}')
         return JsonResponse({
@@ -400,7 +432,7 @@ def profile_view(request):
     """Display user profile."""
     # Ensure user has a profile (it should be auto-created, but just in case)
     if not hasattr(request.user, 'profile'):
-        UserProfile.objects.create(user=request.user)
+        UserProfile.objects.get_or_create(user=request.user)
     
     return render(request, 'profile.html')
 
@@ -413,7 +445,10 @@ def update_profile(request):
             
             # Ensure user has a profile
             if not hasattr(user, 'profile'):
-                UserProfile.objects.create(user=user)
+                UserProfile.objects.get_or_create(user=user)
+            
+            # Profile columns changed by this request, written in one UPDATE
+            profile_fields = []
             
             user.first_name = request.POST.get('first_name', '').strip()
             user.last_name = request.POST.get('last_name', '').strip()
@@ -443,11 +478,12 @@ def update_profile(request):
                     pass  # Ignore deletion errors
                 
                 user.profile.profile_picture = profile_picture
+                profile_fields.append('profile_picture')
             
             # Check if email changed and if it's already taken
             if new_email != user.email:
                 # Check if email is already in use (including by verified users)
-                existing_user = User.objects.filter(email=new_email).exclude(id=user.id).first()
+                existing_user = users_by_email(new_email).exclude(id=user.id).first()
                 if existing_user:
                     if existing_user.profile.email_verified:
                         messages.error(request, '❌ This email address is already verified and in use by another account. Please use a different email.')
@@ -457,7 +493,7 @@ def update_profile(request):
                 
                 user.email = new_email
                 user.profile.email_verified = False
-                user.profile.save()
+                profile_fields.append('email_verified')
                 
                 # Send new verification email with link
                 try:
@@ -467,26 +503,30 @@ def update_profile(request):
                 except Exception:
                     messages.warning(request, '⚠️ Email updated but failed to send verification email. You can request a new one from your profile.')
             
-            user.save()
+            user.save(update_fields=['first_name', 'last_name', 'email'])
             
             # Update phone number
             old_phone = user.profile.phone_number
             if phone and phone != old_phone:
                 user.profile.phone_number = phone
                 user.profile.phone_verified = False  # Mark as unverified if changed
-                user.profile.save()
+                profile_fields += ['phone_number', 'phone_verified']
                 
                 # Only show phone warning if email didn't change
                 if new_email == user.email:
                     messages.success(request, '✅ Profile updated! Please verify your new phone number.')
             else:
-                user.profile.phone_number = phone
-                user.profile.save()
+                if phone != old_phone:
+                    user.profile.phone_number = phone
+                    profile_fields.append('phone_number')
                 
                 # Only show success if email and phone didn't change
                 if new_email == user.email and phone == old_phone:
                     messages.success(request, '✅ Profile updated successfully!')
             
+            if profile_fields:
+                user.profile.save(update_fields=profile_fields + ['updated_at'])
+            
         except Exception as e:
             messages.error(request, f'❌ Error updating profile: {str(e)}')
             return redirect('profile')
@@ -528,7 +568,7 @@ def change_password(request):
         
         # Update password
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=['password'])
         
         # Update session to prevent logout
         update_session_auth_hash(request, user)
@@ -563,9 +603,10 @@ def favorites_view(request):
 
 @login_required
 @require_POST
-def add_to_favorites(request):
+async def add_to_favorites(request):
     """Add a car to user's favorites."""
     try:
+        user = await request.auser()
         data = json.loads(request.body)
         car_id = data.get('car_id')
         car_title = data.get('car_title', '')
@@ -576,8 +617,8 @@ def add_to_favorites(request):
             return JsonResponse({'success': False, 'error': 'Car ID is required'}, status=400)
         
         # Check if already favorited
-        favorite, created = FavoriteCar.objects.get_or_create(
-            user=request.user,
+        favorite, created = await FavoriteCar.objects.aget_or_create(
+            user=user,
             car_id=car_id,
             defaults={
                 'car_title': car_title,
@@ -604,19 +645,20 @@ def add_to_favorites(request):
 
 @login_required
 @require_POST
-def remove_from_favorites(request):
+async def remove_from_favorites(request):
     """Remove a car from user's favorites."""
     try:
+        user = await request.auser()
         data = json.loads(request.body)
         car_id = data.get('car_id')
         
         if not car_id:
             return JsonResponse({'success': False, 'error': 'Car ID is required'}, status=400)
         
-        deleted_count, _ = FavoriteCar.objects.filter(
-            user=request.user,
+        deleted_count, _ = await FavoriteCar.objects.filter(
+            user=user,
             car_id=car_id
-        ).delete()
+        ).adelete()
         
         if deleted_count > 0:
             return JsonResponse({
@@ -634,140 +676,70 @@ def remove_from_favorites(request):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @login_required
-def check_favorite(request, car_id):
+async def check_favorite(request, car_id):
     """Check if a car is in user's favorites."""
-    is_favorite = FavoriteCar.objects.filter(
-        user=request.user,
+    user = await request.auser()
+    is_favorite = await FavoriteCar.objects.filter(
+        user=user,
         car_id=car_id
-    ).exists()
+    ).aexists()
     
     return JsonResponse({'is_favorite': is_favorite})
 
 @login_required
-def get_user_favorites(request):
+@read_replica
+async def get_user_favorites(request):
     """Get list of user's favorite car IDs."""
-    favorite_ids = list(
-        FavoriteCar.objects.filter(user=request.user)
-        .values_list('car_id', flat=True)
-    )
+    user = await request.auser()
+    favorite_ids = [
+        car_id async for car_id in
+        FavoriteCar.objects.filter(user=user).values_list('car_id', flat=True)
+    ]
     
     return JsonResponse({'favorite_ids': favorite_ids})
 
 # Helper functions for sending emails
+# These queue the message in the outbox (store/outbox.py); call them inside
+# the transaction that stores any code being sent. Bodies are rendered from
+# templates/emails/ (store/mail.py).
 def send_verification_email(user, token):
-    """Send email verification link."""
-    verification_url = f"{settings.SITE_URL}/verify-email/{token}/"
-    
-    subject = 'Verify Your Email - M&R Motors'
-    message = f"""
-    Hi {user.first_name},
-    
-    Thank you for signing up at M&R Motors!
-    
-    Please click the link below to verify your email address:
-    {verification_url}
-    
-    If you didn't create an account, please ignore this email.
-    
-    Best regards,
-    M&R Motors Team
-    """
-    
-    try:
-        logger.info(f"Attempting to send verification email to {user.email}")
-        logger.info(f"Email settings - Backend: {settings.EMAIL_BACKEND}, Host: {settings.EMAIL_HOST}, User: {settings.EMAIL_HOST_USER}")
-        logger.info(f"FROM email: {settings.DEFAULT_FROM_EMAIL}")
-        
-        from django.core.mail import EmailMessage
-        email = EmailMessage(
-            subject=subject,
-            body=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[user.email],
-        )
-        email.send(fail_silently=False)
-        
-        logger.info(f"✓ Verification email sent successfully to {user.email}")
-    except Exception as e:
-        logger.error(f"✗ Error sending email to {user.email}: {str(e)}")
-        logger.error(f"Email backend: {settings.EMAIL_BACKEND}")
-        logger.error(f"Email host: {settings.EMAIL_HOST}")
-        logger.error(f"Email user: {settings.EMAIL_HOST_USER}")
-        logger.error(f"DEFAULT_FROM_EMAIL: {settings.DEFAULT_FROM_EMAIL}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-        raise  # Re-raise to be caught by calling function
+    """Queue email verification link."""
+    queue_templated_email(
+        'Verify Your Email - M&R Motors',
+        'verification',
+        {
+            'first_name': user.first_name,
+            'verification_url': f"{settings.SITE_URL}/verify-email/{token}/",
+        },
+        [user.email],
+    )
+    logger.info(f"Verification email queued for {user.email}")
 
 def send_verification_email_with_code(user, code):
-    """Send email verification with 6-digit code."""
-    subject = 'Verify Your Email - M&R Motors'
-    message = f"""
-    Hi {user.first_name},
-    
-    Thank you for signing up at M&R Motors!
-    
-    Your email verification code is: {code}
-    
-    This code will expire in 10 minutes.
-    
-    Please enter this code on the verification page to complete your registration.
-    
-    If you didn't create an account, please ignore this email.
-    
-    Best regards,
-    M&R Motors Team
-    """
-    
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
-        logger.info(f"Verification code email sent successfully to {user.email}")
-    except Exception as e:
-        logger.error(f"Error sending verification code email to {user.email}: {str(e)}")
-        raise
+    """Queue email verification with 6-digit code."""
+    queue_templated_email(
+        'Verify Your Email - M&R Motors',
+        'verification_code',
+        {'first_name': user.first_name, 'code': code},
+        [user.email],
+    )
+    logger.info(f"Verification code email queued for {user.email}")
 
 def send_password_reset_email(user, token):
-    """Send password reset link."""
-    reset_url = f"{settings.SITE_URL}/password-reset/{token}/"
-    
-    subject = 'Reset Your Password - M&R Motors'
-    message = f"""
-    Hi {user.first_name},
-    
-    You requested to reset your password at M&R Motors.
-    
-    Please click the link below to reset your password:
-    {reset_url}
-    
-    This link will expire in 24 hours.
-    
-    If you didn't request this, please ignore this email.
-    
-    Best regards,
-    M&R Motors Team
-    """
-    
-    try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
-        logger.info(f"Password reset email sent successfully to {user.email}")
-    except Exception as e:
-        logger.error(f"Error sending password reset email to {user.email}: {str(e)}")
-        raise
+    """Queue password reset link."""
+    queue_templated_email(
+        'Reset Your Password - M&R Motors',
+        'password_reset',
+        {
+            'first_name': user.first_name,
+            'reset_url': f"{settings.SITE_URL}/password-reset/{token}/",
+        },
+        [user.email],
+    )
+    logger.info(f"Password reset email queued for {user.email}")
 
 def test_email_config(request):
     """Test endpoint to check email configuration."""
-    from django.http import HttpResponse
     import traceback
     
     config = {
@@ -809,88 +781,75 @@ def test_email_config(request):
     
     return HttpResponse(html)
 
-def send_phone_verification_sms(user, code):
-    """Send SMS verification code using Twilio."""
-    try:
-        from twilio.rest import Client
-        
-        # Get Twilio credentials from settings
-        account_sid = getattr(settings, 'TWILIO_ACCOUNT_SID', None)
-        auth_token = getattr(settings, 'TWILIO_AUTH_TOKEN', None)
-        from_number = getattr(settings, 'TWILIO_PHONE_NUMBER', None)
-        
-        if not all([account_sid, auth_token, from_number]):
-            logger.warning('Twilio credentials not configured. SMS not sent.')
-            # In development, just log the code
-            logger.info(f'Phone verification code for {user.email}: {code}')
-            print(f'📱 Phone verification code for {user.email}: {code}')
-            return True  # Return True in development mode
-        
-        client = Client(account_sid, auth_token)
-        
-        message_body = f"""M&R Motors
+def phone_verification_message(code):
+    """Body of the phone verification SMS."""
+    return f"""M&R Motors
 
 Your phone verification code is: {code}
 
 This code will expire in 10 minutes.
 
 If you didn't request this, please ignore this message."""
-        
-        message = client.messages.create(
-            body=message_body,
-            from_=from_number,
-            to=user.profile.phone_number
-        )
-        
-        logger.info(f'SMS sent successfully. SID: {message.sid}')
-        return True
-    except ImportError:
-        logger.warning('Twilio not installed. SMS not sent.')
-        # In development, just log the code
-        logger.info(f'Phone verification code for {user.email}: {code}')
-        print(f'📱 Phone verification code for {user.email}: {code}')
-        return True
-    except Exception as e:
-        logger.error(f'Error sending SMS: {e}')
-        # In development, just log the code
-        logger.info(f'Phone verification code for {user.email}: {code}')
-        print(f'📱 Phone verification code for {user.email}: {code}')
-        return False
+
+@transaction.atomic
+def send_phone_verification_code(user):
+    """
+    Store a new phone verification code and queue its SMS in one transaction.
+
+    The SMS is sent after the response (see store/jobs.py).
+    """
+    code = user.profile.generate_phone_verification_code()
+    queue_sms(user.profile.phone_number, phone_verification_message(code), user=user)
+    logger.info(f'Phone verification SMS queued for {user.email}')
+
+def phone_verification_sms_failed(user):
+    """Whether the last verification SMS queued for ``user`` failed to send."""
+    job = (QueuedJob.objects.filter(user=user, name='sms')
+           .order_by('-pk').only('status', 'last_error').first())
+    return job is not None and job.status != QueuedJob.STATUS_DONE and bool(job.last_error)
 
 
 # Car Management Views
 @login_required
-def add_car_view(request):
+async def add_car_view(request):
     """Add a new car with image uploads."""
-    is_admin = (request.user.email in settings.ADMIN_EMAILS or 
-                hasattr(request.user, 'admin_profile'))
-    
-    if not is_admin:
+    user = await request.auser()
+    if not await ais_admin(user):
         messages.error(request, 'You do not have permission to add cars.')
         return redirect('home')
     
     if request.method == 'POST':
         try:
-            # Create car
-            car = Car.objects.create(
-                title=request.POST.get('title'),
-                car_model=request.POST.get('car_model'),
-                year=int(request.POST.get('year')),
-                price=float(request.POST.get('price')),
-                description=request.POST.get('description'),
-                mileage=request.POST.get('mileage') or None,
-                condition=request.POST.get('condition') or None,
-            )
+            fields = {
+                'title': request.POST.get('title'),
+                'car_model': request.POST.get('car_model'),
+                'year': int(request.POST.get('year')),
+                'price': float(request.POST.get('price')),
+                'description': request.POST.get('description'),
+                'mileage': request.POST.get('mileage') or None,
+                'condition': request.POST.get('condition') or None,
+            }
             
-            # Handle multiple image uploads
+            # Upload all images to storage concurrently, then save the rows
             images = request.FILES.getlist('images')
-            for idx, image in enumerate(images):
-                CarImage.objects.create(
-                    car=car,
-                    image=image,
-                    is_primary=(idx == 0),
-                    order=idx
-                )
+            uploads = await asyncio.gather(*[
+                sync_to_async(
+                    store_car_image, thread_sensitive=False, executor=background.get_io_executor()
+                )(image)
+                for image in images
+            ], return_exceptions=True)
+            image_names = [name for name in uploads if not isinstance(name, BaseException)]
+            try:
+                for upload in uploads:
+                    if isinstance(upload, BaseException):
+                        raise upload
+                car = await sync_to_async(create_car_with_images)(fields, image_names)
+            except Exception:
+                # Nothing refers to the uploaded files any more
+                await sync_to_async(
+                    delete_car_images, thread_sensitive=False, executor=background.get_io_executor()
+                )(image_names)
+                raise
             
             messages.success(request, 'Car added successfully!')
             return JsonResponse({'success': True, 'car_id': car.id})
@@ -899,32 +858,43 @@ def add_car_view(request):
     
     return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
 
+def store_car_image(image):
+    """Upload a car image to storage and return its stored name."""
+    field = CarImage._meta.get_field('image')
+    name = field.generate_filename(CarImage(), image.name)
+    return field.storage.save(name, image, max_length=field.max_length)
 
-def get_cars_api(request):
+def delete_car_images(names):
+    """Delete uploaded car images that no ``CarImage`` row refers to."""
+    storage = CarImage._meta.get_field('image').storage
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.warning(f'Failed to delete orphaned car image {name}: {e}')
+
+@transaction.atomic
+def create_car_with_images(fields, image_names):
+    """Create a car and its (already uploaded) images; the first is primary."""
+    car = Car.objects.create(**fields)
+    CarImage.objects.bulk_create([
+        CarImage(car=car, image=name, is_primary=(idx == 0), order=idx)
+        for idx, name in enumerate(image_names)
+    ])
+    return car
+
+
+async def get_cars_api(request):
     """Get all cars as JSON. Only shows non-hidden cars to public."""
-    # Filter out hidden cars from public view
-    cars = Car.objects.filter(is_hidden=False)
-    cars_data = []
-    
-    for car in cars:
-        images = [{'url': img.image.url, 'is_primary': img.is_primary} for img in car.images.all()]
-        cars_data.append({
-            'id': car.id,
-            'title': car.title,
-            'car_model': car.car_model,
-            'year': car.year,
-            'price': float(car.price),
-            'description': car.description,
-            'mileage': car.mileage,
-            'condition': car.condition,
-            'is_sold': car.is_sold,
-            'is_hidden': car.is_hidden,
-            'images': images,
-            'primary_image': car.primary_image.image.url if car.primary_image else None,
-            'created_at': car.created_at.isoformat(),
-        })
-    
-    return JsonResponse({'cars': cars_data})
+    # Served from the tiered cache; rebuilt after the inventory changes
+    content = await sync_to_async(public_cars_json)()
+    return HttpResponse(content, content_type='application/json')
+
+
+async def get_car_facets_api(request):
+    """Counts of public cars by model, year, condition and price band."""
+    facets = await sync_to_async(car_facets)()
+    return JsonResponse(facets)
 
 
 @login_required
@@ -937,11 +907,12 @@ def get_admin_cars_api(request):
         return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
     
     # Show ALL cars for admin, including hidden ones
-    cars = Car.objects.all()
+    cars = Car.objects.prefetch_related('images')
     cars_data = []
     
     for car in cars:
-        images = [{'id': img.id, 'url': img.image.url, 'is_primary': img.is_primary} for img in car.images.all()]
+        car_images = list(car.images.all())
+        images = [{'id': img.id, 'url': img.image.url, 'is_primary': img.is_primary} for img in car_images]
         cars_data.append({
             'id': car.id,
             'title': car.title,
@@ -954,13 +925,65 @@ def get_admin_cars_api(request):
             'is_sold': car.is_sold,
             'is_hidden': car.is_hidden,
             'images': images,
-            'primary_image': car.primary_image.image.url if car.primary_image else None,
+            'primary_image': car_images[0].image.url if car_images else None,
             'created_at': car.created_at.isoformat(),
         })
     
     return JsonResponse({'cars': cars_data})
 
 
+@login_required
+@require_POST
+def import_cars_view(request):
+    """Import cars from an uploaded CSV or JSON Lines file (images as URLs)."""
+    is_admin = (request.user.email in settings.ADMIN_EMAILS or 
+                hasattr(request.user, 'admin_profile'))
+    
+    if not is_admin:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'No file uploaded'}, status=400)
+    
+    fmt = request.POST.get('format') or format_for_path(upload.name)
+    if fmt not in CAR_FORMATS:
+        return JsonResponse({'success': False, 'error': f'Unknown format: {fmt}'}, status=400)
+    
+    lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        created, errors = import_cars(
+            iter_records(lines, fmt), max_images=settings.CAR_IMPORT_MAX_IMAGES
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        return JsonResponse({'success': False, 'error': f'Could not read file: {e}'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'created': created,
+        'errors': [{'line': line, 'error': message} for line, message in errors],
+    })
+
+
+@login_required
+def export_cars_view(request):
+    """Stream the whole inventory as CSV or JSON Lines."""
+    is_admin = (request.user.email in settings.ADMIN_EMAILS or 
+                hasattr(request.user, 'admin_profile'))
+    
+    if not is_admin:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in CAR_FORMATS:
+        return JsonResponse({'success': False, 'error': f'Unknown format: {fmt}'}, status=400)
+    
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_lines(fmt), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="cars.{fmt}"'
+    return response
+
+
 @login_required
 @require_POST
 def update_car_view(request, car_id):
@@ -1035,6 +1058,7 @@ def delete_car_image_view(request, image_id):
     try:
         image = get_object_or_404(CarImage, id=image_id)
         image.delete()
+        invalidate_inventory()
         return JsonResponse({'success': True})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
@@ -1084,6 +1108,73 @@ def toggle_car_hidden_status(request, car_id):
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 
+# Bulk actions for the admin inventory: action -> UPDATE values ('delete' and
+# 'reprice' are handled separately)
+BULK_CAR_UPDATES = {
+    'mark_sold': {'is_sold': True},
+    'mark_available': {'is_sold': False},
+    'hide': {'is_hidden': True},
+    'unhide': {'is_hidden': False},
+}
+BULK_CAR_ACTIONS = [*BULK_CAR_UPDATES, 'delete', 'reprice']
+BULK_CAR_MAX_IDS = 1000
+
+
+@login_required
+@require_POST
+def bulk_car_action(request):
+    """
+    Apply one action to many cars in a single transaction.
+
+    Expects JSON ``{"action": ..., "car_ids": [...]}`` plus ``"percent"``
+    for ``reprice`` (e.g. -10 for a 10% cut). Each action is one locking
+    SELECT to collect the affected ids and one UPDATE or DELETE.
+    """
+    is_admin = (request.user.email in settings.ADMIN_EMAILS or 
+                hasattr(request.user, 'admin_profile'))
+    
+    if not is_admin:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+    
+    try:
+        data = json.loads(request.body)
+        action = data.get('action')
+        car_ids = [int(car_id) for car_id in data.get('car_ids', [])]
+        percent = Decimal(str(data['percent'])) if action == 'reprice' else None
+    except (ValueError, TypeError, KeyError, InvalidOperation):
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    
+    if action not in BULK_CAR_ACTIONS:
+        return JsonResponse({'success': False, 'error': f'Unknown action: {action}'}, status=400)
+    if not car_ids or len(car_ids) > BULK_CAR_MAX_IDS:
+        return JsonResponse({
+            'success': False,
+            'error': f'Select between 1 and {BULK_CAR_MAX_IDS} cars',
+        }, status=400)
+    if percent is not None and not (percent.is_finite() and -100 < percent <= 1000):
+        return JsonResponse({'success': False, 'error': 'Invalid percentage'}, status=400)
+    
+    with transaction.atomic():
+        cars = Car.objects.filter(pk__in=car_ids)
+        affected_ids = sorted(cars.select_for_update().values_list('pk', flat=True))
+        cars = Car.objects.filter(pk__in=affected_ids)
+        if action == 'delete':
+            cars.delete()
+        elif action == 'reprice':
+            factor = 1 + percent / 100
+            cars.update(
+                price=Round(F('price') * factor, 2, output_field=Car._meta.get_field('price')),
+                updated_at=timezone.now(),
+            )
+        else:
+            cars.update(updated_at=timezone.now(), **BULK_CAR_UPDATES[action])
+        # update() sends no signals
+        invalidate_inventory()
+    
+    logger.info(f'Bulk {action} by {request.user.email}: {len(affected_ids)} cars')
+    return JsonResponse({'success': True, 'action': action, 'affected_ids': affected_ids})
+
+
 # Admin User Management Views
 @login_required
 def get_admin_users(request):
@@ -1129,9 +1220,8 @@ def add_admin_user(request):
             return JsonResponse({'success': False, 'error': 'Email is required'}, status=400)
         
         # Check if user exists
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        user = get_user_by_email(email)
+        if user is None:
             return JsonResponse({'success': False, 'error': 'User with this email does not exist'}, status=404)
         
         # Check if already an admin
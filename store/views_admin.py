@@ -6,6 +6,7 @@ from django.core.management import call_command
 from django.conf import settings
 from django.db import connection
 from io import StringIO
+import hmac
 import sys
 
 
@@ -208,3 +209,100 @@ def migration_status(request):
             'status': 'error',
             'message': str(e)
         }, status=500)
+
+
+def has_cron_secret(request):
+    """Whether the request carries CRON_SECRET as a bearer token."""
+    cron_secret = getattr(settings, 'CRON_SECRET', '')
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    # Constant-time comparison, so response timing doesn't leak the secret
+    return bool(cron_secret) and hmac.compare_digest(
+        auth_header.encode(), f'Bearer {cron_secret}'.encode()
+    )
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def drain_outbox(request):
+    """
+    Send pending outbox emails, for use by a scheduled job (e.g. Vercel Cron).
+    Protected by CRON_SECRET sent as a bearer token.
+    """
+    if not has_cron_secret(request):
+        return HttpResponseForbidden("Unauthorized")
+    
+    try:
+        from store.outbox import drain_outbox as drain
+        sent, failed = drain(batch_size=50)
+        
+        return JsonResponse({
+            'status': 'success',
+            'sent': sent,
+            'failed': failed
+        })
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def run_jobs(request):
+    """
+    Run due queued jobs (store/jobs.py), for use by a scheduled job (e.g.
+    Vercel Cron). Protected by CRON_SECRET sent as a bearer token.
+    """
+    if not has_cron_secret(request):
+        return HttpResponseForbidden("Unauthorized")
+    
+    try:
+        from store.jobs import run_jobs as run
+        done, failed = run(batch_size=50)
+        
+        return JsonResponse({
+            'status': 'success',
+            'done': done,
+            'failed': failed,
+        })
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': str(e)
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def prune_ratelimit(request):
+    """
+    Delete idle rate-limit buckets (store/ratelimit.py), for use by a
+    scheduled job (e.g. Vercel Cron). Protected by CRON_SECRET sent as a
+    bearer token.
+    """
+    if not has_cron_secret(request):
+        return HttpResponseForbidden("Unauthorized")
+    
+    from store.ratelimit import prune_buckets
+    return JsonResponse({'status': 'success', 'pruned': prune_buckets()})
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def cache_stats(request):
+    """
+    Hit and miss counts of the tiered cache (store/cache.py) in the
+    instance that serves the request. Protected by CRON_SECRET sent as a
+    bearer token.
+    """
+    if not has_cron_secret(request):
+        return HttpResponseForbidden("Unauthorized")
+    
+    from store.cache import get_tiered_cache
+    tiered = get_tiered_cache()
+    return JsonResponse({
+        'backend': settings.CACHES['default']['BACKEND'],
+        'local_entries': len(tiered.local),
+        'namespaces': tiered.stats(),
+    })
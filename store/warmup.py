@@ -0,0 +1,89 @@
+"""
+Warm up a fresh application instance before its first request.
+
+``get_wsgi_application()`` sets up the app registry and middleware, but
+Django still does a good deal of work lazily on the first request: it
+imports the URLconf and every view module, builds the URL resolver's
+reverse lookup tables, parses and compiles each template into the cached
+template loader and loads translation catalogs. On serverless every
+instance's first request paid for that. ``warm_up`` does it at startup
+instead; mrmotors/wsgi.py and asgi.py call it when ``APP_WARMUP`` is set,
+and the ``prepare_deploy`` build step runs it strictly so a template that
+doesn't compile fails the build rather than a request.
+
+Nothing here touches the database or the media storage, so warming up
+doesn't open connections or load SDKs that store/coldstart.py defers.
+"""
+from contextlib import contextmanager
+from django.conf import settings
+from django.template import engines
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+from django.utils import translation
+from pathlib import Path
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def project_template_names(engine):
+    """Names of the templates that live in this project (not third-party apps)."""
+    base_dir = Path(settings.BASE_DIR).resolve()
+    dirs = [*engine.engine.dirs, *get_app_template_dirs('templates')]
+    names = set()
+    for directory in dirs:
+        directory = Path(directory).resolve()
+        if not directory.is_relative_to(base_dir) or not directory.is_dir():
+            continue
+        names.update(
+            path.relative_to(directory).as_posix()
+            for path in directory.rglob('*')
+            if path.suffix in TEMPLATE_EXTENSIONS
+        )
+    return sorted(names)
+
+
+def warm_up(strict=False):
+    """
+    Build URL resolvers, import views, compile the project's templates and
+    load translations. Returns the milliseconds spent on each step.
+
+    Failures are logged and skipped unless ``strict``, so a broken
+    template never stops the instance from starting.
+    """
+    timings = {}
+
+    @contextmanager
+    def step(name):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if strict:
+                raise
+            logger.exception(f"Warm-up step {name} failed: {e}")
+        finally:
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    with step('urls'):
+        resolver = get_resolver()
+        # Imports the URLconf (and views) and fills the reverse lookup tables
+        resolver.reverse_dict
+        resolver.resolve('/')
+
+    with step('templates'):
+        for engine in engines.all():
+            if not hasattr(engine, 'engine'):
+                continue
+            for name in project_template_names(engine):
+                engine.get_template(name)
+
+    with step('translations'):
+        with translation.override(settings.LANGUAGE_CODE):
+            translation.gettext('')
+
+    logger.info(f"Warm-up complete: {timings}")
+    return timings